@@ -0,0 +1,239 @@
+"""Benchmarks for thecut-emailform.
+
+Run with ``python benchmarks.py``. Use ``--json results.json`` to save the
+results for comparison between releases, and ``--filter`` to run only the
+benchmarks whose names contain a string.
+
+"""
+from __future__ import print_function
+import runtests  # NOQA (configures Django)
+import argparse
+import django
+import json
+import os
+import platform
+import sys
+import tempfile
+import timeit
+from collections import OrderedDict
+from django import forms
+from django.core.mail import get_connection
+from django.template import engines
+from django.template.loader import get_template
+from thecut.emailform import __version__
+from thecut.emailform.attachments import iter_message_bytes
+from thecut.emailform.forms import BaseEmailForm, send_email_batch
+from thecut.emailform.tests.smtp import SMTPServer
+
+
+FIELD_COUNTS = [10, 100, 1000]
+
+ATTACHMENT_SIZE = 20 * 1024 * 1024
+
+BATCH_SIZE = 100
+
+BENCHMARKS = []
+
+
+def benchmark(function):
+    BENCHMARKS.append(function)
+    return function
+
+
+def make_form(field_count, base=BaseEmailForm, **attrs):
+    for i in range(field_count):
+        attrs['field_{0}'.format(i)] = forms.CharField()
+    form_class = type(str('Form{0}'.format(field_count)), (base,), attrs)
+    form = form_class(dict(('field_{0}'.format(i), 'Value {0}'.format(i))
+                           for i in range(field_count)))
+    assert form.is_valid()
+    return form
+
+
+def get_bound_form_fields(form):
+    # How get_email_form_fields() worked before field records, starting from
+    # a form which hasn't created its bound fields yet.
+    getattr(form, '_bound_fields_cache', {}).clear()
+    data = OrderedDict()
+    for field in form:
+        data[field.name] = {'field': field, 'label': field.label,
+                            'cleaned_data': form.cleaned_data.get(field.name)}
+    return data
+
+
+class HTMLEmailForm(BaseEmailForm):
+
+    html_template = engines['django'].from_string(
+        '<html><body><table>{% for key, data in form_fields.items %}'
+        '<tr><th>{{ data.label }}</th><td>{{ data.cleaned_data }}</td></tr>'
+        '{% endfor %}</table></body></html>')
+
+    def get_email_alternatives(self, context):
+        return [(self.html_template.render(context), 'text/html')]
+
+
+@benchmark
+def bench_render_email_body():
+    template = get_template('emailform/email.txt')
+    for field_count in FIELD_COUNTS:
+        form = make_form(field_count)
+        context = form.get_email_context_data()
+        number = max(10000 // field_count, 10)
+        yield ('render_email_body[{0}, template]'.format(field_count),
+               lambda: template.render(context), number)
+        yield ('render_email_body[{0}, fast]'.format(field_count),
+               lambda: form.render_email_body(context), number)
+
+
+@benchmark
+def bench_get_email_form_fields():
+    for field_count in FIELD_COUNTS:
+        form = make_form(field_count)
+        number = max(10000 // field_count, 10)
+        yield ('get_email_form_fields[{0}, bound]'.format(field_count),
+               lambda: get_bound_form_fields(form), number)
+        yield ('get_email_form_fields[{0}, records]'.format(field_count),
+               lambda: form.get_email_form_fields(), number)
+
+
+@benchmark
+def bench_get_email_context_data():
+    for field_count in FIELD_COUNTS:
+        form = make_form(field_count)
+        yield ('get_email_context_data[{0}]'.format(field_count),
+               form.get_email_context_data, max(10000 // field_count, 10))
+
+
+@benchmark
+def bench_construct_email():
+    for field_count in [1] + FIELD_COUNTS:
+        form = make_form(field_count)
+        yield ('construct_email[{0}]'.format(field_count),
+               form.construct_email, max(10000 // field_count, 10))
+    for field_count in FIELD_COUNTS:
+        form = make_form(field_count, base=HTMLEmailForm)
+        yield ('construct_email[{0}, html]'.format(field_count),
+               form.construct_email, max(10000 // field_count, 10))
+        form = make_form(field_count,
+                         email_html_template_name='emailform/email.html')
+        yield ('construct_email[{0}, inlined html]'.format(field_count),
+               form.construct_email, max(10000 // field_count, 10))
+
+
+@benchmark
+def bench_serialize_email():
+    for field_count in FIELD_COUNTS:
+        number = max(10000 // field_count, 10)
+        for fast_mime in [False, True]:
+            form = make_form(field_count, fast_mime=fast_mime)
+            message = form.construct_email()
+            yield ('serialize_email[{0}, {1}]'.format(
+                field_count, 'fast' if fast_mime else 'email'),
+                lambda message=message: message.message().as_bytes(
+                    linesep='\r\n'), number)
+
+
+@benchmark
+def bench_serialize_attachment():
+    handle, path = tempfile.mkstemp(suffix='.pdf')
+    try:
+        os.write(handle, os.urandom(ATTACHMENT_SIZE))
+        os.close(handle)
+        with open(path, 'rb') as attachment:
+            content = attachment.read()
+
+        tuple_form = make_form(10)
+        tuple_form.get_email_attachments = lambda: [
+            ('file.pdf', content, 'application/pdf')]
+        file_form = make_form(10)
+        file_form.get_email_attachments = lambda: [path]
+
+        def serialize(form):
+            message = form.construct_email()
+            return sum(len(chunk) for chunk in iter_message_bytes(message))
+
+        yield ('serialize_attachment[20MB, bytes]',
+               lambda: serialize(tuple_form), 1)
+        yield ('serialize_attachment[20MB, file]',
+               lambda: serialize(file_form), 1)
+    finally:
+        os.remove(path)
+
+
+@benchmark
+def bench_send_email():
+    form = make_form(10)
+    locmem = get_connection('django.core.mail.backends.locmem.EmailBackend')
+    yield ('send_email[locmem]', lambda: form.send_email(connection=locmem),
+           1000)
+
+    server = SMTPServer()
+    server.start()
+    try:
+        batch = [make_form(10) for _ in range(BATCH_SIZE)]
+        for backend in ['django.core.mail.backends.smtp.EmailBackend',
+                        'thecut.emailform.backends.PooledSMTPBackend']:
+            def connection(backend=backend):
+                return get_connection(backend, host='127.0.0.1',
+                                      port=server.port)
+
+            def send_each(connection=connection):
+                for form in batch:
+                    form.send_email(connection=connection())
+
+            name = backend.rsplit('.', 1)[-1]
+            yield ('send_email[{0}, smtp, {1}]'.format(BATCH_SIZE, name),
+                   send_each, 1)
+            yield ('send_email_batch[{0}, smtp, {1}]'.format(BATCH_SIZE,
+                                                             name),
+                   lambda connection=connection: send_email_batch(
+                       batch, connection=connection()), 1)
+    finally:
+        server.stop()
+
+
+def run(names=None, repeat=5):
+    results = []
+    for function in BENCHMARKS:
+        for name, case, number in function():
+            if names and not any(part in name for part in names):
+                continue
+            timings = timeit.repeat(case, number=number, repeat=repeat)
+            result = OrderedDict([
+                ('name', name),
+                ('number', number),
+                ('repeat', repeat),
+                ('best', min(timings) / number),
+                ('mean', sum(timings) / len(timings) / number),
+            ])
+            results.append(result)
+            print('{0:<50} {1:12.1f} us'.format(name, result['best'] * 1e6))
+            sys.stdout.flush()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--json', help='Write results to a JSON file.')
+    parser.add_argument('--filter', action='append',
+                        help='Only run benchmarks whose names contain this '
+                        'string. May be given more than once.')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of times to repeat each benchmark.')
+    options = parser.parse_args(argv)
+
+    results = run(names=options.filter, repeat=options.repeat)
+
+    if options.json:
+        with open(options.json, 'w') as output:
+            json.dump(OrderedDict([
+                ('version', __version__),
+                ('python', platform.python_version()),
+                ('django', django.get_version()),
+                ('platform', platform.platform()),
+                ('results', results),
+            ]), output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,3 +7,29 @@ from thecut.emailform.forms import BaseEmailForm
 class EmailForm(BaseEmailForm):
 
     foo = forms.CharField(required=False)
+
+
+class DetailedEmailForm(BaseEmailForm):
+
+    name = forms.CharField()
+    date = forms.DateField(required=False)
+    amount = forms.DecimalField(required=False)
+    quantity = forms.IntegerField(label='How many?', required=False)
+    subscribe = forms.BooleanField(required=False)
+
+
+class DigestEmailForm(EmailForm):
+
+    digest_max_items = 3
+    email_delivery = 'digest'
+
+
+class HTMLEmailForm(DetailedEmailForm):
+
+    email_html_template_name = 'emailform/email.html'
+
+
+class AutoReplyEmailForm(EmailForm):
+
+    auto_reply_email_field = 'email'
+    email = forms.EmailField(required=False)
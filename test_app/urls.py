@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, unicode_literals
+from django.conf.urls import include, url
 
 
 app_name = 'test_app'
 
 
 urlpatterns = [
+    url(r'^emailform/', include('thecut.emailform.urls',
+                                namespace='emailform')),
 ]
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from .settings import app_settings
+from collections import OrderedDict
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from email.utils import parseaddr
+import threading
+
+
+class InvalidAddress(ValueError):
+    """Raised when an email address can't be parsed or is not valid."""
+
+    def __init__(self, address):
+        super(InvalidAddress, self).__init__(
+            'Invalid email address {0!r}.'.format(address))
+        self.address = address
+
+
+class LRUCache(object):
+    """A bounded mapping which removes the least recently used keys first.
+
+    :keyword int max_size: Maximum number of keys.
+
+    """
+
+    def __init__(self, max_size=None):
+        self.max_size = (app_settings.ADDRESS_CACHE_SIZE if max_size is None
+                         else max_size)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._values)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, default=None):
+        """Returns the value for a key, marking it as recently used.
+
+        :returns: The value, or ``default`` if the key isn't present.
+
+        """
+
+        with self._lock:
+            try:
+                value = self._values.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._values[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._values.pop(key, None)
+            self._values[key] = value
+            while len(self._values) > self.max_size:
+                self._values.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        """Returns the number of hits, misses and evictions, and the cache's
+        current and maximum size.
+
+        :rtype: :py:class:`dict`
+
+        """
+
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'size': len(self._values),
+                    'max_size': self.max_size}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+_missing = object()
+
+
+def get_cache():
+    """Returns the process-wide cache of normalised addresses.
+
+    :rtype: :py:class:`thecut.emailform.addresses.LRUCache`
+
+    """
+
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LRUCache()
+        return _cache
+
+
+def normalise_address(address, encoding=None):
+    """Validates an email address and encodes it for use in email headers.
+
+    The address's domain is IDNA-encoded and any display name is encoded as
+    Django would when sending the email, so Django's own encoding of the
+    result leaves it unchanged. Results (including invalid addresses) are
+    cached.
+
+    :argument address: An address such as ``'Zoë <zoe@example.com>'``, or a
+        ``(name, address)`` tuple.
+    :keyword unicode encoding: The email's encoding. Defaults to the
+        ``DEFAULT_CHARSET`` setting.
+    :raises thecut.emailform.addresses.InvalidAddress: If the address is not
+        valid.
+    :returns: The encoded address.
+    :rtype: :py:class:`unicode`
+
+    """
+
+    encoding = encoding or settings.DEFAULT_CHARSET
+    key = (address, encoding)
+    cache = get_cache()
+    normalised = cache.get(key, _missing)
+    if normalised is _missing:
+        normalised = _normalise_address(address, encoding)
+        cache.set(key, normalised)
+    if normalised is None:
+        raise InvalidAddress(address)
+    return normalised
+
+
+def normalise_addresses(addresses, encoding=None):
+    """Validates and encodes a list of email addresses.
+
+    See :py:func:`thecut.emailform.addresses.normalise_address`.
+
+    :rtype: :py:class:`list`
+
+    """
+
+    return [normalise_address(address, encoding) for address in addresses]
+
+
+def _normalise_address(address, encoding):
+    # Returns None for invalid addresses, so they are cached too.
+    from django.core.mail.message import sanitize_address
+    try:
+        normalised = sanitize_address(address, encoding)
+    except (IndexError, ValueError):
+        return None
+    try:
+        validate_email(parseaddr(normalised)[1])
+    except ValidationError:
+        return None
+    return normalised
@@ -6,3 +6,9 @@ from django import apps
 class AppConfig(apps.AppConfig):
 
     name = 'thecut.emailform'
+
+    def ready(self):
+        from .settings import app_settings
+        if app_settings.WARM_UP:
+            from .warmup import warm_up
+            warm_up()
@@ -0,0 +1,400 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from .settings import app_settings
+from collections import namedtuple
+from datetime import timedelta
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.utils import six, timezone
+from django.utils.module_loading import import_string
+from email.mime.base import MIMEBase
+import base64
+import mimetypes
+import os
+import re
+import smtplib
+import uuid
+
+
+# Base64 encodes each 57 bytes as one 76 character line, so reading in
+# multiples of 57 bytes keeps every chunk a whole number of lines.
+READ_SIZE = 57 * 1024
+
+LINE_LENGTH = 76
+
+LINK_SALT = 'thecut.emailform.attachments'
+
+AttachmentLink = namedtuple('AttachmentLink',
+                            ['filename', 'url', 'size', 'expires'])
+"""A download link for an attachment which was too large to attach."""
+
+
+class FileAttachment(MIMEBase, object):
+    """An email attachment read from a file when the email is sent.
+
+    The file is read and base64 encoded in chunks, so backends which support
+    streaming (such as
+    :py:class:`~thecut.emailform.backends.StreamingSMTPBackend`) never hold
+    the whole file in memory.
+
+    :argument file: A file path, or a file object such as
+        :py:class:`~django.core.files.uploadedfile.UploadedFile`.
+    :keyword unicode filename: The attachment's file name. Defaults to the
+        file's name.
+    :keyword unicode mimetype: The attachment's content type. Guessed from the
+        file name when not given.
+
+    """
+
+    _encoded = None
+
+    _placeholder = None
+
+    def __init__(self, file, filename=None, mimetype=None):
+        self.file = file
+        if filename is None:
+            name = file if isinstance(file, six.string_types) else file.name
+            filename = os.path.basename(name or '')
+        if mimetype is None:
+            mimetype = (getattr(file, 'content_type', None) or
+                        mimetypes.guess_type(filename)[0] or
+                        'application/octet-stream')
+        maintype, _, subtype = mimetype.partition('/')
+        if not maintype or not subtype:
+            # Such as a content type given by the client which uploaded the
+            # file.
+            maintype, subtype = 'application', 'octet-stream'
+        MIMEBase.__init__(self, maintype, subtype)
+        self['Content-Transfer-Encoding'] = 'base64'
+        try:
+            filename.encode('ascii')
+        except UnicodeEncodeError:
+            if six.PY2:
+                filename = filename.encode('utf-8')
+            filename = ('utf-8', '', filename)
+        self.add_header('Content-Disposition', 'attachment',
+                        filename=filename)
+
+    def __getstate__(self):
+        # Encode the file so the attachment can be stored without it, e.g.
+        # when the email is queued in the outbox.
+        state = self.__dict__.copy()
+        state['_encoded'] = self._payload
+        state['file'] = None
+        return state
+
+    @property
+    def _payload(self):
+        if self._placeholder is not None:
+            return self._placeholder
+        if self._encoded is None:
+            self._encoded = b''.join(self.iter_base64()).decode(
+                'ascii') + '\n'
+        return self._encoded
+
+    @_payload.setter
+    def _payload(self, value):
+        self._encoded = value
+
+    def detach(self):
+        """Encode the file now if it is a file object, such as an uploaded
+        file which is deleted at the end of the request."""
+        if not isinstance(self.file, six.string_types):
+            self._payload
+            self.file = None
+
+    def is_multipart(self):
+        return False
+
+    def iter_base64(self, linesep='\n'):
+        """Yields the base64 encoded file in chunks of whole lines.
+
+        :keyword unicode linesep: Line separator. Not added after the last
+            line.
+
+        """
+
+        if self._encoded is not None:
+            encoded = self._encoded.rstrip('\n').split('\n')
+            yield linesep.join(encoded).encode('ascii')
+            return
+
+        linesep = linesep.encode('ascii')
+        if isinstance(self.file, six.string_types):
+            file = open(self.file, 'rb')
+        else:
+            file = self.file
+            if isinstance(file, File):
+                file.open('rb')
+            file.seek(0)
+        try:
+            first = True
+            while True:
+                data = file.read(READ_SIZE)
+                if not data:
+                    break
+                encoded = base64.b64encode(data)
+                chunk = linesep.join(
+                    encoded[start:start + LINE_LENGTH]
+                    for start in range(0, len(encoded), LINE_LENGTH))
+                yield chunk if first else linesep + chunk
+                first = False
+        finally:
+            if isinstance(self.file, six.string_types):
+                file.close()
+
+
+def make_attachment(attachment):
+    """Returns a value suitable for an email message's attachments.
+
+    File paths and file objects become
+    :py:class:`~thecut.emailform.attachments.FileAttachment` instances.
+    Anything else, such as a ``(filename, content, mimetype)`` tuple, is
+    returned unchanged.
+
+    """
+
+    if isinstance(attachment, six.string_types) or hasattr(attachment,
+                                                           'read'):
+        return FileAttachment(attachment)
+    return attachment
+
+
+def get_attachment_size(attachment):
+    """Returns the size of an attachment in bytes.
+
+    :argument attachment: A file path, a file object, or a ``(filename,
+        content, mimetype)`` tuple.
+    :returns: The size, or ``None`` if it isn't known (e.g. for MIME parts).
+    :rtype: :py:class:`int`
+
+    """
+
+    if isinstance(attachment, six.string_types):
+        return os.path.getsize(attachment)
+    if hasattr(attachment, 'read'):
+        size = getattr(attachment, 'size', None)
+        if size is None:
+            position = attachment.tell()
+            attachment.seek(0, os.SEEK_END)
+            size = attachment.tell()
+            attachment.seek(position)
+        return size
+    if isinstance(attachment, (list, tuple)):
+        content = attachment[1]
+        if isinstance(content, six.text_type):
+            content = content.encode('utf-8')
+        return len(content)
+    return None
+
+
+def get_attachment_storage():
+    """Returns the storage which large attachments are saved to.
+
+    This is ``EMAILFORM_ATTACHMENT_STORAGE``, a storage instance or the
+    dotted path to a storage class. There is no default, as Django's default
+    storage is usually public.
+
+    :raises django.core.exceptions.ImproperlyConfigured: If the setting is
+        not set.
+
+    """
+
+    storage = app_settings.ATTACHMENT_STORAGE
+    if storage is None:
+        raise ImproperlyConfigured(
+            'EMAILFORM_ATTACHMENT_STORAGE must be set to a private storage '
+            'to link to attachments.')
+    if isinstance(storage, six.string_types):
+        return import_string(storage)()
+    return storage
+
+
+def get_link_base_url():
+    """Returns the scheme and domain used for attachment links.
+
+    This is ``EMAILFORM_ATTACHMENT_LINK_BASE_URL`` if set, otherwise the
+    current :py:class:`~django.contrib.sites.models.Site`'s domain when the
+    sites framework is installed.
+
+    :raises django.core.exceptions.ImproperlyConfigured: If neither is
+        available, as relative links don't work in emails.
+    :rtype: :py:class:`unicode`
+
+    """
+
+    base_url = app_settings.ATTACHMENT_LINK_BASE_URL
+    if base_url is not None:
+        return base_url.rstrip('/')
+    from django.apps import apps
+    if apps.is_installed('django.contrib.sites'):
+        from django.contrib.sites.models import Site
+        return 'https://{0}'.format(Site.objects.get_current().domain)
+    raise ImproperlyConfigured(
+        'EMAILFORM_ATTACHMENT_LINK_BASE_URL must be set to link to '
+        'attachments when django.contrib.sites is not installed.')
+
+
+def make_attachment_link(attachment):
+    """Save an attachment to storage and return a signed link to download it.
+
+    The file is streamed to the storage in chunks. The link expires after
+    ``EMAILFORM_ATTACHMENT_LINK_MAX_AGE`` seconds.
+
+    :argument attachment: A file path, a file object, or a ``(filename,
+        content, mimetype)`` tuple.
+    :rtype: :py:class:`thecut.emailform.attachments.AttachmentLink`
+
+    """
+
+    try:
+        from django.urls import reverse
+    except ImportError:  # Django < 1.10
+        from django.core.urlresolvers import reverse
+    size = get_attachment_size(attachment)
+    opened = None
+    if isinstance(attachment, six.string_types):
+        filename = os.path.basename(attachment)
+        content = opened = File(open(attachment, 'rb'))
+    elif hasattr(attachment, 'read'):
+        filename = os.path.basename(getattr(attachment, 'name', None) or
+                                    'attachment')
+        content = attachment if isinstance(attachment, File) else File(
+            attachment)
+        content.seek(0)
+    else:
+        filename, content = attachment[0], attachment[1]
+        if isinstance(content, six.text_type):
+            content = content.encode('utf-8')
+        content = ContentFile(content)
+    try:
+        name = get_attachment_storage().save(
+            'emailform/attachments/{0}/{1}'.format(uuid.uuid4().hex,
+                                                   filename), content)
+    finally:
+        if opened is not None:
+            opened.close()
+
+    token = signing.dumps({'name': name, 'filename': filename},
+                          salt=LINK_SALT)
+    url = get_link_base_url() + reverse('emailform:attachment',
+                                        kwargs={'token': token})
+    expires = timezone.now() + timedelta(
+        seconds=app_settings.ATTACHMENT_LINK_MAX_AGE)
+    return AttachmentLink(filename, url, size, expires)
+
+
+def load_attachment_token(token):
+    """Returns the stored attachment a download link's token refers to.
+
+    :returns: The attachment's name in storage and its file name.
+    :rtype: :py:class:`tuple`
+    :raises django.core.signing.BadSignature: If the token is invalid or has
+        expired.
+
+    """
+
+    data = signing.loads(token, salt=LINK_SALT,
+                         max_age=app_settings.ATTACHMENT_LINK_MAX_AGE)
+    return data['name'], data['filename']
+
+
+def iter_message_bytes(email_message, linesep='\r\n'):
+    """Yields an email message's serialized bytes in chunks.
+
+    Each :py:class:`~thecut.emailform.attachments.FileAttachment` is read and
+    encoded as it is written, so it is never held in memory.
+
+    :argument email_message: Email message instance.
+    :keyword unicode linesep: Line separator.
+
+    """
+
+    parts = dict(('{{emailform-attachment-{0}}}'.format(uuid.uuid4().hex),
+                  attachment) for attachment in email_message.attachments
+                 if isinstance(attachment, FileAttachment))
+    for placeholder, part in parts.items():
+        part._placeholder = placeholder
+    try:
+        data = email_message.message().as_bytes(linesep=linesep)
+        if six.PY2:
+            # Python 2 ignores linesep and may return text.
+            data = re.sub(br'\r?\n', linesep.encode('ascii'),
+                          data.encode('utf-8') if isinstance(
+                              data, six.text_type) else data)
+    finally:
+        for part in parts.values():
+            part._placeholder = None
+
+    if not parts:
+        yield data
+        return
+
+    pattern = re.compile(b'|'.join(re.escape(placeholder.encode('ascii'))
+                                   for placeholder in parts))
+    position = 0
+    for match in pattern.finditer(data):
+        yield data[position:match.start()]
+        for chunk in parts[match.group().decode('ascii')].iter_base64(
+                linesep):
+            yield chunk
+        position = match.end()
+    yield data[position:]
+
+
+def sendmail(connection, from_addr, to_addrs, chunks):
+    """Send a message over an open :py:class:`smtplib.SMTP` connection,
+    writing it to the socket a chunk at a time.
+
+    Behaves like :py:meth:`smtplib.SMTP.sendmail`, except that ``chunks`` is
+    an iterable of byte strings using ``CRLF`` line endings.
+
+    :returns: Refused recipients.
+    :rtype: :py:class:`dict`
+
+    """
+
+    connection.ehlo_or_helo_if_needed()
+    code, response = connection.mail(from_addr)
+    if code != 250:
+        _reset(connection, code)
+        raise smtplib.SMTPSenderRefused(code, response, from_addr)
+
+    refused = {}
+    for to_addr in to_addrs:
+        code, response = connection.rcpt(to_addr)
+        if code not in (250, 251):
+            refused[to_addr] = (code, response)
+    if len(refused) == len(to_addrs):
+        _reset(connection, None)
+        raise smtplib.SMTPRecipientsRefused(refused)
+
+    connection.putcmd('data')
+    code, response = connection.getreply()
+    if code != 354:
+        _reset(connection, code)
+        raise smtplib.SMTPDataError(code, response)
+
+    last = b'\r\n'
+    for chunk in chunks:
+        if chunk:
+            connection.send(re.sub(br'(?m)^\.', b'..', chunk))
+            last = chunk
+    connection.send(b'.\r\n' if last.endswith(b'\r\n') else b'\r\n.\r\n')
+    code, response = connection.getreply()
+    if code != 250:
+        _reset(connection, code)
+        raise smtplib.SMTPDataError(code, response)
+    return refused
+
+
+def _reset(connection, code):
+    if code == 421:
+        connection.close()
+    else:
+        try:
+            connection.rset()
+        except smtplib.SMTPServerDisconnected:
+            pass
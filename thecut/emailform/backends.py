@@ -0,0 +1,571 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from .attachments import FileAttachment, iter_message_bytes, sendmail
+from .settings import app_settings
+from django.conf import settings as django_settings
+from django.core.mail.backends import smtp
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.message import sanitize_address
+from django.utils import six
+import os
+import smtplib
+import socket
+import threading
+import time
+
+
+class PoolTimeout(smtplib.SMTPException):
+    """Raised when no pooled SMTP connection becomes free in time."""
+
+
+class BackendsUnavailable(smtplib.SMTPException):
+    """Raised when every backend of a
+    :py:class:`~thecut.emailform.backends.FailoverBackend` has failed or has
+    an open circuit breaker."""
+
+
+class PooledConnection(object):
+    """An SMTP connection held by a
+    :py:class:`~thecut.emailform.backends.ConnectionPool`."""
+
+    __slots__ = ['connection', 'created_at', 'last_used', 'messages_sent',
+                 'broken']
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = self.last_used = time.time()
+        self.messages_sent = 0
+        self.broken = False
+
+    def close(self):
+        try:
+            self.connection.quit()
+        except (smtplib.SMTPException, socket.error):
+            try:
+                self.connection.close()
+            except socket.error:
+                pass
+
+    def is_alive(self):
+        try:
+            return self.connection.noop()[0] == 250
+        except (smtplib.SMTPException, socket.error):
+            return False
+
+
+class ConnectionPool(object):
+    """A bounded, thread-safe pool of open SMTP connections.
+
+    :argument connect: Callable which returns a new, authenticated SMTP
+        connection.
+    :keyword int max_size: Maximum number of open connections.
+    :keyword float idle_timeout: Seconds an unused connection is kept open.
+    :keyword float check_interval: Seconds a connection can be unused
+        before it is checked with ``NOOP`` when taken from the pool.
+    :keyword int max_messages: Number of messages sent over a connection
+        before it is replaced.
+    :keyword float timeout: Seconds to wait for a free connection.
+
+    """
+
+    def __init__(self, connect, max_size=None, idle_timeout=None,
+                 check_interval=None, max_messages=None, timeout=None):
+        self.connect = connect
+        self.max_size = (app_settings.SMTP_POOL_SIZE if max_size is None
+                         else max_size)
+        self.idle_timeout = (app_settings.SMTP_POOL_IDLE_TIMEOUT
+                             if idle_timeout is None else idle_timeout)
+        self.check_interval = (app_settings.SMTP_POOL_CHECK_INTERVAL
+                               if check_interval is None else check_interval)
+        self.max_messages = (app_settings.SMTP_POOL_MAX_MESSAGES
+                             if max_messages is None else max_messages)
+        self.timeout = (app_settings.SMTP_POOL_TIMEOUT if timeout is None
+                        else timeout)
+        self._idle = []
+        self._size = 0
+        self._condition = threading.Condition(threading.Lock())
+
+    def acquire(self):
+        """Take a connection from the pool, opening one if needed.
+
+        :returns: A pooled connection.
+        :rtype: :py:class:`thecut.emailform.backends.PooledConnection`
+        :raises thecut.emailform.backends.PoolTimeout: If every connection is
+            in use for longer than the pool's timeout.
+
+        """
+
+        deadline = time.time() + self.timeout
+        while True:
+            with self._condition:
+                expired = self._pop_expired()
+                pooled = None
+                if self._idle:
+                    pooled = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise PoolTimeout('No SMTP connection became free '
+                                          'within {0} seconds.'.format(
+                                              self.timeout))
+                    self._condition.wait(remaining)
+                    continue
+            self._close_all(expired)
+
+            if pooled is None:
+                try:
+                    return PooledConnection(self.connect())
+                except Exception:
+                    self._discard()
+                    raise
+
+            if (time.time() - pooled.last_used < self.check_interval or
+                    pooled.is_alive()):
+                return pooled
+            pooled.close()
+            self._discard()
+
+    def release(self, pooled):
+        """Return a connection to the pool.
+
+        Broken connections, and connections which have sent
+        ``max_messages`` messages, are closed instead.
+
+        """
+
+        if pooled.broken or pooled.messages_sent >= self.max_messages:
+            pooled.close()
+            self._discard()
+            return
+        pooled.last_used = time.time()
+        with self._condition:
+            self._idle.append(pooled)
+            self._condition.notify()
+
+    def fill(self, count=None):
+        """Open idle connections until the pool holds ``count`` (by default,
+        ``max_size``) connections.
+
+        :returns: Number of connections opened.
+        :rtype: :py:class:`int`
+
+        """
+
+        count = self.max_size if count is None else min(count, self.max_size)
+        opened = []
+        with self._condition:
+            needed = max(count - self._size, 0)
+            self._size += needed
+        try:
+            for _ in range(needed):
+                opened.append(PooledConnection(self.connect()))
+        finally:
+            for _ in range(needed - len(opened)):
+                self._discard()
+            for pooled in opened:
+                self.release(pooled)
+        return len(opened)
+
+    def reap(self):
+        """Close connections which have been idle for too long."""
+        with self._condition:
+            expired = self._pop_expired()
+        self._close_all(expired)
+
+    def close(self):
+        """Close every idle connection."""
+        with self._condition:
+            idle, self._idle = self._idle, []
+        self._close_all(idle)
+
+    def _close_all(self, connections):
+        for pooled in connections:
+            pooled.close()
+            self._discard()
+
+    def _discard(self):
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def _pop_expired(self):
+        cutoff = time.time() - self.idle_timeout
+        expired = [pooled for pooled in self._idle
+                   if pooled.last_used < cutoff]
+        if expired:
+            self._idle = [pooled for pooled in self._idle
+                          if pooled.last_used >= cutoff]
+        return expired
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = os.getpid()
+
+
+def _check_pools_pid():
+    # A process forked after connections were opened (such as a server which
+    # loads the app before forking its workers) inherits the parent's
+    # sockets. Using them would interleave both processes' SMTP sessions, so
+    # the child drops the inherited pools, without closing their connections
+    # (which would end the parent's sessions), and opens its own.
+    global _pools, _pools_lock, _pools_pid
+    pid = os.getpid()
+    if pid != _pools_pid:
+        _pools, _pools_lock, _pools_pid = {}, threading.Lock(), pid
+
+
+def close_pools():
+    """Close every idle connection in every pool."""
+    _check_pools_pid()
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
+
+
+class StreamingSMTPMixin(object):
+    """Streams :py:class:`~thecut.emailform.attachments.FileAttachment`
+    attachments to the SMTP server instead of building the whole message in
+    memory."""
+
+    def _send(self, email_message):
+        if not any(isinstance(attachment, FileAttachment)
+                   for attachment in email_message.attachments):
+            return super(StreamingSMTPMixin, self)._send(email_message)
+        if not email_message.recipients():
+            return False
+        encoding = email_message.encoding or django_settings.DEFAULT_CHARSET
+        from_email = sanitize_address(email_message.from_email, encoding)
+        recipients = [sanitize_address(address, encoding)
+                      for address in email_message.recipients()]
+        try:
+            sendmail(self.connection, from_email, recipients,
+                     iter_message_bytes(email_message, linesep='\r\n'))
+        except smtplib.SMTPException:
+            if not self.fail_silently:
+                raise
+            return False
+        return True
+
+
+class StreamingSMTPBackend(StreamingSMTPMixin, smtp.EmailBackend):
+    """Django's SMTP email backend, with streamed file attachments."""
+
+
+class PooledSMTPBackend(StreamingSMTPMixin, smtp.EmailBackend):
+    """An SMTP email backend which reuses open connections.
+
+    Connections are shared between backend instances in the same process,
+    pooled by server and credentials. A forked process doesn't use the
+    connections it inherits, and opens its own. Accepts the same arguments
+    as Django's SMTP email backend. File attachments are streamed, as with
+    :py:class:`~thecut.emailform.backends.StreamingSMTPBackend`.
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(PooledSMTPBackend, self).__init__(*args, **kwargs)
+        self._pooled = None
+
+    def get_pool(self):
+        """Returns the connection pool for this backend's server.
+
+        :rtype: :py:class:`thecut.emailform.backends.ConnectionPool`
+
+        """
+
+        key = (self.host, self.port, self.username, self.password,
+               self.use_tls, self.use_ssl, self.timeout, self.ssl_keyfile,
+               self.ssl_certfile)
+        _check_pools_pid()
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(self._get_connector())
+            return pool
+
+    def open(self):
+        if self.connection:
+            return False
+        try:
+            self._pooled = self.get_pool().acquire()
+        except (smtplib.SMTPException, socket.error):
+            if not self.fail_silently:
+                raise
+            return None
+        self.connection = self._pooled.connection
+        return True
+
+    def close(self):
+        if self.connection is None:
+            return
+        pooled, self._pooled = self._pooled, None
+        self.connection = None
+        self.get_pool().release(pooled)
+
+    def _get_connector(self):
+        kwargs = {'host': self.host, 'port': self.port,
+                  'username': self.username, 'password': self.password,
+                  'use_tls': self.use_tls, 'use_ssl': self.use_ssl,
+                  'timeout': self.timeout, 'ssl_keyfile': self.ssl_keyfile,
+                  'ssl_certfile': self.ssl_certfile}
+
+        def connect():
+            backend = smtp.EmailBackend(**kwargs)
+            backend.open()
+            return backend.connection
+
+        return connect
+
+    def send_messages(self, email_messages):
+        # Django only closes the connection it opened when every message is
+        # sent without an exception, which would keep the pooled connection
+        # out of the pool for good.
+        opened = self.connection is None
+        try:
+            return super(PooledSMTPBackend, self).send_messages(
+                email_messages)
+        finally:
+            if opened:
+                self.close()
+
+    def _send(self, email_message):
+        try:
+            sent = super(PooledSMTPBackend, self)._send(email_message)
+        except Exception:
+            self._pooled.broken = True
+            raise
+        if sent:
+            self._pooled.messages_sent += 1
+        elif email_message.recipients():
+            self._pooled.broken = True
+        return sent
+
+
+class CircuitBreaker(object):
+    """Tracks the health of an email backend.
+
+    The breaker is *closed* while the backend is healthy. After
+    ``failure_threshold`` consecutive failures it *opens*, and the backend is
+    skipped. Once ``reset_timeout`` seconds have passed it is *half-open*: a
+    single send is allowed through as a probe, which closes the breaker if it
+    succeeds or opens it again if it fails.
+
+    :keyword int failure_threshold: Consecutive failures which open the
+        breaker.
+    :keyword float reset_timeout: Seconds the breaker stays open before a
+        probe is allowed.
+
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=None, reset_timeout=None):
+        self.failure_threshold = (app_settings.FAILOVER_THRESHOLD
+                                  if failure_threshold is None
+                                  else failure_threshold)
+        self.reset_timeout = (app_settings.FAILOVER_RESET_TIMEOUT
+                              if reset_timeout is None else reset_timeout)
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._get_state(time.time())
+
+    def allow(self):
+        """Returns whether a send should be attempted with the backend.
+
+        :rtype: :py:class:`bool`
+
+        """
+
+        with self._lock:
+            state = self._get_state(time.time())
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.time()
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def _get_state(self, now):
+        if self.opened_at is None:
+            return self.CLOSED
+        if now - self.opened_at < self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(key):
+    """Returns the process-wide circuit breaker for a backend.
+
+    :argument key: A hashable value identifying the backend.
+    :rtype: :py:class:`thecut.emailform.backends.CircuitBreaker`
+
+    """
+
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = _breakers[key] = CircuitBreaker()
+        return breaker
+
+
+def reset_breakers():
+    """Forget the health of every backend."""
+    with _breakers_lock:
+        _breakers.clear()
+
+
+class FailoverBackend(BaseEmailBackend):
+    """An email backend which sends each message with the first healthy
+    backend from an ordered list.
+
+    Each backend has a process-wide
+    :py:class:`~thecut.emailform.backends.CircuitBreaker`. A backend which
+    raises an exception is counted as failing and the next backend is tried;
+    once its breaker opens, it is skipped without being tried until the
+    breaker's reset timeout has passed. Give backends a short ``timeout`` so
+    a relay which hangs is detected quickly.
+
+    Recipient and sender refusals, and permanent (``5xx``) responses to the
+    message's data such as it being rejected as too large, are raised
+    straight away without counting against the backend, as other backends
+    would refuse the message too. Other errors, including authentication
+    and connection refusals, count as the backend failing.
+
+    :keyword list backends: Each backend's dotted path, or a dictionary with
+        the dotted path as ``'BACKEND'`` and the backend's keyword arguments,
+        e.g. ``{'BACKEND': 'django.core.mail.backends.smtp.EmailBackend',
+        'host': 'relay2.example.com', 'timeout': 5}``. Defaults to the
+        ``EMAILFORM_EMAIL_BACKENDS`` setting.
+
+    """
+
+    message_errors = (smtplib.SMTPRecipientsRefused,
+                      smtplib.SMTPSenderRefused)
+
+    def __init__(self, backends=None, fail_silently=False, **kwargs):
+        super(FailoverBackend, self).__init__(fail_silently=fail_silently)
+        if backends is None:
+            backends = app_settings.EMAIL_BACKENDS or []
+        self.backends = []
+        for backend in backends:
+            if isinstance(backend, six.string_types):
+                path, options = backend, {}
+            else:
+                options = dict(backend)
+                path = options.pop('BACKEND')
+            key = (path, tuple(sorted(options.items())))
+            self.backends.append((path, options, get_breaker(key)))
+        self._connections = {}
+        self._open = False
+
+    def open(self):
+        # Each backend's connection is opened when it is first used.
+        if self._open:
+            return False
+        self._open = True
+        return True
+
+    def close(self):
+        self._open = False
+        for index in list(self._connections):
+            self._close_connection(index)
+
+    def send_messages(self, email_messages):
+        email_messages = list(email_messages)
+        if not email_messages:
+            return 0
+        opened = self.open()
+        sent = 0
+        try:
+            for message in email_messages:
+                try:
+                    sent += self._send(message)
+                except Exception:
+                    if not self.fail_silently:
+                        raise
+        finally:
+            if opened:
+                self.close()
+        return sent
+
+    def _close_connection(self, index):
+        connection = self._connections.pop(index, None)
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def _get_connection(self, index):
+        connection = self._connections.get(index)
+        if connection is None:
+            from django.core.mail import get_connection
+            path, options, breaker = self.backends[index]
+            connection = get_connection(path, **options)
+            connection.open()
+            self._connections[index] = connection
+        return connection
+
+    def is_message_error(self, error):
+        """Returns whether an error is caused by the message, rather than by
+        the backend.
+
+        :rtype: :py:class:`bool`
+
+        """
+
+        if isinstance(error, self.message_errors):
+            return True
+        return (isinstance(error, smtplib.SMTPDataError) and
+                isinstance(error.smtp_code, int) and
+                500 <= error.smtp_code < 600)
+
+    def _send(self, message):
+        error = None
+        for index, (path, options, breaker) in enumerate(self.backends):
+            if not breaker.allow():
+                continue
+            try:
+                sent = self._get_connection(index).send_messages([message])
+            except Exception as exception:
+                if self.is_message_error(exception):
+                    breaker.record_success()
+                    raise
+                error = exception
+                breaker.record_failure()
+                self._close_connection(index)
+                continue
+            breaker.record_success()
+            return sent
+        if error is not None:
+            raise error
+        raise BackendsUnavailable('Every email backend is unavailable.')
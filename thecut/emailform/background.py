@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from .settings import app_settings
+from django.db import close_old_connections
+from django.utils.six.moves import queue
+import atexit
+import threading
+import time
+
+
+class QueueFull(Exception):
+    """Raised when submitting to a background sender whose queue is full."""
+
+
+class SendJob(object):
+    """A single email message waiting to be sent by a background sender."""
+
+    def __init__(self, message):
+        self.message = message
+        self.result = None
+        self.exception = None
+        self._callbacks = []
+        self._cancelled = False
+        self._started = False
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    def add_done_callback(self, callback):
+        """Call ``callback(job)`` once the job has finished.
+
+        If the job has already finished, the callback is called immediately.
+
+        """
+
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def cancel(self):
+        """Cancel the job if it has not started sending yet.
+
+        :returns: Whether the job was cancelled.
+        :rtype: :py:class:`bool`
+
+        """
+
+        with self._lock:
+            if self._started or self._done.is_set():
+                return self._cancelled
+            self._cancelled = True
+        self._finish()
+        return True
+
+    def cancelled(self):
+        return self._cancelled
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the job has finished, or ``timeout`` seconds pass.
+
+        :returns: Whether the job has finished.
+        :rtype: :py:class:`bool`
+
+        """
+
+        self._done.wait(timeout)
+        return self.done()
+
+    def run(self):
+        with self._lock:
+            if self._cancelled:
+                return
+            self._started = True
+        try:
+            self.result = self.message.send()
+        except Exception as error:
+            self.exception = error
+        self._finish()
+
+    def _finish(self):
+        with self._lock:
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+
+class BackgroundSender(object):
+    """Sends email messages from a bounded pool of worker threads.
+
+    :keyword int max_workers: Number of worker threads.
+    :keyword int max_queue_size: Maximum number of messages waiting to be
+        sent. ``0`` means the queue is unbounded.
+
+    """
+
+    def __init__(self, max_workers=None, max_queue_size=None):
+        if max_workers is None:
+            max_workers = app_settings.BACKGROUND_MAX_WORKERS
+        if max_queue_size is None:
+            max_queue_size = app_settings.BACKGROUND_MAX_QUEUE_SIZE
+        self.max_workers = max_workers
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._threads = []
+        self._shutdown = False
+        self._lock = threading.Lock()
+
+    def submit(self, message, on_success=None, on_failure=None):
+        """Queue an email message to be sent by a worker thread.
+
+        Callbacks are called from the worker thread; ``on_success`` with the
+        message and the backend's return value, ``on_failure`` with the
+        message and the raised exception.
+
+        :argument message: Email message instance.
+        :returns: The queued job.
+        :rtype: :py:class:`thecut.emailform.background.SendJob`
+        :raises thecut.emailform.background.QueueFull: If the queue is full.
+
+        """
+
+        job = SendJob(message)
+
+        def callback(job):
+            if job.cancelled():
+                return
+            if job.exception is None:
+                if on_success is not None:
+                    on_success(job.message, job.result)
+            elif on_failure is not None:
+                on_failure(job.message, job.exception)
+
+        job.add_done_callback(callback)
+
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError('Cannot submit to a background sender '
+                                   'after it has been shut down.')
+            self._start_workers()
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise QueueFull('Background email queue is full.')
+        return job
+
+    def shutdown(self, wait=True, timeout=None):
+        """Stop accepting messages and stop the worker threads.
+
+        Messages already queued are sent before the workers exit.
+
+        :keyword bool wait: Whether to wait for queued messages to be sent.
+        :keyword float timeout: Maximum number of seconds to wait.
+
+        """
+
+        with self._lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+            threads = list(self._threads)
+
+        for thread in threads:
+            self._queue.put(None)
+
+        if wait:
+            deadline = None if timeout is None else time.time() + timeout
+            for thread in threads:
+                remaining = None
+                if deadline is not None:
+                    remaining = max(deadline - time.time(), 0)
+                thread.join(remaining)
+
+    def _start_workers(self):
+        while len(self._threads) < self.max_workers:
+            thread = threading.Thread(
+                target=self._work,
+                name='emailform-sender-{0}'.format(len(self._threads)))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                # As Django does for each request, connections which can't
+                # be used are closed before the job, and connections are
+                # closed after it unless CONN_MAX_AGE keeps them open. The
+                # job's callbacks may use the database, e.g. to move failed
+                # emails to the outbox.
+                close_old_connections()
+                try:
+                    job.run()
+                finally:
+                    close_old_connections()
+            finally:
+                self._queue.task_done()
+
+
+_sender = None
+_sender_lock = threading.Lock()
+
+
+def get_sender():
+    """Returns the process-wide background sender, creating it if needed.
+
+    :rtype: :py:class:`thecut.emailform.background.BackgroundSender`
+
+    """
+
+    global _sender
+    with _sender_lock:
+        if _sender is None:
+            _sender = BackgroundSender()
+            atexit.register(_sender.shutdown,
+                            timeout=app_settings.BACKGROUND_SHUTDOWN_TIMEOUT)
+        return _sender
@@ -1,11 +1,78 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, unicode_literals
-from . import settings
+from . import addresses, mail, metrics, rendering
+from .attachments import (get_attachment_size, make_attachment,
+                          make_attachment_link)
+from .settings import app_settings
 from collections import OrderedDict
 from copy import copy
 from django import forms
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import get_template
+from django.core.exceptions import ImproperlyConfigured
+from django.forms.forms import pretty_name
+from django.utils import six
+from django.utils.encoding import force_text
+import functools
+import hashlib
+import json
+import logging
+import types
+
+
+logger = logging.getLogger(__name__)
+
+
+class EmailFormField(object):
+    """A form field's label and cleaned value, for use in email templates.
+
+    Can be used like the dictionaries previously returned by
+    :py:meth:`~thecut.emailform.forms.BaseEmailForm.get_email_form_fields`,
+    e.g. ``data['label']``. The bound field is only created if it is used.
+
+    """
+
+    __slots__ = ['form', 'name', 'label', 'cleaned_data']
+
+    def __init__(self, form, name, label, cleaned_data):
+        self.form = form
+        self.name = name
+        self.label = label
+        self.cleaned_data = cleaned_data
+
+    def __getitem__(self, key):
+        if key not in ('field', 'label', 'cleaned_data'):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    @property
+    def field(self):
+        """The form's :py:class:`~django.forms.BoundField` for this field."""
+        return self.form[self.name]
+
+
+class LazyValue(object):
+    """A context value which is only computed if a template uses it.
+
+    Django's templates call callables they find in the context. A lazy value
+    calls its function the first time it is used, and returns the same result
+    each time after that, so the function is called at most once for all of
+    the templates rendered with the same context.
+
+    :argument function: Callable which takes no arguments and returns the
+        value.
+
+    """
+
+    __slots__ = ['function', '_value']
+
+    def __init__(self, function):
+        self.function = function
+
+    def __call__(self):
+        try:
+            return self._value
+        except AttributeError:
+            self._value = self.function()
+            return self._value
 
 
 class BaseEmailForm(forms.Form):
@@ -16,55 +83,324 @@ class BaseEmailForm(forms.Form):
 
     """
 
-    from_email = settings.DEFAULT_FROM_EMAIL
-    """The email address to send email to."""
+    attachment_link_threshold = None
+    """The size in bytes above which attachments are saved to storage and
+    linked to from the email, instead of being attached. Defaults to the
+    ``EMAILFORM_ATTACHMENT_LINK_THRESHOLD`` setting; ``None`` attaches
+    every file."""
+
+    auto_reply_email_field = None
+    """The name of a field holding the submitter's email address, such as
+    ``'email'``. When set, an automatic reply is sent to that address as well
+    as the usual email."""
+
+    auto_reply_subject = 'Thank you for your enquiry'
+    """The automatic reply's subject, which is given the same prefix as
+    :py:attr:`thecut.emailform.forms.BaseEmailForm.email_subject`."""
+
+    auto_reply_template_name = 'emailform/auto_reply.txt'
+    """The path to a Django template that should be used to generate the
+    automatic reply's body."""
+
+    from_email = None
+    """The email address to send email from. Defaults to the
+    ``EMAILFORM_DEFAULT_FROM_EMAIL`` setting."""
 
     reply_to_emails = []
     """A list of email addresses to include in the ``Reply-To`` header of the
     email."""
 
-    to_emails = settings.DEFAULT_TO_EMAILS
-    """A list of email addresses to send the email to."""
+    to_emails = None
+    """A list of email addresses to send the email to. Defaults to the
+    ``EMAILFORM_DEFAULT_TO_EMAILS`` setting."""
 
     cc_emails = []
     """A list of email addresses to CC the email to."""
 
     email_context_data = {}
-    """Data to pass to the template context when generating the email body."""
+    """Data to pass to the template context when generating the email body.
+    Functions are only called if a template uses their value (see
+    :py:meth:`~thecut.emailform.forms.BaseEmailForm.get_email_context_data`).
+    """
+
+    digest_interval = None
+    """The maximum number of minutes a submission waits before a digest
+    email is sent. Defaults to the ``EMAILFORM_DIGEST_INTERVAL`` setting."""
+
+    digest_max_items = None
+    """The number of submissions which trigger a digest email. Defaults to the
+    ``EMAILFORM_DIGEST_MAX_ITEMS`` setting."""
+
+    digest_template_name = 'emailform/digest.txt'
+    """The path to a Django template that should be used to generate the
+    digest email body."""
+
+    email_delivery = None
+    """How the email is delivered: ``'immediate'`` sends it straight away,
+    ``'queue'`` stores it in the outbox to be sent by the ``emailform_worker``
+    management command, and ``'digest'`` combines submissions into periodic
+    digest emails. Defaults to the ``EMAILFORM_EMAIL_DELIVERY`` setting."""
+
+    email_backends = None
+    """An ordered list of email backends to send the email with, as
+    accepted by :py:class:`~thecut.emailform.backends.FailoverBackend`. Each
+    email is sent with the first healthy backend. Defaults to the
+    ``EMAILFORM_EMAIL_BACKENDS`` setting."""
 
     email_headers = {}
     """Any custom headers to attach to the email."""
 
+    fast_mime = None
+    """Whether to build emails with
+    :py:class:`~thecut.emailform.mime.FastEmailMessage`, which serializes
+    emails without attachments more quickly. Defaults to the
+    ``EMAILFORM_FAST_MIME`` setting."""
+
     email_subject = 'Enquiry'
     """The email's subject."""
 
-    email_subject_prefix = settings.EMAIL_SUBJECT_PREFIX
+    email_subject_prefix = None
     """The email's subject prefix. This is attached directly to the start of
     :py:attr:`thecut.emailform.forms.BaseEmailForm.email_subject` to form
-    the email's subject."""
+    the email's subject. Defaults to the ``EMAILFORM_EMAIL_SUBJECT_PREFIX``
+    setting."""
+
+    email_html_template_name = None
+    """The path to a Django template that should be used to generate an HTML
+    alternative to the email body, such as ``'emailform/email.html'``. CSS in
+    the template's ``<style>`` elements is moved into ``style`` attributes,
+    once per template."""
 
     email_template_name = 'emailform/email.txt'
     """The path to a Django template that should be used to generate the email
     body."""
 
+    idempotency_token_field = None
+    """The name of a field whose value uniquely identifies a submission, such
+    as a hidden field holding a random token. When not set, submissions are
+    identified by their cleaned data."""
+
     error_css_class = 'error'
     label_suffix = ''
     required_css_class = 'required'
 
+    def add_to_digest(self):
+        """Store a valid form's data to be sent in the next digest email.
+
+        The digest is sent straight away if it is due.
+
+        :returns: The stored submission.
+        :rtype: :py:class:`thecut.emailform.models.DigestEntry`
+
+        """
+
+        from .models import DigestEntry
+        entry = DigestEntry.objects.add(self)
+        try:
+            DigestEntry.objects.flush(self.__class__)
+        except Exception:
+            logger.exception('Failed to send digest email, it will be sent '
+                             'by the emailform_worker command.')
+        return entry
+
+    def construct_auto_reply_email(self, context):
+        """Construct the automatic reply to the submitter of a valid form.
+
+        :argument dict context: Context data dictionary, shared with the
+            form's email.
+        :returns: Email message instance, or ``None`` if there is no address
+            to reply to.
+        :rtype: :py:class:`~django.core.mail.EmailMultiAlternatives`
+
+        """
+
+        try:
+            to = addresses.normalise_addresses(
+                self.get_auto_reply_to_emails())
+        except addresses.InvalidAddress as error:
+            logger.warning('Not sending automatic reply: %s', error)
+            return None
+        if not to:
+            return None
+        from django.template.loader import get_template
+        template = get_template(self.get_auto_reply_template_name())
+        return self.get_email_message_class()(
+            subject=self.get_auto_reply_subject(),
+            body=template.render(context),
+            from_email=addresses.normalise_address(self.get_from_email()),
+            reply_to=addresses.normalise_addresses(
+                self.get_auto_reply_reply_to_emails()),
+            to=to,
+            headers=self.get_email_headers(),
+            connection=self.get_email_connection(),
+        )
+
+    def construct_digest_email(self, submissions):
+        """Construct a digest email for stored submissions.
+
+        This is called on an unbound form, from
+        :py:meth:`~thecut.emailform.forms.BaseEmailForm.get_digest_form`.
+
+        :argument list submissions: Dictionaries with the ``created_at`` time
+            and ``form_fields`` of each submission.
+        :returns: Email message instance.
+        :rtype: :py:class:`~django.core.mail.EmailMultiAlternatives`
+
+        """
+
+        from django.template.loader import get_template
+        context = {'form': self, 'submissions': submissions}
+        context.update(_make_lazy(self.email_context_data))
+        template = get_template(self.get_digest_template_name())
+        return self.get_email_message_class()(
+            subject=self.get_digest_subject(len(submissions)),
+            body=template.render(context),
+            from_email=addresses.normalise_address(self.get_from_email()),
+            reply_to=addresses.normalise_addresses(
+                self.get_reply_to_emails()),
+            to=addresses.normalise_addresses(self.get_to_emails()),
+            cc=addresses.normalise_addresses(self.get_cc_emails()),
+            headers=self.get_email_headers(),
+            connection=self.get_email_connection(),
+        )
+
+    def get_attachment_link_threshold(self):
+        """Returns the size in bytes above which attachments are linked to
+        instead of attached.
+
+        :returns: A size, or ``None`` to attach every file.
+        :rtype: :py:class:`int`
+
+        """
+
+        if self.attachment_link_threshold is None:
+            return app_settings.ATTACHMENT_LINK_THRESHOLD
+        return self.attachment_link_threshold
+
+    def get_auto_reply_reply_to_emails(self):
+        """Returns a list of email addresses for use as the automatic reply's
+        ``reply_to`` value, so the submitter's replies reach the form's
+        recipients.
+
+        :returns: List of email address strings.
+        :rtype: :py:class:`list`
+
+        """
+
+        return self.get_reply_to_emails() or self.get_to_emails()
+
+    def get_auto_reply_subject(self):
+        """Returns a string for use as the automatic reply's ``subject``
+        value.
+
+        :rtype: :py:class:`unicode`
+
+        """
+
+        return self.get_email_subject(self.auto_reply_subject)
+
+    def get_auto_reply_template_name(self):
+        """Returns a template name which will be used when rendering the
+        automatic reply.
+
+        :rtype: :py:class:`unicode`
+
+        """
+
+        return self.auto_reply_template_name
+
+    def get_auto_reply_to_emails(self):
+        """Returns a list of email addresses to send the automatic reply to.
+
+        :returns: The address submitted in the ``auto_reply_email_field``
+            field, or an empty list if it isn't set or wasn't given.
+        :rtype: :py:class:`list`
+
+        """
+
+        if not self.auto_reply_email_field:
+            return []
+        email = self.cleaned_data.get(self.auto_reply_email_field)
+        return [email] if email else []
+
+    @classmethod
+    def get_digest_form(cls):
+        """Returns an unbound form used to construct digest emails.
+
+        Override this if the form can't be created without arguments.
+
+        """
+
+        return cls()
+
+    def get_digest_interval(self):
+        """Returns the maximum number of minutes before a digest is sent.
+
+        :rtype: :py:class:`int`
+
+        """
+
+        if self.digest_interval is None:
+            return app_settings.DIGEST_INTERVAL
+        return self.digest_interval
+
+    def get_digest_max_items(self):
+        """Returns the number of submissions which trigger a digest email.
+
+        :rtype: :py:class:`int`
+
+        """
+
+        if self.digest_max_items is None:
+            return app_settings.DIGEST_MAX_ITEMS
+        return self.digest_max_items
+
+    def get_digest_subject(self, count):
+        """Returns a string for use as a digest email's ``subject`` value.
+
+        :argument int count: The number of submissions in the digest.
+        :rtype: :py:class:`unicode`
+
+        """
+
+        return self.get_email_subject('{0} digest ({1} submissions)'.format(
+            self.email_subject, count))
+
+    def get_digest_template_name(self):
+        """Returns a template name which will be used when rendering a digest
+        email.
+
+        :rtype: :py:class:`unicode`
+
+        """
+
+        return self.digest_template_name
+
     def get_email_alternatives(self, context):
         """Returns a list of tuples used to attach alternative content to the
         email.
 
+        By default, this is an HTML alternative if
+        ``email_html_template_name`` is set.
+
         :returns: A list of tuples.
         :rtype: :py:class:`list`
 
         """
 
-        return []
+        template_name = self.get_email_html_template_name()
+        if template_name is None:
+            return []
+        return [(self.render_email_html(context, template_name), 'text/html')]
 
     def get_email_attachments(self):
         """Returns a list of attachments which will be added to the email.
 
+        As well as anything accepted by Django's
+        :py:class:`~django.core.mail.EmailMessage`, the list can contain file
+        paths and file objects (such as uploaded files), which are read when
+        the email is sent.
+
         :returns: A list.
         :rtype: :py:class:`list`
 
@@ -75,6 +411,11 @@ class BaseEmailForm(forms.Form):
     def get_email_context_data(self, **kwargs):
         """Returns a data dictionary for use when rendering the email context.
 
+        Functions in ``email_context_data`` and ``kwargs`` are wrapped in a
+        :py:class:`~thecut.emailform.forms.LazyValue`, so they are only
+        called if a template uses them, and only once for all of the
+        templates rendered with the returned dictionary.
+
         :returns: A dictionary.
         :rtype: :py:class:`dict`
 
@@ -84,16 +425,70 @@ class BaseEmailForm(forms.Form):
                         'form_fields': self.get_email_form_fields()}
         context_data.update(self.email_context_data)
         context_data.update(**kwargs)
-        return context_data
+        return _make_lazy(context_data)
+
+    @classmethod
+    def get_default_field_labels(cls):
+        """Returns the label used for each of the class's declared fields when
+        the field doesn't define one. Cached per class.
+
+        :rtype: :py:class:`dict`
+
+        """
+
+        labels = cls.__dict__.get('_default_field_labels')
+        if labels is None:
+            labels = dict((name, pretty_name(name))
+                          for name in cls.base_fields)
+            cls._default_field_labels = labels
+        return labels
 
     def get_email_form_fields(self):
+        """Returns each field's label and cleaned value, in field order.
+
+        :returns: An ordered dictionary of
+            :py:class:`~thecut.emailform.forms.EmailFormField` instances,
+            keyed by field name.
+        :rtype: :py:class:`~collections.OrderedDict`
+
+        """
+
+        default_labels = self.get_default_field_labels()
+        cleaned_data = self.cleaned_data
         data = OrderedDict()
-        for field in self:
-            cleaned_data = self.cleaned_data.get(field.name, None)
-            data.update({field.name: {'field': field, 'label': field.label,
-                                      'cleaned_data': cleaned_data}})
+        for name, field in self.fields.items():
+            label = field.label
+            if label is None:
+                label = default_labels.get(name) or pretty_name(name)
+            data[name] = EmailFormField(self, name, label,
+                                        cleaned_data.get(name))
         return data
 
+    def get_email_connection(self):
+        """Returns the email backend instance used to send the email.
+
+        :returns: A :py:class:`~thecut.emailform.backends.FailoverBackend`
+            if the form has several email backends, otherwise the backend
+            from :py:func:`~thecut.emailform.mail.get_connection`.
+
+        """
+
+        return mail.get_connection(email_backends=self.email_backends)
+
+    def get_email_delivery(self):
+        """Returns the method used to deliver the email.
+
+        :returns: ``'immediate'``, ``'queue'`` or ``'digest'``.
+        :rtype: :py:class:`unicode`
+
+        """
+
+        email_delivery = self.email_delivery or app_settings.EMAIL_DELIVERY
+        if email_delivery not in ('immediate', 'queue', 'digest'):
+            raise ImproperlyConfigured(
+                'Unknown email delivery {0!r}.'.format(email_delivery))
+        return email_delivery
+
     def get_email_headers(self):
         """Returns a dictionary of values for use as extra email headers.
 
@@ -107,6 +502,25 @@ class BaseEmailForm(forms.Form):
     def get_email_kwargs(self, **kwargs):
         return kwargs
 
+    def get_email_message_class(self):
+        """Returns the class used to construct the email.
+
+        :returns: :py:class:`thecut.emailform.mime.FastEmailMessage` if
+            :py:attr:`~thecut.emailform.forms.BaseEmailForm.fast_mime` is
+            enabled, otherwise
+            :py:class:`~django.core.mail.EmailMultiAlternatives`.
+
+        """
+
+        fast_mime = self.fast_mime
+        if fast_mime is None:
+            fast_mime = app_settings.FAST_MIME
+        if fast_mime:
+            from .mime import FastEmailMessage
+            return FastEmailMessage
+        from django.core.mail import EmailMultiAlternatives
+        return EmailMultiAlternatives
+
     def get_email_subject(self, subject=None):
         """Returns a string for use as an email's ``subject`` value.
 
@@ -119,8 +533,22 @@ class BaseEmailForm(forms.Form):
         if subject is None:
             subject = self.email_subject
 
-        return '{prefix}{subject}'.format(prefix=self.email_subject_prefix,
-                                          subject=subject)
+        prefix = self.email_subject_prefix
+        if prefix is None:
+            prefix = app_settings.EMAIL_SUBJECT_PREFIX
+
+        return '{prefix}{subject}'.format(prefix=prefix, subject=subject)
+
+    def get_email_html_template_name(self):
+        """Returns a template name which will be used when rendering the
+        email's HTML alternative.
+
+        :returns: A template name, or ``None`` for no HTML alternative.
+        :rtype: :py:class:`unicode`
+
+        """
+
+        return self.email_html_template_name
 
     def get_email_template_name(self):
         """Returns a template name which will be used when rendering the email.
@@ -140,6 +568,8 @@ class BaseEmailForm(forms.Form):
 
         """
 
+        if self.from_email is None:
+            return app_settings.DEFAULT_FROM_EMAIL
         return self.from_email
 
     def get_reply_to_emails(self):
@@ -153,6 +583,28 @@ class BaseEmailForm(forms.Form):
 
         return copy(self.reply_to_emails)
 
+    def get_submission_key(self):
+        """Returns a string identifying this submission, used to detect
+        duplicate submissions.
+
+        :returns: A hash of the form class and either the idempotency token
+            field's value or, if there is no token, the normalised cleaned
+            data.
+        :rtype: :py:class:`unicode`
+
+        """
+
+        data = None
+        if self.idempotency_token_field:
+            data = _normalise(self.cleaned_data.get(
+                self.idempotency_token_field))
+        if data is None or data == '':
+            data = _normalise(self.cleaned_data)
+        key = json.dumps(['{0}.{1}'.format(self.__class__.__module__,
+                                           self.__class__.__name__),
+                          data], sort_keys=True)
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
     def get_to_emails(self):
         """Returns a list of email addresses for use as an email's ``to``
         value.
@@ -162,6 +614,8 @@ class BaseEmailForm(forms.Form):
 
         """
 
+        if self.to_emails is None:
+            return copy(app_settings.DEFAULT_TO_EMAILS)
         return copy(self.to_emails)
 
     def get_cc_emails(self):
@@ -178,6 +632,9 @@ class BaseEmailForm(forms.Form):
     def render_email_body(self, context, template_name=None):
         """Renders and returns content for use as an email's body text.
 
+        When the template is the stock ``emailform/email.txt`` template, the
+        body is rendered without the template engine.
+
         :argument dict context: Context data dictionary to be used when
             rendering the template.
         :returns: Rendered body copy.
@@ -187,12 +644,36 @@ class BaseEmailForm(forms.Form):
 
         if template_name is None:
             template_name = self.get_email_template_name()
+        form_fields = context.get('form_fields')
+        if (isinstance(form_fields, dict) and
+                rendering.is_stock_email_template(template_name)):
+            return rendering.render_stock_email_body(
+                form_fields, context.get('attachment_links') or ())
+        from django.template.loader import get_template
         template = get_template(template_name)
         return template.render(context)
 
-    def construct_email(self):
+    def render_email_html(self, context, template_name=None):
+        """Renders and returns content for use as an email's HTML alternative.
+
+        :argument dict context: Context data dictionary to be used when
+            rendering the template.
+        :returns: Rendered HTML, with inline styles.
+        :rtype: :py:class:`unicode`
+
+        """
+
+        if template_name is None:
+            template_name = self.get_email_html_template_name()
+        return rendering.get_html_template(template_name).render(context)
+
+    def construct_email(self, context=None):
         """Construct an email for a valid form.
 
+        :keyword dict context: Context data dictionary, if it has already
+            been created with ``get_email_context_data()``.
+        :raises thecut.emailform.addresses.InvalidAddress: If any of the
+            email's addresses is not valid.
         :returns: Email message instance.
         :rtype: :py:class:`~django.core.mail.EmailMultiAlternatives`
 
@@ -200,23 +681,242 @@ class BaseEmailForm(forms.Form):
 
         assert self.is_valid()
 
-        context = self.get_email_context_data()
+        timer = metrics.get_timer(self)
+        if context is None:
+            context = timer.time('context', self.get_email_context_data)
+        attachments, links = timer.time('attachments',
+                                        self.make_email_attachments)
+        if links:
+            context = dict(context, attachment_links=links)
 
         email_kwargs = self.get_email_kwargs(
-            subject=self.get_email_subject(),
-            body=self.render_email_body(context),
-            from_email=self.get_from_email(),
-            reply_to=self.get_reply_to_emails(),
-            to=self.get_to_emails(),
-            cc=self.get_cc_emails(),
+            subject=timer.time('subject', self.get_email_subject),
+            body=timer.time('body', self.render_email_body, context),
+            from_email=addresses.normalise_address(self.get_from_email()),
+            reply_to=addresses.normalise_addresses(
+                self.get_reply_to_emails()),
+            to=addresses.normalise_addresses(self.get_to_emails()),
+            cc=addresses.normalise_addresses(self.get_cc_emails()),
             headers=self.get_email_headers(),
-            alternatives=self.get_email_alternatives(context),
-            attachments=self.get_email_attachments(),
+            alternatives=timer.time('alternatives',
+                                    self.get_email_alternatives, context),
+            attachments=attachments,
+            connection=self.get_email_connection(),
         )
-        return EmailMultiAlternatives(**email_kwargs)
+        return self.get_email_message_class()(**email_kwargs)
+
+    def construct_emails(self):
+        """Construct the email for a valid form, and the automatic reply to
+        the submitter if there is one.
+
+        Both emails are rendered with the same context data.
+
+        :returns: The form's email, followed by the automatic reply.
+        :rtype: :py:class:`list`
+
+        """
+
+        assert self.is_valid()
+
+        if not self.get_auto_reply_to_emails():
+            return [self.construct_email()]
+        context = metrics.get_timer(self).time('context',
+                                               self.get_email_context_data)
+        messages = [self.construct_email(context=context),
+                    self.construct_auto_reply_email(context)]
+        return [message for message in messages if message is not None]
+
+    def make_email_attachments(self):
+        """Returns the email's attachments, from
+        :py:meth:`~thecut.emailform.forms.BaseEmailForm.get_email_attachments`.
+
+        Attachments larger than the attachment link threshold are saved to
+        storage instead, and a download link is returned for each of them.
+        The links are added to the email's context as ``attachment_links``.
+
+        :returns: The attachments, and a list of
+            :py:class:`thecut.emailform.attachments.AttachmentLink`.
+        :rtype: :py:class:`tuple`
+
+        """
+
+        threshold = self.get_attachment_link_threshold()
+        attachments = []
+        links = []
+        for attachment in self.get_email_attachments():
+            if threshold is not None:
+                size = get_attachment_size(attachment)
+                if size is not None and size > threshold:
+                    links.append(make_attachment_link(attachment))
+                    continue
+            attachments.append(make_attachment(attachment))
+        return attachments, links
+
+    def queue_email(self):
+        """Construct an email for a valid form and store it in the outbox,
+        along with any automatic reply.
+
+        :returns: The queued email.
+        :rtype: :py:class:`thecut.emailform.models.QueuedEmail`
+
+        """
+
+        from .models import QueuedEmail
+        messages = self.construct_emails()
+        queued = [QueuedEmail.objects.enqueue(message)
+                  for message in messages]
+        return queued[0]
 
-    def send_email(self, **kwargs):
-        """Construct and send an email for a valid form."""
+    def send_email(self, connection=None, **kwargs):
+        """Construct and send an email for a valid form.
+
+        If :py:attr:`thecut.emailform.forms.BaseEmailForm.email_delivery` is
+        ``'queue'``, the email is stored in the outbox instead. If it is
+        ``'digest'``, the form's data is stored for the next digest email.
+
+        When ``EMAILFORM_TIMING`` is enabled, the time taken by each phase
+        of constructing and sending the email is recorded (see
+        :py:mod:`thecut.emailform.metrics`).
+
+        If the form has an automatic reply, it is sent after the form's email
+        over the same connection, or straight away when the form's data is
+        stored for a digest. A failure to send the automatic reply is logged
+        rather than raised, as the form's email has already been sent.
+
+        :keyword connection: Email backend instance used to send the email.
+
+        """
+
+        email_delivery = self.get_email_delivery()
+        if email_delivery == 'queue':
+            return self.queue_email()
+        if email_delivery == 'digest':
+            entry = self.add_to_digest()
+            reply = None
+            if self.get_auto_reply_to_emails():
+                reply = self.construct_auto_reply_email(
+                    self.get_email_context_data())
+            if reply is not None:
+                if connection is not None:
+                    reply.connection = connection
+                _send_auto_reply(reply, **kwargs)
+            return entry
+        messages = self.construct_emails()
+        message = messages[0]
+        if connection is not None:
+            message.connection = connection
+        timer = metrics.get_timer(self)
+        if len(messages) == 1:
+            return timer.send(message, **kwargs)
+
+        connection = message.get_connection(
+            fail_silently=kwargs.get('fail_silently', False))
+        opened = False
+        try:
+            opened = connection.open()
+            message.connection = connection
+            sent = timer.send(message, **kwargs)
+            for reply in messages[1:]:
+                reply.connection = connection
+                _send_auto_reply(reply, **kwargs)
+        finally:
+            if opened:
+                connection.close()
+        return sent
+
+    @classmethod
+    def send_many(cls, forms, connection=None):
+        """Construct and send emails for many valid forms over a single
+        backend connection.
+
+        See :py:func:`thecut.emailform.forms.send_email_batch`.
+
+        """
+
+        return send_email_batch(forms, connection=connection)
+
+
+_LAZY_TYPES = (types.BuiltinFunctionType, types.FunctionType,
+               types.MethodType, functools.partial)
+
+
+def _make_lazy(context_data):
+    return dict((key, LazyValue(value) if _is_lazy(value) else value)
+                for key, value in context_data.items())
+
+
+def _is_lazy(value):
+    # Functions which templates mustn't call, or must treat as values, keep
+    # the attributes which tell templates so.
+    return (isinstance(value, _LAZY_TYPES) and
+            not getattr(value, 'alters_data', False) and
+            not getattr(value, 'do_not_call_in_templates', False))
+
+
+def _send_auto_reply(reply, **kwargs):
+    try:
+        reply.send(**kwargs)
+    except Exception:
+        logger.exception('Failed to send automatic reply to %s.',
+                         ', '.join(reply.to))
+
+
+def _normalise(value):
+    if isinstance(value, dict):
+        return dict((force_text(key), _normalise(item))
+                    for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return [_normalise(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted(_normalise(item) for item in value)
+    if hasattr(value, 'read'):
+        return [force_text(getattr(value, 'name', '')),
+                getattr(value, 'size', None)]
+    if isinstance(value, six.string_types):
+        return value.strip()
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return force_text(value)
+
+
+def send_email_batch(forms, connection=None):
+    """Construct and send emails for many valid forms over a single backend
+    connection.
+
+    Automatic replies are sent after the forms' emails, for each form whose
+    email was sent. A failure to send an automatic reply is logged.
+
+    :argument forms: Iterable of valid
+        :py:class:`~thecut.emailform.forms.BaseEmailForm` instances.
+    :keyword connection: Email backend instance. Defaults to
+        :py:func:`~thecut.emailform.mail.get_connection`.
+    :returns: A result for each form's email, in order.
+    :rtype: :py:class:`list` of
+        :py:class:`thecut.emailform.mail.SendResult`
+
+    """
 
-        mail = self.construct_email()
-        return mail.send(**kwargs)
+    if connection is None:
+        connection = mail.get_connection()
+    messages = [form.construct_emails() for form in forms]
+    opened = False
+    try:
+        if any(len(emails) > 1 for emails in messages):
+            # Keep the connection open for the automatic replies. If it
+            # can't be opened, sending reports the error for each email.
+            try:
+                opened = connection.open()
+            except Exception:
+                pass
+        results = mail.send_messages([emails[0] for emails in messages],
+                                     connection=connection)
+        replies = [reply for emails, result in zip(messages, results)
+                   if result.sent for reply in emails[1:]]
+        for result in mail.send_messages(replies, connection=connection):
+            if result.error is not None:
+                logger.error('Failed to send automatic reply to %s: %s',
+                             ', '.join(result.message.to), result.error)
+    finally:
+        if opened:
+            connection.close()
+    return results
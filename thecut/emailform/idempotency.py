@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from .settings import app_settings
+from collections import OrderedDict
+import threading
+import time
+
+
+class TTLCache(object):
+    """A bounded set of keys which expire after a time limit.
+
+    :keyword float ttl: Seconds a key is remembered for.
+    :keyword int max_size: Maximum number of keys. The oldest keys are
+        removed first.
+
+    """
+
+    def __init__(self, ttl=None, max_size=None):
+        self.ttl = app_settings.DEDUPLICATE_TTL if ttl is None else ttl
+        self.max_size = (app_settings.DEDUPLICATE_MAX_SIZE if max_size is None
+                         else max_size)
+        self._expiries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            self._expire(time.time())
+            return key in self._expiries
+
+    def __len__(self):
+        with self._lock:
+            self._expire(time.time())
+            return len(self._expiries)
+
+    def add(self, key):
+        """Add a key, unless it is already present.
+
+        :returns: Whether the key was added.
+        :rtype: :py:class:`bool`
+
+        """
+
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            if key in self._expiries:
+                return False
+            self._expiries[key] = now + self.ttl
+            while len(self._expiries) > self.max_size:
+                self._expiries.popitem(last=False)
+            return True
+
+    def discard(self, key):
+        """Remove a key, if it is present."""
+        with self._lock:
+            self._expiries.pop(key, None)
+
+    def _expire(self, now):
+        # Keys are added in expiry order, so stop at the first live key.
+        while self._expiries:
+            key, expiry = next(iter(self._expiries.items()))
+            if expiry > now:
+                break
+            del self._expiries[key]
+
+
+_submissions = None
+_submissions_lock = threading.Lock()
+
+
+def get_submissions():
+    """Returns the process-wide cache of recent submission keys.
+
+    :rtype: :py:class:`thecut.emailform.idempotency.TTLCache`
+
+    """
+
+    global _submissions
+    with _submissions_lock:
+        if _submissions is None:
+            _submissions = TTLCache()
+        return _submissions
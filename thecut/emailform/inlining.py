@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from collections import OrderedDict
+import re
+
+
+COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+
+STYLE_ELEMENT_RE = re.compile(r'<style\b[^>]*>(.*?)</style\s*>\s*',
+                              re.I | re.S)
+
+START_TAG_RE = re.compile(
+    r'<([a-zA-Z][a-zA-Z0-9-]*)'
+    r'((?:\s+[^\s/>"\'=]+(?:\s*=\s*(?:"[^"]*"|\'[^\']*\'|[^\s"\'>]+))?)*)'
+    r'\s*(/?)>')
+
+ATTRIBUTE_RE = re.compile(
+    r'([^\s/>"\'=]+)(?:\s*=\s*("[^"]*"|\'[^\']*\'|[^\s"\'>]+))?')
+
+SELECTOR_RE = re.compile(
+    r'^(\*|[a-zA-Z][a-zA-Z0-9-]*)?((?:[.#][a-zA-Z_][\w-]*)*)$')
+
+# Elements which are never displayed, so are never given inline styles.
+UNSTYLED_ELEMENTS = frozenset(['base', 'head', 'link', 'meta', 'script',
+                               'style', 'title'])
+
+
+class Rule(object):
+    """A CSS rule with a single, simple selector, such as ``td.value``."""
+
+    __slots__ = ['tag', 'classes', 'ids', 'declarations', 'specificity']
+
+    def __init__(self, tag, classes, ids, declarations, order):
+        self.tag = tag
+        self.classes = classes
+        self.ids = ids
+        self.declarations = declarations
+        self.specificity = (len(ids), len(classes),
+                            0 if tag in (None, '*') else 1, order)
+
+    def matches(self, tag, classes, element_id):
+        return ((self.tag in (None, '*') or self.tag == tag) and
+                self.classes.issubset(classes) and
+                all(rule_id == element_id for rule_id in self.ids))
+
+
+def parse_declarations(css):
+    """Parses CSS declarations such as ``color: red; margin: 0``.
+
+    :returns: Each property's value, in order.
+    :rtype: :py:class:`~collections.OrderedDict`
+
+    """
+
+    declarations = OrderedDict()
+    for declaration in css.split(';'):
+        name, separator, value = declaration.partition(':')
+        name, value = name.strip().lower(), value.strip()
+        if separator and name and value:
+            declarations.pop(name, None)
+            declarations[name] = value.replace('"', "'")
+    return declarations
+
+
+def parse_selector(selector):
+    """Parses a simple selector, such as ``td``, ``.value`` or
+    ``td#name.value``.
+
+    :returns: The selector's tag name, classes and IDs, or ``None`` if the
+        selector can't be inlined (e.g. it has a combinator or pseudo-class).
+    :rtype: :py:class:`tuple`
+
+    """
+
+    match = SELECTOR_RE.match(selector)
+    if match is None or not selector:
+        return None
+    tag, qualifiers = match.groups()
+    parts = re.findall(r'[.#][^.#]+', qualifiers)
+    return ((tag or None) and tag.lower(),
+            frozenset(part[1:] for part in parts if part[0] == '.'),
+            frozenset(part[1:] for part in parts if part[0] == '#'))
+
+
+def parse_stylesheet(css, order=0):
+    """Parses a stylesheet into rules which can be inlined, and the CSS which
+    can't (such as ``@media`` rules).
+
+    :keyword int order: Position of the first rule, used to apply rules in
+        source order.
+    :returns: The rules, and the CSS which can't be inlined.
+    :rtype: :py:class:`tuple`
+
+    """
+
+    css = COMMENT_RE.sub('', css)
+    rules = []
+    kept = []
+    position = 0
+    while True:
+        start = css.find('{', position)
+        if start == -1:
+            break
+        depth = 0
+        for end in range(start, len(css)):
+            if css[end] == '{':
+                depth += 1
+            elif css[end] == '}':
+                depth -= 1
+                if depth == 0:
+                    break
+        prelude, body = css[position:start], css[start + 1:end]
+        position = end + 1
+
+        statements = prelude.split(';')
+        kept.extend('{0};'.format(statement.strip())
+                    for statement in statements[:-1] if statement.strip())
+        prelude = statements[-1].strip()
+        if prelude.startswith('@'):
+            kept.append('{0} {{{1}}}'.format(prelude, body))
+            continue
+
+        declarations = parse_declarations(body)
+        unsupported = []
+        for selector in prelude.split(','):
+            parsed = parse_selector(selector.strip())
+            if parsed is None:
+                unsupported.append(selector.strip())
+            else:
+                rules.append(Rule(*parsed, declarations=declarations,
+                                  order=order))
+                order += 1
+        if unsupported:
+            kept.append('{0} {{{1}}}'.format(', '.join(unsupported), body))
+    return rules, '\n'.join(kept)
+
+
+def inline_css(html):
+    """Moves the rules in an HTML document's ``<style>`` elements into the
+    ``style`` attributes of the elements they apply to.
+
+    Rules with simple selectors (tag names, classes and IDs) are inlined, in
+    order of specificity. Existing ``style`` attributes take precedence.
+    Other rules, such as ``@media`` rules, are kept in a ``<style>`` element.
+
+    The document can be a Django template's source, as long as the classes
+    and IDs being styled aren't generated by template tags.
+
+    :argument unicode html: An HTML document.
+    :returns: The HTML document with inline styles.
+    :rtype: :py:class:`unicode`
+
+    """
+
+    rules = []
+    kept = []
+    for match in STYLE_ELEMENT_RE.finditer(html):
+        parsed, remaining = parse_stylesheet(match.group(1), len(rules))
+        rules.extend(parsed)
+        if remaining:
+            kept.append(remaining)
+    if not rules and not kept:
+        return html
+    rules.sort(key=lambda rule: rule.specificity)
+
+    # The CSS which can't be inlined replaces the first <style> element.
+    remaining = ['<style type="text/css">\n{0}\n</style>\n'.format(
+        '\n'.join(kept)) if kept else '']
+
+    def replace_style_element(match):
+        return remaining.pop() if remaining else ''
+
+    def style_element(match):
+        tag, attributes, closing = match.groups()
+        tag = tag.lower()
+        if tag in UNSTYLED_ELEMENTS:
+            return match.group()
+        values = dict((name.lower(), (value or '').strip('"\''))
+                      for name, value in ATTRIBUTE_RE.findall(attributes))
+        classes = frozenset(values.get('class', '').split())
+        declarations = OrderedDict()
+        for rule in rules:
+            if rule.matches(tag, classes, values.get('id')):
+                for name, value in rule.declarations.items():
+                    declarations.pop(name, None)
+                    declarations[name] = value
+        if not declarations:
+            return match.group()
+        inline = parse_declarations(values.get('style', ''))
+        for name, value in inline.items():
+            declarations.pop(name, None)
+            declarations[name] = value
+        style = '; '.join('{0}: {1}'.format(name, value)
+                          for name, value in declarations.items())
+        attributes = ''.join(
+            ' {0}'.format(attribute.group())
+            for attribute in ATTRIBUTE_RE.finditer(attributes)
+            if attribute.group(1).lower() != 'style')
+        return '<{0}{1} style="{2}"{3}>'.format(
+            match.group(1), attributes, style, ' /' if closing else '')
+
+    html = STYLE_ELEMENT_RE.sub(replace_style_element, html)
+    return START_TAG_RE.sub(style_element, html)
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from .forms import BaseEmailForm
+from collections import Counter
+from django import forms
+from timeit import default_timer
+import math
+import threading
+import time
+
+
+class LoadTestForm(BaseEmailForm):
+    """The form submitted by the ``emailform_loadtest`` command when no other
+    form is given."""
+
+    name = forms.CharField()
+    email = forms.EmailField()
+    message = forms.CharField(widget=forms.Textarea)
+
+
+LOAD_TEST_DATA = {'name': 'Load Test', 'email': 'load.test@example.com',
+                  'message': 'A load test enquiry.\nWith two lines.'}
+
+
+class LoadTestError(Exception):
+    """Raised for a submission which didn't succeed, without an exception
+    from the email backend."""
+
+
+def percentile(values, percent):
+    """Returns the nearest-rank percentile of sorted values.
+
+    :argument list values: Values in ascending order.
+    :argument float percent: The percentile, e.g. ``95``.
+    :returns: The value, or ``None`` if there are no values.
+
+    """
+
+    if not values:
+        return None
+    rank = int(math.ceil(percent / 100.0 * len(values)))
+    return values[min(max(rank, 1), len(values)) - 1]
+
+
+class LoadTestReport(object):
+    """The results of a load test.
+
+    :argument list latencies: Seconds taken by each submission.
+    :argument errors: The number of failed submissions by error.
+    :type errors: :py:class:`~collections.Counter`
+    :argument float duration: Seconds taken by the whole load test.
+
+    """
+
+    def __init__(self, latencies, errors, duration, concurrency, rate=None):
+        self.latencies = sorted(latencies)
+        self.errors = errors
+        self.duration = duration
+        self.concurrency = concurrency
+        self.rate = rate
+
+    @property
+    def count(self):
+        return len(self.latencies)
+
+    @property
+    def error_count(self):
+        return sum(self.errors.values())
+
+    @property
+    def error_rate(self):
+        return self.error_count / float(self.count) if self.count else 0
+
+    @property
+    def throughput(self):
+        """Submissions per second."""
+        return self.count / self.duration if self.duration else 0
+
+    def percentile(self, percent):
+        return percentile(self.latencies, percent)
+
+    def format(self):
+        """Returns a summary of the results.
+
+        :rtype: :py:class:`unicode`
+
+        """
+
+        lines = ['{0} submissions in {1:.2f} s: {2:.1f} per second with {3} '
+                 'threads{4}.'.format(
+                     self.count, self.duration, self.throughput,
+                     self.concurrency, ' (target {0:g} per second)'.format(
+                         self.rate) if self.rate else '')]
+        if self.latencies:
+            lines.append(
+                'Latency: p50 {0:.1f} ms, p95 {1:.1f} ms, p99 {2:.1f} ms, '
+                'max {3:.1f} ms.'.format(*[
+                    value * 1000 for value in [
+                        self.percentile(50), self.percentile(95),
+                        self.percentile(99), self.latencies[-1]]]))
+        lines.append('Errors: {0} ({1:.1%}).'.format(
+            self.error_count, self.error_rate))
+        for error, count in self.errors.most_common():
+            lines.append('  {0}: {1}'.format(error, count))
+        return '\n'.join(lines)
+
+
+def submit_form(form_class, data):
+    """Returns a function which submits a form and sends its email."""
+
+    def submit():
+        form = form_class(data)
+        if not form.is_valid():
+            raise ValueError('Invalid form data: {0}'.format(
+                form.errors.as_text()))
+        form.send_email()
+
+    return submit
+
+
+def submit_view(form_class, data):
+    """Returns a function which posts a form to
+    :py:class:`~thecut.emailform.views.EmailFormView`.
+
+    Responses other than the success redirect are counted as errors.
+
+    """
+
+    from .views import EmailFormView
+    from django.test import RequestFactory
+    view = EmailFormView.as_view(form_class=form_class, success_url='/')
+    factory = RequestFactory()
+
+    def submit():
+        response = view(factory.post('/', data))
+        if response.status_code != 302:
+            raise LoadTestError('HTTP {0}'.format(response.status_code))
+
+    return submit
+
+
+def run(submit, requests, concurrency=1, rate=None):
+    """Call ``submit()`` ``requests`` times from ``concurrency`` threads.
+
+    When ``rate`` is given, submissions are started at that many per second,
+    and latencies are measured from when each submission was due to start,
+    so time spent waiting for a free thread is included.
+
+    :argument submit: Callable which makes a single submission.
+    :argument int requests: Number of submissions.
+    :keyword int concurrency: Number of threads.
+    :keyword float rate: Submissions per second, or ``None`` to submit as
+        quickly as possible.
+    :rtype: :py:class:`thecut.emailform.loadtest.LoadTestReport`
+
+    """
+
+    latencies = []
+    errors = Counter()
+    lock = threading.Lock()
+    submissions = iter(range(requests))
+    start = default_timer()
+
+    def work():
+        while True:
+            with lock:
+                index = next(submissions, None)
+            if index is None:
+                return
+            if rate:
+                due = start + index / float(rate)
+                delay = due - default_timer()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                due = default_timer()
+            error = None
+            try:
+                submit()
+            except Exception as exception:
+                error = (exception.args[0] if isinstance(
+                    exception, LoadTestError) else type(exception).__name__)
+            latency = default_timer() - due
+            with lock:
+                latencies.append(latency)
+                if error is not None:
+                    errors[error] += 1
+
+    threads = [threading.Thread(target=work) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return LoadTestReport(latencies, errors, default_timer() - start,
+                          concurrency=concurrency, rate=rate)
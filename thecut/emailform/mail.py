@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from .settings import app_settings
+from collections import namedtuple
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+SendResult = namedtuple('SendResult', ['message', 'sent', 'error'])
+"""The outcome of sending a single email message in a batch."""
+
+
+def get_connection(email_backends=None, **kwargs):
+    """Returns the email backend instance configured for the app.
+
+    This is a :py:class:`~thecut.emailform.backends.FailoverBackend` for
+    ``email_backends`` or the ``EMAILFORM_EMAIL_BACKENDS`` setting, otherwise
+    the ``EMAILFORM_EMAIL_BACKEND`` setting's backend, otherwise Django's
+    default email backend.
+
+    :keyword list email_backends: Backends to fail over between, as for
+        :py:class:`~thecut.emailform.backends.FailoverBackend`.
+    :returns: Email backend instance.
+
+    """
+
+    if email_backends is None:
+        email_backends = app_settings.EMAIL_BACKENDS
+    if email_backends:
+        from .backends import FailoverBackend
+        return FailoverBackend(backends=email_backends, **kwargs)
+    from django.core.mail import get_connection
+    return get_connection(app_settings.EMAIL_BACKEND or None, **kwargs)
+
+
+def send_messages(messages, connection=None):
+    """Send email messages over a single backend connection.
+
+    Each message is sent separately, so a failure only affects that message.
+    If the connection can't be opened, every message fails with that error.
+
+    :argument messages: Iterable of email message instances.
+    :keyword connection: Email backend instance. Defaults to
+        :py:func:`~thecut.emailform.mail.get_connection`.
+    :returns: A result for each message, in order.
+    :rtype: :py:class:`list` of
+        :py:class:`thecut.emailform.mail.SendResult`
+
+    """
+
+    messages = list(messages)
+    results = []
+    if not messages:
+        return results
+
+    if connection is None:
+        connection = get_connection()
+
+    opened = False
+    try:
+        try:
+            opened = connection.open()
+        except Exception as error:
+            # Such as the SMTP server refusing connections, which fails
+            # every message.
+            return [SendResult(message, False, error) for message in messages]
+        for message in messages:
+            try:
+                sent = connection.send_messages([message])
+            except Exception as error:
+                results.append(SendResult(message, False, error))
+            else:
+                results.append(SendResult(message, bool(sent), None))
+    finally:
+        if opened:
+            try:
+                connection.close()
+            except Exception:
+                # The results stand, whether or not the connection closed
+                # cleanly.
+                logger.warning('Failed to close email connection.',
+                               exc_info=True)
+    return results
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.utils.module_loading import import_string
+from thecut.emailform import loadtest, smtpsink
+import json
+
+
+class Command(BaseCommand):
+
+    help = ('Submit an email form many times, reporting throughput, latency '
+            'and errors. By default emails are sent to a local SMTP sink, '
+            'which can add latency and failures.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--form', default='thecut.emailform.loadtest.LoadTestForm',
+            help='Dotted path to the email form class to submit.')
+        parser.add_argument(
+            '--data', default=None,
+            help='JSON object of form data. Defaults to data for the '
+            'default form.')
+        parser.add_argument(
+            '--view', action='store_true', default=False,
+            help='Post the form to EmailFormView, rather than calling the '
+            'form\'s send_email() method.')
+        parser.add_argument(
+            '--requests', type=int, default=100,
+            help='Number of submissions.')
+        parser.add_argument(
+            '--concurrency', type=int, default=1,
+            help='Number of threads making submissions.')
+        parser.add_argument(
+            '--rate', type=float, default=None,
+            help='Submissions per second. Defaults to as many as possible.')
+        parser.add_argument(
+            '--no-sink', action='store_false', dest='sink', default=True,
+            help='Send emails with the configured email settings, instead of '
+            'to a local SMTP sink.')
+        smtpsink.add_fault_arguments(parser)
+
+    def handle(self, *args, **options):
+        try:
+            form_class = import_string(options['form'])
+        except ImportError as error:
+            raise CommandError(error)
+        data = loadtest.LOAD_TEST_DATA
+        if options['data'] is not None:
+            data = json.loads(options['data'])
+        if options['view']:
+            submit = loadtest.submit_view(form_class, data)
+        else:
+            submit = loadtest.submit_form(form_class, data)
+
+        sink = None
+        overridden = None
+        if options['sink']:
+            sink = smtpsink.SMTPSink(
+                **smtpsink.get_fault_options(options))
+            sink.start()
+            overridden = override_settings(
+                EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                EMAIL_HOST='127.0.0.1', EMAIL_PORT=sink.port,
+                EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='',
+                EMAIL_USE_TLS=False, EMAIL_USE_SSL=False,
+                EMAILFORM_EMAIL_BACKEND=None, EMAILFORM_EMAIL_BACKENDS=None,
+                EMAILFORM_EMAIL_DELIVERY='immediate')
+            overridden.enable()
+        try:
+            report = loadtest.run(submit, options['requests'],
+                                  concurrency=options['concurrency'],
+                                  rate=options['rate'])
+        finally:
+            if overridden is not None:
+                overridden.disable()
+            if sink is not None:
+                sink.stop()
+
+        self.stdout.write(report.format())
+        if sink is not None:
+            self.stdout.write(smtpsink.format_stats(sink.stats))
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from thecut.emailform.settings import app_settings
+from thecut.emailform.models import DigestEntry, QueuedEmail
+import logging
+import multiprocessing
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+
+    help = ('Send emails waiting in the outbox, and digest emails which are '
+            'due.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=app_settings.OUTBOX_BATCH_SIZE,
+            help='Maximum number of emails to send per batch.')
+        parser.add_argument(
+            '--max-attempts', type=int,
+            default=app_settings.OUTBOX_MAX_ATTEMPTS,
+            help='Number of failed attempts before an email is quarantined.')
+        parser.add_argument(
+            '--lease-timeout', type=int,
+            default=app_settings.OUTBOX_LEASE_TIMEOUT,
+            help='Seconds before emails being sent by a worker can be sent by '
+            'another worker.')
+        parser.add_argument(
+            '--processes', type=int, default=1,
+            help='Number of worker processes to run.')
+        parser.add_argument(
+            '--interval', type=float, default=5,
+            help='Seconds to wait before checking an empty outbox again.')
+        parser.add_argument(
+            '--once', action='store_true', default=False,
+            help='Send all due emails and exit.')
+
+    def handle(self, *args, **options):
+        if options['processes'] <= 1:
+            return self.work(options)
+
+        # Each process must open its own database connection.
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=self.work, args=(options,),
+                                    name='emailform-worker-{0}'.format(i))
+            for i in range(options['processes'])]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
+                process.join()
+
+    def work(self, options):
+        while True:
+            try:
+                counts = QueuedEmail.objects.deliver(
+                    batch_size=options['batch_size'],
+                    max_attempts=options['max_attempts'],
+                    lease_timeout=options['lease_timeout'])
+                counts['digests'] = DigestEntry.objects.flush_due()
+            except Exception:
+                # Such as a lost database connection. Emails leased by this
+                # batch are sent by a later batch once their lease expires.
+                logger.exception('Failed to send a batch of emails.')
+                if options['once']:
+                    raise
+                close_old_connections()
+                time.sleep(options['interval'])
+                continue
+            if any(counts.values()):
+                self.stdout.write(
+                    'Sent {sent}, retried {retried}, quarantined '
+                    '{quarantined}, sent {digests} digests.'.format(**counts))
+            elif options['once']:
+                return
+            else:
+                time.sleep(options['interval'])
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from .settings import app_settings
+from .signals import email_phase_timed
+from collections import OrderedDict
+from django.utils.module_loading import import_string
+from django.utils import six
+from timeit import default_timer
+import bisect
+import threading
+
+
+PHASES = ['context', 'subject', 'body', 'alternatives', 'attachments', 'mime',
+          'transport']
+
+# Upper bounds, in seconds.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10)
+
+
+class Histogram(object):
+    """A thread-safe histogram of observed values.
+
+    :keyword buckets: Upper bounds of the histogram's buckets. Values larger
+        than the last bound are counted in an extra, unbounded bucket.
+
+    """
+
+    def __init__(self, buckets=None):
+        self.buckets = tuple(sorted(DEFAULT_BUCKETS if buckets is None
+                                    else buckets))
+        self._lock = threading.Lock()
+        self.reset()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * (len(self.buckets) + 1)
+            self.count = 0
+            self.sum = 0.0
+            self.min = None
+            self.max = None
+
+    def snapshot(self):
+        """Returns the histogram's current values.
+
+        :returns: The count, sum, minimum and maximum of observed values, and
+            the number of values in each bucket keyed by its upper bound
+            (``None`` for the unbounded bucket).
+        :rtype: :py:class:`dict`
+
+        """
+
+        with self._lock:
+            return {
+                'count': self.count,
+                'sum': self.sum,
+                'min': self.min,
+                'max': self.max,
+                'buckets': OrderedDict(zip(self.buckets + (None,),
+                                           self.counts)),
+            }
+
+
+class MetricsRegistry(object):
+    """An in-process collection of named histograms.
+
+    :keyword buckets: Upper bounds used for new histograms.
+
+    """
+
+    def __init__(self, buckets=None):
+        self.buckets = buckets
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name):
+        """Returns the named histogram, creating it if needed.
+
+        :rtype: :py:class:`thecut.emailform.metrics.Histogram`
+
+        """
+
+        try:
+            return self._histograms[name]
+        except KeyError:
+            with self._lock:
+                return self._histograms.setdefault(
+                    name, Histogram(buckets=self.buckets))
+
+    def observe(self, name, value):
+        self.histogram(name).observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+
+    def snapshot(self):
+        """Returns the current values of every histogram, keyed by name.
+
+        :rtype: :py:class:`dict`
+
+        """
+
+        with self._lock:
+            histograms = list(self._histograms.items())
+        return dict((name, histogram.snapshot())
+                    for name, histogram in histograms)
+
+
+registry = MetricsRegistry()
+
+
+def get_registry():
+    """Returns the registry which timings are recorded in.
+
+    This is ``EMAILFORM_METRICS_REGISTRY`` (an object, or the dotted path to
+    one, with an ``observe(name, value)`` method) if set, otherwise
+    :py:data:`thecut.emailform.metrics.registry`.
+
+    """
+
+    value = app_settings.METRICS_REGISTRY
+    if value is None:
+        return registry
+    if isinstance(value, six.string_types):
+        return import_string(value)
+    return value
+
+
+class PhaseTimer(object):
+    """Times the phases of constructing and sending a form's email.
+
+    Each phase's duration is recorded in the metrics registry as
+    ``emailform.<phase>``, and sent with the
+    :py:data:`~thecut.emailform.signals.email_phase_timed` signal.
+
+    """
+
+    enabled = True
+
+    def __init__(self, form):
+        self.form = form
+        self.durations = OrderedDict()
+
+    def record(self, phase, duration):
+        self.durations[phase] = self.durations.get(phase, 0) + duration
+        get_registry().observe('emailform.{0}'.format(phase), duration)
+        email_phase_timed.send(sender=self.form.__class__, form=self.form,
+                               phase=phase, duration=duration)
+
+    def send(self, message, **kwargs):
+        """Send an email message, timing the MIME build and the transport
+        separately."""
+
+        build = message.message
+
+        def timed_build():
+            return self.time('mime', build)
+
+        message.message = timed_build
+        start = default_timer()
+        try:
+            return message.send(**kwargs)
+        finally:
+            del message.message
+            self.record('transport', default_timer() - start -
+                        self.durations.get('mime', 0))
+
+    def time(self, phase, function, *args, **kwargs):
+        """Call ``function(*args, **kwargs)``, recording how long it took."""
+        start = default_timer()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.record(phase, default_timer() - start)
+
+
+class NullTimer(object):
+    """A timer used when ``EMAILFORM_TIMING`` is disabled, which records
+    nothing."""
+
+    enabled = False
+
+    def record(self, phase, duration):
+        pass
+
+    def send(self, message, **kwargs):
+        return message.send(**kwargs)
+
+    def time(self, phase, function, *args, **kwargs):
+        return function(*args, **kwargs)
+
+
+_null_timer = NullTimer()
+
+
+def get_timer(form):
+    """Returns a timer for a form's email.
+
+    :rtype: :py:class:`thecut.emailform.metrics.PhaseTimer`, or
+        :py:class:`thecut.emailform.metrics.NullTimer` if ``EMAILFORM_TIMING``
+        is disabled.
+
+    """
+
+    if app_settings.TIMING:
+        return PhaseTimer(form)
+    return _null_timer
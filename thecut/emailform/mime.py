@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.core.mail.message import forbid_multi_line_headers, make_msgid
+from django.core.mail.utils import DNS_NAME
+from django.utils import six
+from email.utils import formatdate
+import django
+import random
+import sys
+import threading
+
+
+# Headers which the fast serializer sets itself, so can't be overridden by a
+# message's extra headers.
+RESERVED_HEADERS = frozenset(['content-transfer-encoding', 'content-type',
+                              'from', 'mime-version', 'to', 'cc', 'reply-to'])
+
+MAX_CACHED_HEADERS = 256
+
+# The maximum length of a line in an email (RFC 5322), which Django < 1.11
+# doesn't define.
+RFC5322_EMAIL_LINE_LENGTH_LIMIT = 998
+
+# The length the email package folds longer header lines to.
+MAX_HEADER_LINE_LENGTH = 78
+
+_constant_headers = {}
+_constant_headers_lock = threading.Lock()
+
+
+class SerializedMessage(object):
+    """A MIME message which has already been serialized.
+
+    Behaves enough like :py:class:`email.message.Message` for Django's email
+    backends, which only need the message's bytes.
+
+    """
+
+    def __init__(self, headers, text):
+        self._headers = headers
+        self._text = text
+
+    def __getitem__(self, name):
+        return self.get(name)
+
+    def as_bytes(self, unixfrom=False, linesep='\n'):
+        return self.as_string(unixfrom=unixfrom, linesep=linesep).encode(
+            'utf-8')
+
+    def as_string(self, unixfrom=False, linesep='\n'):
+        # Django's messages ignore linesep on Python 2.
+        if linesep == '\n' or six.PY2:
+            return self._text
+        return self._text.replace('\n', linesep)
+
+    def get(self, name, failobj=None):
+        name = name.lower()
+        for key, value in self._headers:
+            if key.lower() == name:
+                return value
+        return failobj
+
+    def get_charset(self):
+        return None
+
+    def is_multipart(self):
+        return self.get('Content-Type', '').startswith('multipart/')
+
+    def items(self):
+        return list(self._headers)
+
+    def keys(self):
+        return [key for key, value in self._headers]
+
+    def values(self):
+        return [value for key, value in self._headers]
+
+
+class FastEmailMessage(EmailMultiAlternatives):
+    """An email message with a faster MIME serializer for text emails.
+
+    Messages without attachments, with a UTF-8 body and text alternatives,
+    are written straight to text instead of through the
+    :py:mod:`email` package's generator. The encoded ``From``, ``To``,
+    ``Cc`` and ``Reply-To`` headers and custom headers are cached, so forms
+    which send to the same addresses only encode them once. Other messages
+    are built by :py:class:`~django.core.mail.EmailMultiAlternatives`.
+
+    """
+
+    def message(self):
+        encoding = self.encoding or settings.DEFAULT_CHARSET
+        if self.attachments or encoding.lower().replace('_', '-') != 'utf-8':
+            return super(FastEmailMessage, self).message()
+        header_names = set(name.lower() for name in self.extra_headers)
+        if header_names & RESERVED_HEADERS:
+            return super(FastEmailMessage, self).message()
+        parts = [(self.body, self.content_subtype)]
+        for content, mimetype in self.alternatives:
+            maintype, _, subtype = (mimetype or '').partition('/')
+            if maintype != 'text' or not isinstance(content,
+                                                    six.string_types):
+                return super(FastEmailMessage, self).message()
+            parts.append((content, subtype))
+        if not six.PY2:
+            # Python 2's email package leaves newlines in content unchanged.
+            parts = [(normalise_newlines(content), subtype)
+                     for content, subtype in parts]
+        if any(has_long_lines(content) for content, subtype in parts):
+            return super(FastEmailMessage, self).message()
+
+        dynamic = []
+        if 'date' not in header_names:
+            dynamic.append(('Date', formatdate(
+                localtime=getattr(settings, 'EMAIL_USE_LOCALTIME', False))))
+        if 'message-id' not in header_names:
+            dynamic.append(('Message-ID', make_msgid(domain=DNS_NAME)))
+        addresses, custom = self._get_constant_headers(encoding)
+        headers = ([forbid_multi_line_headers('Subject', self.subject,
+                                              encoding)] +
+                   addresses + dynamic + custom)
+        if any(has_long_header(name, value) for name, value in headers):
+            # The email package's generator would fold these headers.
+            return super(FastEmailMessage, self).message()
+
+        if len(parts) == 1:
+            content, subtype = parts[0]
+            headers = get_content_headers(content, subtype) + headers
+            return SerializedMessage(headers, ''.join(
+                [format_headers(headers), '\n', content]))
+
+        boundary = make_boundary(content for content, subtype in parts)
+        headers = [('Content-Type', 'multipart/alternative;\n '
+                    'boundary="{0}"'.format(boundary)),
+                   ('MIME-Version', '1.0')] + headers
+        chunks = [format_headers(headers), '\n']
+        for content, subtype in parts:
+            chunks.extend(['--', boundary, '\n',
+                           format_headers(get_content_headers(content,
+                                                              subtype)),
+                           '\n', content, '\n'])
+        chunks.extend(['--', boundary, '--\n'])
+        return SerializedMessage(headers, ''.join(chunks))
+
+    def _get_constant_headers(self, encoding):
+        # Returns the encoded address headers, and the custom headers (which
+        # come after the Date and Message-ID headers).
+        key = (self.extra_headers.get('From', self.from_email),
+               tuple(self.to), tuple(self.cc), tuple(self.reply_to),
+               tuple(sorted((name, '{0}'.format(value))
+                            for name, value in self.extra_headers.items())),
+               encoding)
+        try:
+            return _constant_headers[key]
+        except KeyError:
+            pass
+        from_email, to, cc, reply_to, extra_headers, encoding = key
+        addresses = [forbid_multi_line_headers('From', from_email, encoding)]
+        for name, values in [('To', to), ('Cc', cc), ('Reply-To', reply_to)]:
+            if values:
+                addresses.append(forbid_multi_line_headers(
+                    name, ', '.join('{0}'.format(value) for value in values),
+                    encoding))
+        custom = [forbid_multi_line_headers(name, value, encoding)
+                  for name, value in self.extra_headers.items()]
+        with _constant_headers_lock:
+            if len(_constant_headers) >= MAX_CACHED_HEADERS:
+                _constant_headers.clear()
+            _constant_headers[key] = addresses, custom
+        return addresses, custom
+
+
+def format_headers(headers):
+    return ''.join('{0}: {1}\n'.format(name, value) for name, value in headers)
+
+
+def get_content_headers(content, subtype):
+    try:
+        content.encode('ascii')
+    except UnicodeEncodeError:
+        transfer_encoding = '8bit'
+    else:
+        transfer_encoding = '7bit'
+    headers = [('Content-Type', 'text/{0}; charset="utf-8"'.format(subtype)),
+               ('MIME-Version', '1.0'),
+               ('Content-Transfer-Encoding', transfer_encoding)]
+    if django.VERSION < (1, 11):
+        # Older versions of Django set the Content-Type header second.
+        headers[:2] = reversed(headers[:2])
+    return headers
+
+
+def has_long_header(name, value):
+    return any(len(line) > MAX_HEADER_LINE_LENGTH
+               for line in '{0}: {1}'.format(name, value).split('\n'))
+
+
+def has_long_lines(content):
+    return any(len(line.encode('utf-8')) > RFC5322_EMAIL_LINE_LENGTH_LIMIT
+               for line in content.split('\n'))
+
+
+def make_boundary(contents):
+    contents = list(contents)
+    while True:
+        boundary = '=' * 15 + '{0:019d}'.format(
+            random.randrange(sys.maxsize)) + '=='
+        if not any(boundary in content for content in contents):
+            return boundary
+
+
+def normalise_newlines(content):
+    if '\r' in content:
+        return content.replace('\r\n', '\n').replace('\r', '\n')
+    return content
@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from . import rendering
+from .mail import SendResult, get_connection, send_messages
+from .settings import app_settings
+from collections import OrderedDict
+from datetime import timedelta
+from django.db import models, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.encoding import force_text, python_2_unicode_compatible
+from django.utils.module_loading import import_string
+import json
+import logging
+import pickle
+import uuid
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_class_path(cls):
+    return '{0}.{1}'.format(cls.__module__, cls.__name__)
+
+
+class QueuedEmailQuerySet(models.QuerySet):
+
+    def due(self, now=None):
+        """Queued emails which are ready to be sent, and not leased by a
+        worker."""
+        if now is None:
+            now = timezone.now()
+        return self.filter(
+            Q(leased_until__isnull=True) | Q(leased_until__lte=now),
+            status=QueuedEmail.QUEUED, available_at__lte=now)
+
+    def enqueue(self, message):
+        """Store an email message in the outbox.
+
+        :argument message: Email message instance.
+        :returns: The queued email.
+        :rtype: :py:class:`thecut.emailform.models.QueuedEmail`
+
+        """
+
+        connection, message.connection = message.connection, None
+        try:
+            data = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+        finally:
+            message.connection = connection
+        return self.create(message=data, subject=message.subject[:255])
+
+    def lease(self, batch_size=None, lease_timeout=None):
+        """Lease a batch of due emails, so other workers (in this or other
+        processes) skip them until the lease expires.
+
+        Databases which support ``SELECT ... FOR UPDATE SKIP LOCKED`` (such
+        as PostgreSQL) lock the rows being leased, so concurrent workers
+        lease different emails without waiting. Elsewhere (such as SQLite),
+        emails are leased with a conditional ``UPDATE``, which only leases
+        emails no other worker has leased in the meantime.
+
+        :keyword int batch_size: Maximum number of emails to lease.
+        :keyword int lease_timeout: Seconds before the lease expires, and
+            the emails can be leased by another worker.
+        :returns: The leased emails.
+        :rtype: :py:class:`list`
+
+        """
+
+        if batch_size is None:
+            batch_size = app_settings.OUTBOX_BATCH_SIZE
+        if lease_timeout is None:
+            lease_timeout = app_settings.OUTBOX_LEASE_TIMEOUT
+
+        now = timezone.now()
+        owner = uuid.uuid4().hex
+        due = self.due(now).order_by('available_at', 'pk')
+
+        def update(pks):
+            # Only emails which are still due are leased, so an email leased
+            # by another worker since it was selected is skipped.
+            self.due(now).filter(pk__in=list(pks)).update(
+                lease_owner=owner,
+                leased_until=now + timedelta(seconds=lease_timeout))
+
+        features = transaction.get_connection(self.db).features
+        if getattr(features, 'has_select_for_update_skip_locked', False):
+            with transaction.atomic(using=self.db):
+                update(due.select_for_update(skip_locked=True).values_list(
+                    'pk', flat=True)[:batch_size])
+        else:
+            # Without row locks, selecting and updating in one transaction
+            # would make SQLite raise "database is locked" when another
+            # process is writing, so the update is a separate statement.
+            update(due.values_list('pk', flat=True)[:batch_size])
+        return list(self.filter(lease_owner=owner).order_by('available_at',
+                                                            'pk'))
+
+    def deliver(self, batch_size=None, max_attempts=None, connection=None,
+                lease_timeout=None):
+        """Send a batch of due emails over a single backend connection.
+
+        Emails are leased first (see
+        :py:meth:`~thecut.emailform.models.QueuedEmailQuerySet.lease`), so
+        many workers can deliver from the same outbox. An email is only
+        marked as sent after the backend has accepted it, so delivery is
+        at-least-once. Failed emails are retried with exponential backoff,
+        and quarantined once they have failed ``max_attempts`` times.
+
+        :keyword int batch_size: Maximum number of emails to send.
+        :keyword int max_attempts: Number of attempts before quarantining.
+        :keyword connection: Email backend instance.
+        :keyword int lease_timeout: Seconds the emails are leased for.
+        :returns: Number of emails sent, retried and quarantined.
+        :rtype: :py:class:`dict`
+
+        """
+
+        if max_attempts is None:
+            max_attempts = app_settings.OUTBOX_MAX_ATTEMPTS
+
+        counts = {'sent': 0, 'retried': 0, 'quarantined': 0}
+        queued_emails = self.lease(batch_size=batch_size,
+                                   lease_timeout=lease_timeout)
+
+        loaded = []
+        for queued_email in queued_emails:
+            try:
+                loaded.append((queued_email, queued_email.get_message()))
+            except Exception as error:
+                queued_email.quarantine(error)
+                counts['quarantined'] += 1
+
+        messages = [message for _, message in loaded]
+        try:
+            results = send_messages(messages, connection=connection)
+        except Exception as error:
+            # Such as an email backend which can't be loaded. Every leased
+            # email counts as failed, so it is retried with backoff.
+            results = [SendResult(message, False, error)
+                       for message in messages]
+        for (queued_email, _), result in zip(loaded, results):
+            if result.error is None:
+                queued_email.mark_sent()
+                counts['sent'] += 1
+            elif queued_email.attempts + 1 >= max_attempts:
+                queued_email.quarantine(result.error)
+                counts['quarantined'] += 1
+            else:
+                queued_email.retry(result.error)
+                counts['retried'] += 1
+        return counts
+
+
+@python_2_unicode_compatible
+class QueuedEmail(models.Model):
+    """An email message waiting in the outbox to be sent."""
+
+    QUEUED = 'queued'
+    SENT = 'sent'
+    QUARANTINED = 'quarantined'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (SENT, 'Sent'),
+                      (QUARANTINED, 'Quarantined')]
+
+    message = models.BinaryField()
+
+    subject = models.CharField(max_length=255, blank=True)
+
+    status = models.CharField(max_length=11, choices=STATUS_CHOICES,
+                              default=QUEUED, db_index=True)
+
+    attempts = models.PositiveIntegerField(default=0)
+
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(default=timezone.now)
+
+    available_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    leased_until = models.DateTimeField(blank=True, null=True, db_index=True)
+
+    lease_owner = models.CharField(max_length=32, blank=True, db_index=True)
+
+    objects = QueuedEmailQuerySet.as_manager()
+
+    class Meta(object):
+        ordering = ['available_at', 'pk']
+
+    def __str__(self):
+        return self.subject
+
+    def get_message(self):
+        """Returns the stored email message.
+
+        :returns: Email message instance.
+        :rtype: :py:class:`~django.core.mail.EmailMessage`
+
+        """
+
+        return pickle.loads(bytes(self.message))
+
+    def mark_sent(self):
+        self.status = self.SENT
+        self.attempts += 1
+        self.sent_at = timezone.now()
+        self.release()
+        self.save(update_fields=['status', 'attempts', 'sent_at',
+                                 'leased_until', 'lease_owner'])
+
+    def quarantine(self, error):
+        self.status = self.QUARANTINED
+        self.attempts += 1
+        self.last_error = '{0}'.format(error)
+        self.release()
+        self.save(update_fields=['status', 'attempts', 'last_error',
+                                 'leased_until', 'lease_owner'])
+
+    def release(self):
+        self.leased_until = None
+        self.lease_owner = ''
+
+    def retry(self, error):
+        self.attempts += 1
+        delay = min(app_settings.OUTBOX_RETRY_DELAY * 2 ** (self.attempts - 1),
+                    app_settings.OUTBOX_MAX_RETRY_DELAY)
+        self.available_at = timezone.now() + timedelta(seconds=delay)
+        self.last_error = '{0}'.format(error)
+        self.release()
+        self.save(update_fields=['attempts', 'available_at', 'last_error',
+                                 'leased_until', 'lease_owner'])
+
+
+class DigestEntryQuerySet(models.QuerySet):
+
+    def add(self, form):
+        """Store a valid form's data for the next digest email.
+
+        Values are stored as they would be displayed in the email body.
+
+        :returns: The stored submission.
+        :rtype: :py:class:`thecut.emailform.models.DigestEntry`
+
+        """
+
+        fields = [[name, force_text(data['label']),
+                   rendering.render_value(data['cleaned_data'])]
+                  for name, data in form.get_email_form_fields().items()]
+        return self.create(form_class=get_class_path(form.__class__),
+                           fields=json.dumps(fields))
+
+    def flush(self, form_class, force=False):
+        """Send a digest email for a form class's stored submissions, if one
+        is due.
+
+        A digest is due once the form's ``digest_max_items`` submissions are
+        stored, or the oldest submission is ``digest_interval`` minutes old.
+
+        :argument form_class: An email form class.
+        :keyword bool force: Send the digest even if it isn't due.
+        :returns: The digest email, if one was sent.
+
+        """
+
+        form = form_class.get_digest_form()
+        entries = self.filter(form_class=get_class_path(form_class))
+        oldest = entries.order_by('created_at', 'pk').first()
+        if oldest is None:
+            return None
+        if not force:
+            cutoff = timezone.now() - timedelta(
+                minutes=form.get_digest_interval())
+            if (oldest.created_at > cutoff and
+                    entries.count() < form.get_digest_max_items()):
+                return None
+
+        entries = list(entries.order_by('created_at', 'pk'))
+        message = form.construct_digest_email(
+            [entry.get_submission() for entry in entries])
+        pks = [entry.pk for entry in entries]
+        with transaction.atomic(using=self.db):
+            # Deleting the entries claims them, so concurrent workers don't
+            # send the same digest. Where the database supports it, the rows
+            # are locked until the entries are deleted.
+            claimed = list(self.select_for_update().filter(
+                pk__in=pks).values_list('pk', flat=True))
+            if len(claimed) != len(entries):
+                return None
+            self.filter(pk__in=pks).delete()
+        # The email is sent once the entries are claimed, outside of the
+        # transaction, and the entries are restored if sending fails.
+        if message.connection is None:
+            # Such as a digest email constructed without a connection, which
+            # must still be sent with the app's email backend.
+            message.connection = get_connection()
+        try:
+            message.send()
+        except Exception:
+            self.bulk_create(entries)
+            raise
+        return message
+
+    def flush_due(self):
+        """Send every digest email which is due.
+
+        :returns: Number of digest emails sent.
+        :rtype: :py:class:`int`
+
+        """
+
+        sent = 0
+        paths = self.order_by('form_class').values_list(
+            'form_class', flat=True).distinct()
+        for path in list(paths):
+            try:
+                form_class = import_string(path)
+            except ImportError:
+                logger.warning('Can not send digest for missing form class '
+                               '%r.', path)
+                continue
+            if self.flush(form_class) is not None:
+                sent += 1
+        return sent
+
+
+@python_2_unicode_compatible
+class DigestEntry(models.Model):
+    """A form submission waiting to be sent in a digest email."""
+
+    form_class = models.CharField(max_length=255, db_index=True)
+
+    fields = models.TextField()
+
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    objects = DigestEntryQuerySet.as_manager()
+
+    class Meta(object):
+        ordering = ['created_at', 'pk']
+        verbose_name_plural = 'digest entries'
+
+    def __str__(self):
+        return self.form_class
+
+    def get_submission(self):
+        """Returns the submission's data for a digest email template.
+
+        :returns: The ``created_at`` time, and the ``form_fields`` in the
+            same structure as the email form's ``get_email_form_fields()``.
+        :rtype: :py:class:`dict`
+
+        """
+
+        form_fields = OrderedDict(
+            (name, {'label': label, 'cleaned_data': value})
+            for name, label, value in json.loads(self.fields))
+        return {'created_at': self.created_at, 'form_fields': form_fields}
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from .settings import app_settings
+from collections import OrderedDict
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import six
+import threading
+import time
+
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+
+def parse_rate(rate):
+    """Parses a rate such as ``'10/m'`` (ten per minute).
+
+    :argument rate: A string, or a ``(count, seconds)`` tuple.
+    :returns: The number of requests allowed, and the period in seconds.
+    :rtype: :py:class:`tuple`
+
+    """
+
+    if not isinstance(rate, six.string_types):
+        count, seconds = rate
+        return int(count), float(seconds)
+    try:
+        count, period = rate.split('/')
+        return int(count), float(PERIODS[period[:1].lower()])
+    except (KeyError, ValueError):
+        raise ImproperlyConfigured('Invalid rate limit {0!r}.'.format(rate))
+
+
+class LocalStore(object):
+    """Stores token buckets in memory, for a single process.
+
+    :keyword int max_size: Maximum number of buckets stored. The least
+        recently used buckets are removed first.
+
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def update(self, key, function, timeout):
+        with self._lock:
+            value = function(self._buckets.pop(key, None))
+            self._buckets[key] = value
+            while len(self._buckets) > self.max_size:
+                self._buckets.popitem(last=False)
+            return value
+
+
+class CacheStore(object):
+    """Stores token buckets in a Django cache, so they can be shared between
+    processes.
+
+    Updates aren't atomic, so concurrent requests from the same client may
+    occasionally be allowed through.
+
+    :keyword unicode alias: The cache to use.
+
+    """
+
+    def __init__(self, alias=None):
+        self.alias = app_settings.RATE_LIMIT_CACHE if alias is None else alias
+
+    def update(self, key, function, timeout):
+        from django.core.cache import caches
+        cache = caches[self.alias]
+        key = 'emailform:ratelimit:{0}'.format(key)
+        value = function(cache.get(key))
+        cache.set(key, value, int(timeout) + 1)
+        return value
+
+
+STORES = {'local': LocalStore, 'cache': CacheStore}
+
+
+class RateLimiter(object):
+    """A token bucket rate limiter.
+
+    Each key may make ``count`` requests at once, after which requests are
+    allowed at a steady rate of ``count`` per period.
+
+    :py:attr:`hits` counts requests which were rejected, and
+    :py:attr:`misses` counts requests which were allowed.
+
+    :argument rate: A rate such as ``'10/m'``. See
+        :py:func:`~thecut.emailform.ratelimit.parse_rate`.
+    :keyword store: Bucket storage. Defaults to a
+        :py:class:`~thecut.emailform.ratelimit.LocalStore`.
+
+    """
+
+    def __init__(self, rate, store=None):
+        self.capacity, self.period = parse_rate(rate)
+        self.store = LocalStore() if store is None else store
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        """Take a token from a key's bucket, if one is available.
+
+        :returns: Whether the request is allowed.
+        :rtype: :py:class:`bool`
+
+        """
+
+        now = time.time()
+        allowed = []
+
+        def take(bucket):
+            if bucket is None:
+                tokens = float(self.capacity)
+            else:
+                tokens, updated = bucket
+                tokens = min(self.capacity, tokens + (
+                    now - updated) * self.capacity / self.period)
+            allowed.append(tokens >= 1)
+            return (tokens - 1 if allowed[-1] else tokens), now
+
+        self.store.update(key, take, self.period)
+        allowed = allowed[-1]
+        with self._lock:
+            if allowed:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return allowed
+
+    def stats(self):
+        """Returns the limiter's counters.
+
+        :rtype: :py:class:`dict`
+
+        """
+
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(rate, store=None):
+    """Returns the process-wide rate limiter for a rate and store name.
+
+    :keyword unicode store: ``'local'`` or ``'cache'``. Defaults to the
+        ``EMAILFORM_RATE_LIMIT_STORE`` setting.
+    :rtype: :py:class:`thecut.emailform.ratelimit.RateLimiter`
+
+    """
+
+    store = app_settings.RATE_LIMIT_STORE if store is None else store
+    if store not in STORES:
+        raise ImproperlyConfigured(
+            'Unknown rate limit store {0!r}.'.format(store))
+    key = (rate if isinstance(rate, six.string_types) else tuple(rate), store)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = RateLimiter(rate, STORES[store]())
+        return limiter
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from .inlining import inline_css
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.encoding import force_text
+from django.utils.formats import localize
+from django.utils.timezone import template_localtime
+import os
+
+
+STOCK_EMAIL_TEMPLATE_NAME = 'emailform/email.txt'
+
+STOCK_EMAIL_TEMPLATE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'templates', 'emailform',
+    'email.txt')
+
+_html_templates = {}
+
+_stock_templates = {}
+
+
+def get_html_template(template_name):
+    """Returns an HTML email template, with the CSS in its ``<style>``
+    elements moved into ``style`` attributes (see
+    :py:func:`thecut.emailform.inlining.inline_css`).
+
+    The CSS is inlined into the template's source, which is then compiled
+    and cached, so the CSS is only inlined once per template.
+
+    :returns: A template, as returned by
+        :py:func:`~django.template.loader.get_template`.
+
+    """
+
+    try:
+        return _html_templates[template_name]
+    except KeyError:
+        pass
+    from django.template.loader import get_template
+    template = get_template(template_name)
+    source, _ = get_template_source(template)
+    compiled = get_template_backend(template).from_string(inline_css(source))
+    _html_templates[template_name] = compiled
+    return compiled
+
+
+def get_template_backend(template):
+    """Returns the template engine a Django template was loaded with.
+
+    :argument template: A template, as returned by
+        :py:func:`~django.template.loader.get_template`.
+    :rtype: :py:class:`~django.template.backends.django.DjangoTemplates`
+
+    """
+
+    backend = getattr(template, 'backend', None)
+    if backend is not None:
+        return backend
+    # Django < 1.11 templates don't refer to their engine's backend.
+    from django.template import engines
+    engine = template.template.engine
+    for backend in engines.all():
+        if getattr(backend, 'engine', None) is engine:
+            return backend
+    return engines['django']
+
+
+def get_template_source(template):
+    """Returns the source of a Django template, and the name of the file it
+    was loaded from.
+
+    :argument template: A template, as returned by
+        :py:func:`~django.template.loader.get_template`.
+    :returns: The source, and the file name (or ``None`` if not known).
+    :rtype: :py:class:`tuple`
+
+    """
+
+    from django.template import TemplateDoesNotExist
+    template = template.template
+    source = getattr(template, 'source', None)
+    if source is not None:
+        origin = template.origin
+        return source, origin.name if origin is not None else None
+    # Django 1.8 templates don't keep their source or, unless the engine is
+    # in debug mode, their origin, so the source is loaded again.
+    loaders = []
+    for loader in template.engine.template_loaders:
+        loaders.extend(getattr(loader, 'loaders', [loader]))
+    for loader in loaders:
+        try:
+            return loader.load_template_source(template.name)
+        except TemplateDoesNotExist:
+            continue
+    raise TemplateDoesNotExist(template.name)
+
+
+def is_stock_email_template(template_name):
+    """Returns whether a template name resolves to the stock email body
+    template shipped with ``thecut.emailform``.
+
+    The result is cached, so the template is only looked up once.
+
+    :rtype: :py:class:`bool`
+
+    """
+
+    try:
+        return _stock_templates[template_name]
+    except KeyError:
+        pass
+    is_stock = False
+    if template_name == STOCK_EMAIL_TEMPLATE_NAME:
+        from django.template.backends.django import Template
+        from django.template.loader import get_template
+        template = get_template(template_name)
+        if isinstance(template, Template):
+            _, path = get_template_source(template)
+            is_stock = bool(path and os.path.realpath(path) ==
+                            os.path.realpath(STOCK_EMAIL_TEMPLATE_PATH))
+    _stock_templates[template_name] = is_stock
+    return is_stock
+
+
+def render_value(value):
+    """Converts a value to text the same way as ``{{ value }}`` in a template
+    with autoescaping turned off."""
+    return force_text(localize(template_localtime(value)))
+
+
+def render_stock_email_body(form_fields, attachment_links=()):
+    """Renders the stock email body without the template engine.
+
+    The output is identical to rendering ``emailform/email.txt``.
+
+    :argument form_fields: The ``form_fields`` context value.
+    :keyword attachment_links: The ``attachment_links`` context value.
+    :rtype: :py:class:`unicode`
+
+    """
+
+    lines = []
+    for data in form_fields.values():
+        if isinstance(data, dict):
+            label, cleaned_data = data['label'], data['cleaned_data']
+        else:
+            label, cleaned_data = data.label, data.cleaned_data
+        lines.append('\n{0}: {1}\n'.format(render_value(label),
+                                           render_value(cleaned_data)))
+    if attachment_links:
+        from django.template.defaultfilters import filesizeformat
+    for link in attachment_links:
+        lines.append('\n{0} ({1}): {2}\n'.format(
+            render_value(link.filename), filesizeformat(link.size),
+            render_value(link.url)))
+    lines.append('\n')
+    return ''.join(lines)
+
+
+@receiver(setting_changed)
+def clear_stock_templates(setting, **kwargs):
+    if setting in ('TEMPLATES', 'INSTALLED_APPS'):
+        _html_templates.clear()
+        _stock_templates.clear()
@@ -1,18 +1,127 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, unicode_literals
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+import sys
+import types
+import warnings
 
 
-DEFAULT_FROM_EMAIL = getattr(settings, 'EMAILFORM_DEFAULT_FROM_EMAIL',
-                             settings.DEFAULT_FROM_EMAIL)
+def _default_to_emails(app_settings):
+    if app_settings.DEFAULT_TO_EMAIL:
+        return [app_settings.DEFAULT_TO_EMAIL]
+    return [a[1] for a in settings.ADMINS]
 
-DEFAULT_TO_EMAIL = getattr(settings, 'EMAILFORM_DEFAULT_TO_EMAIL',
-                           getattr(settings, 'DEFAULT_TO_EMAIL', None))
 
-DEFAULT_TO_EMAILS = getattr(
-    settings, 'EMAILFORM_DEFAULT_TO_EMAILS',
-    [DEFAULT_TO_EMAIL] if DEFAULT_TO_EMAIL else [
-        a[1] for a in settings.ADMINS])
+DEFAULTS = {
+    'DEFAULT_FROM_EMAIL': lambda app_settings: settings.DEFAULT_FROM_EMAIL,
+    'DEFAULT_TO_EMAIL': lambda app_settings: getattr(
+        settings, 'DEFAULT_TO_EMAIL', None),
+    'DEFAULT_TO_EMAILS': _default_to_emails,
+    'EMAIL_SUBJECT_PREFIX': lambda app_settings: (
+        settings.EMAIL_SUBJECT_PREFIX),
+    'ADDRESS_CACHE_SIZE': 1024,
+    'SEND_MODE': 'sync',
+    'SEND_TIMEOUT': None,
+    'BACKGROUND_MAX_WORKERS': 2,
+    'BACKGROUND_MAX_QUEUE_SIZE': 100,
+    'BACKGROUND_SHUTDOWN_TIMEOUT': 10,
+    'EMAIL_DELIVERY': 'immediate',
+    'OUTBOX_BATCH_SIZE': 50,
+    'OUTBOX_MAX_ATTEMPTS': 5,
+    'OUTBOX_RETRY_DELAY': 60,
+    'OUTBOX_MAX_RETRY_DELAY': 3600,
+    'OUTBOX_LEASE_TIMEOUT': 300,
+    'EMAIL_BACKEND': None,
+    'EMAIL_BACKENDS': None,
+    'FAILOVER_THRESHOLD': 3,
+    'FAILOVER_RESET_TIMEOUT': 30,
+    'SMTP_POOL_SIZE': 4,
+    'SMTP_POOL_IDLE_TIMEOUT': 60,
+    'SMTP_POOL_CHECK_INTERVAL': 10,
+    'SMTP_POOL_MAX_MESSAGES': 100,
+    'SMTP_POOL_TIMEOUT': 10,
+    'WARM_UP': False,
+    'WARM_UP_CONNECTIONS': 0,
+    'RATE_LIMIT': None,
+    'RATE_LIMIT_KEY': 'ip',
+    'RATE_LIMIT_STORE': 'local',
+    'RATE_LIMIT_CACHE': 'default',
+    'DEDUPLICATE': False,
+    'DEDUPLICATE_TTL': 300,
+    'DEDUPLICATE_MAX_SIZE': 10000,
+    'DIGEST_INTERVAL': 60,
+    'DIGEST_MAX_ITEMS': 100,
+    'FAST_MIME': False,
+    'ATTACHMENT_LINK_THRESHOLD': None,
+    'ATTACHMENT_LINK_MAX_AGE': 7 * 24 * 60 * 60,
+    'ATTACHMENT_LINK_BASE_URL': None,
+    'ATTACHMENT_STORAGE': None,
+    'TIMING': False,
+    'METRICS_REGISTRY': None,
+}
+"""Default values, or callables which take the app settings and return the
+default value, keyed by setting name without the ``EMAILFORM_`` prefix."""
 
-EMAIL_SUBJECT_PREFIX = getattr(settings, 'EMAILFORM_EMAIL_SUBJECT_PREFIX',
-                               settings.EMAIL_SUBJECT_PREFIX)
+
+class AppSettings(object):
+    """The app's settings, each read from the Django setting with an
+    ``EMAILFORM_`` prefix when first used.
+
+    Values are cached until any Django setting changes, e.g. with
+    :py:func:`~django.test.override_settings`.
+
+    """
+
+    def __getattr__(self, name):
+        try:
+            default = DEFAULTS[name]
+        except KeyError:
+            raise AttributeError(name)
+        try:
+            value = getattr(settings, 'EMAILFORM_{0}'.format(name))
+        except AttributeError:
+            value = default(self) if callable(default) else default
+        self.__dict__[name] = value
+        return value
+
+    def reload(self):
+        """Forget the cached values, so they are read again when used."""
+        self.__dict__.clear()
+
+
+app_settings = AppSettings()
+
+
+@receiver(setting_changed)
+def reload_app_settings(**kwargs):
+    app_settings.reload()
+
+
+DEPRECATED_CONSTANTS = frozenset(['DEFAULT_FROM_EMAIL', 'DEFAULT_TO_EMAIL',
+                                  'DEFAULT_TO_EMAILS', 'EMAIL_SUBJECT_PREFIX'])
+"""Module constants which were replaced by ``app_settings``."""
+
+
+class SettingsModule(types.ModuleType):
+    """This module, which still provides the settings that used to be
+    module constants, such as ``DEFAULT_FROM_EMAIL``, from ``app_settings``.
+    """
+
+    def __init__(self, module):
+        super(SettingsModule, self).__init__(module.__name__, module.__doc__)
+        self.__dict__.update(module.__dict__)
+        # Python 2 clears a module's globals when it is deleted.
+        self._module = module
+
+    def __getattr__(self, name):
+        if name not in DEPRECATED_CONSTANTS:
+            raise AttributeError(name)
+        warnings.warn(
+            '{0}.{1} is deprecated, use {0}.app_settings.{1} instead.'.format(
+                __name__, name), DeprecationWarning, stacklevel=2)
+        return getattr(app_settings, name)
+
+
+sys.modules[__name__] = SettingsModule(sys.modules[__name__])
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from django.dispatch import Signal
+
+
+email_phase_timed = Signal(providing_args=['form', 'phase', 'duration'])
+"""Sent after each timed phase of constructing or sending a form's email,
+when ``EMAILFORM_TIMING`` is enabled. The sender is the form class, and
+``duration`` is in seconds."""
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""A local SMTP server which discards the emails it receives, for load
+testing.
+
+Run with ``python -m thecut.emailform.smtpsink``, or start it from the
+``emailform_loadtest`` management command. It can add latency to each email
+and respond to some emails with temporary (``4xx``) or permanent (``5xx``)
+failures, or by disconnecting.
+
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+from django.utils.six.moves import socketserver
+import argparse
+import random
+import threading
+import time
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        self.server.count('connections')
+        self.reply(b'220 localhost ESMTP sink')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.strip().split(b' ', 1)[0].upper()
+            if command in (b'EHLO', b'HELO'):
+                self.reply(b'250 localhost')
+            elif command in (b'MAIL', b'RCPT', b'RSET', b'NOOP'):
+                self.reply(b'250 OK')
+            elif command == b'DATA':
+                self.reply(b'354 End data with <CR><LF>.<CR><LF>')
+                for line in iter(self.rfile.readline, b''):
+                    if line == b'.\r\n':
+                        break
+                fault = self.server.get_fault()
+                time.sleep(self.server.get_latency())
+                if fault == 'disconnect':
+                    self.server.count('disconnects')
+                    return
+                elif fault == 'tempfail':
+                    self.server.count('tempfails')
+                    self.reply(b'451 4.3.0 Temporary failure')
+                elif fault == 'permfail':
+                    self.server.count('permfails')
+                    self.reply(b'554 5.0.0 Transaction failed')
+                else:
+                    self.server.count('messages')
+                    self.reply(b'250 OK')
+            elif command == b'QUIT':
+                self.reply(b'221 Bye')
+                return
+            else:
+                self.reply(b'502 Command not implemented')
+
+    def reply(self, line):
+        self.wfile.write(line + b'\r\n')
+
+
+class SMTPSink(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """An SMTP server which counts and discards the emails it receives.
+
+    :keyword unicode host: Address to listen on.
+    :keyword int port: Port to listen on. ``0`` picks a free port.
+    :keyword float latency: Seconds to wait before responding to each email.
+    :keyword float jitter: Maximum number of seconds added to the latency at
+        random.
+    :keyword float tempfail_rate: Proportion of emails which get a ``451``
+        response.
+    :keyword float permfail_rate: Proportion of emails which get a ``554``
+        response.
+    :keyword float disconnect_rate: Proportion of emails which get no
+        response, the connection being closed instead.
+    :keyword int seed: Seed for choosing which emails fail.
+
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0, jitter=0,
+                 tempfail_rate=0, permfail_rate=0, disconnect_rate=0,
+                 seed=None):
+        socketserver.TCPServer.__init__(self, (host, port), SMTPSinkHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.faults = [('tempfail', tempfail_rate),
+                       ('permfail', permfail_rate),
+                       ('disconnect', disconnect_rate)]
+        self.random = random.Random(seed)
+        self.stats = dict.fromkeys(['connections', 'messages', 'tempfails',
+                                    'permfails', 'disconnects'], 0)
+        self.thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def get_fault(self):
+        """Returns the failure to respond to an email with, if any.
+
+        :returns: ``'tempfail'``, ``'permfail'``, ``'disconnect'`` or
+            ``None``.
+
+        """
+
+        with self._lock:
+            value = self.random.random()
+        for fault, rate in self.faults:
+            if value < rate:
+                return fault
+            value -= rate
+        return None
+
+    def get_latency(self):
+        if not self.jitter:
+            return self.latency
+        with self._lock:
+            return self.latency + self.random.uniform(0, self.jitter)
+
+    def start(self):
+        """Serve from a daemon thread."""
+        self.thread = threading.Thread(target=self.serve_forever,
+                                       kwargs={'poll_interval': 0.05})
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Run an SMTP server which discards emails.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1025)
+    add_fault_arguments(parser)
+    options = parser.parse_args(argv)
+    sink = SMTPSink(host=options.host, port=options.port,
+                    **get_fault_options(vars(options)))
+    print('Listening on {0}:{1}.'.format(options.host, sink.port))
+    try:
+        sink.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink.server_close()
+    print(format_stats(sink.stats))
+
+
+def add_fault_arguments(parser):
+    """Add the sink's latency and failure options to an argument parser."""
+    parser.add_argument(
+        '--latency', type=float, default=0,
+        help='Seconds to wait before responding to each email.')
+    parser.add_argument(
+        '--jitter', type=float, default=0,
+        help='Maximum number of seconds added to the latency at random.')
+    parser.add_argument(
+        '--tempfail-rate', type=float, default=0,
+        help='Proportion of emails which get a 451 response.')
+    parser.add_argument(
+        '--permfail-rate', type=float, default=0,
+        help='Proportion of emails which get a 554 response.')
+    parser.add_argument(
+        '--disconnect-rate', type=float, default=0,
+        help='Proportion of emails which get disconnected.')
+    parser.add_argument(
+        '--seed', type=int, default=None,
+        help='Seed for choosing which emails fail.')
+
+
+def get_fault_options(options):
+    """Returns the sink's keyword arguments from parsed options.
+
+    :rtype: :py:class:`dict`
+
+    """
+
+    return dict((name, options[name])
+                for name in ['latency', 'jitter', 'tempfail_rate',
+                             'permfail_rate', 'disconnect_rate', 'seed'])
+
+
+def format_stats(stats):
+    return ('SMTP sink: {connections} connections, {messages} accepted, '
+            '{tempfails} temporary failures, {permfails} permanent failures, '
+            '{disconnects} disconnects.'.format(**stats))
+
+
+if __name__ == '__main__':
+    main()
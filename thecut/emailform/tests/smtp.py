@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from django.utils.six.moves import socketserver
+import threading
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply(b'220 localhost ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.strip().split(b' ', 1)[0].upper()
+            if command in (b'EHLO', b'HELO'):
+                self.reply(b'250 localhost')
+            elif command in (b'MAIL', b'RCPT', b'RSET'):
+                self.reply(b'250 OK')
+            elif command == b'NOOP':
+                self.server.noops += 1
+                self.reply(b'250 OK')
+            elif command == b'DATA':
+                self.reply(b'354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                for line in iter(self.rfile.readline, b''):
+                    if line == b'.\r\n':
+                        break
+                    if line.startswith(b'.'):
+                        line = line[1:]
+                    lines.append(line)
+                self.server.messages.append(b''.join(lines))
+                self.reply(b'250 OK')
+            elif command == b'QUIT':
+                self.reply(b'221 Bye')
+                return
+            else:
+                self.reply(b'502 Command not implemented')
+
+    def reply(self, line):
+        self.wfile.write(line + b'\r\n')
+
+
+class SMTPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+
+    """A minimal SMTP server which records the messages it receives."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        socketserver.TCPServer.__init__(self, ('127.0.0.1', 0), SMTPHandler)
+        self.connections = 0
+        self.noops = 0
+        self.messages = []
+        self.thread = threading.Thread(target=self.serve_forever,
+                                       kwargs={'poll_interval': 0.05})
+        self.thread.daemon = True
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
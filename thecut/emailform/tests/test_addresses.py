@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from django.core import mail
+from django.test import SimpleTestCase
+from test_app.forms import EmailForm
+from thecut.emailform import addresses
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+class TestNormaliseAddress(SimpleTestCase):
+
+    """Tests for :py:mod:`thecut.emailform.addresses`."""
+
+    def setUp(self):
+        cache = addresses.LRUCache(max_size=2)
+        patcher = mock.patch('thecut.emailform.addresses._cache', cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = cache
+
+    def test_encodes_address(self):
+        """IDNA-encode the domain and encode the display name."""
+        self.assertEqual(
+            addresses.normalise_address('Zoë <zoe@exämple.com>'),
+            '=?utf-8?q?Zo=C3=AB?= <zoe@xn--exmple-cua.com>')
+        self.assertEqual(addresses.normalise_address('zoe@example.com'),
+                         'zoe@example.com')
+
+    def test_rejects_invalid_address(self):
+        """Raise ``InvalidAddress`` for addresses which aren't valid."""
+        for address in ['zoe', 'zoe@', '<>', 'zoe@example@com']:
+            with self.assertRaises(addresses.InvalidAddress):
+                addresses.normalise_address(address)
+
+    def test_caches_results(self):
+        """Normalise each address once, including invalid addresses."""
+        with mock.patch('thecut.emailform.addresses._normalise_address',
+                        wraps=addresses._normalise_address) as normalise:
+            for _ in range(2):
+                addresses.normalise_address('zoe@example.com')
+                with self.assertRaises(addresses.InvalidAddress):
+                    addresses.normalise_address('zoe')
+        self.assertEqual(normalise.call_count, 2)
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 2))
+
+    def test_evicts_least_recently_used(self):
+        """Remove the least recently used address when the cache is full."""
+        addresses.normalise_address('a@example.com')
+        addresses.normalise_address('b@example.com')
+        addresses.normalise_address('a@example.com')
+        addresses.normalise_address('c@example.com')
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+        self.assertIsNone(self.cache.get(('b@example.com', 'utf-8')))
+        self.assertEqual(self.cache.get(('a@example.com', 'utf-8')),
+                         'a@example.com')
+
+    def test_form_rejects_invalid_recipient(self):
+        """Refuse to send a form's email to an invalid address."""
+        form = EmailForm({'foo': 'bar'})
+        self.assertTrue(form.is_valid())
+        form.to_emails = ['mail@example.com', 'not an address']
+        with self.assertRaises(addresses.InvalidAddress):
+            form.send_email()
+        self.assertEqual(len(mail.outbox), 0)
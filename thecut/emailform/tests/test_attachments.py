@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from django.core import mail
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import FileSystemStorage
+from django.core.mail import EmailMessage
+from django.template.loader import get_template
+from django.test import TestCase
+from django.test.utils import override_settings
+from test_app.forms import EmailForm
+from thecut.emailform import attachments
+from thecut.emailform.attachments import FileAttachment
+from thecut.emailform.backends import StreamingSMTPBackend
+from thecut.emailform.models import QueuedEmail
+from thecut.emailform.tests.smtp import SMTPServer
+import email
+import os
+import re
+import shutil
+import tempfile
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+class AttachmentEmailForm(EmailForm):
+
+    def __init__(self, *args, **kwargs):
+        self.attachments = kwargs.pop('attachments')
+        super(AttachmentEmailForm, self).__init__(*args, **kwargs)
+
+    def get_email_attachments(self):
+        return self.attachments
+
+
+class TestFileAttachment(TestCase):
+
+    """Tests for :py:class:`thecut.emailform.attachments.FileAttachment`."""
+
+    def setUp(self):
+        self.content = os.urandom(attachments.READ_SIZE * 2 + 100)
+        handle, self.path = tempfile.mkstemp(suffix='.pdf')
+        os.write(handle, self.content)
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+    def get_attachment(self, message):
+        # Parse the serialized message, as a recipient would.
+        message = email.message_from_string(message.as_string())
+        for part in message.walk():
+            if part.get_filename():
+                return part
+
+    def test_attaches_file_path(self):
+        """Attach a file given by its path."""
+        form = AttachmentEmailForm({'foo': 'bar'}, attachments=[self.path])
+        form.send_email()
+        part = self.get_attachment(mail.outbox[0].message())
+        self.assertEqual(part.get_filename(), os.path.basename(self.path))
+        self.assertEqual(part.get_content_type(), 'application/pdf')
+        self.assertEqual(part.get_payload(decode=True), self.content)
+
+    def test_ignores_invalid_content_type(self):
+        """Use ``application/octet-stream`` for an invalid content type."""
+        upload = SimpleUploadedFile('notes.txt', b'Hello', 'foo')
+        part = FileAttachment(upload)
+        self.assertEqual(part.get_content_type(), 'application/octet-stream')
+
+    def test_attaches_uploaded_file(self):
+        """Attach an uploaded file, using its name and content type."""
+        upload = SimpleUploadedFile('Résumé.txt', b'Hello', 'text/plain')
+        form = AttachmentEmailForm({'foo': 'bar'}, attachments=[upload])
+        form.send_email()
+        part = self.get_attachment(mail.outbox[0].message())
+        self.assertEqual(part.get_filename(), 'Résumé.txt')
+        self.assertEqual(part.get_payload(decode=True), b'Hello')
+
+    def test_queues_file_contents(self):
+        """Store the file's contents when the email is queued."""
+        form = AttachmentEmailForm({'foo': 'bar'}, attachments=[self.path])
+        form.email_delivery = 'queue'
+        form.send_email()
+        QueuedEmail.objects.deliver()
+        part = self.get_attachment(mail.outbox[0].message())
+        self.assertEqual(part.get_payload(decode=True), self.content)
+
+    def test_detaches_uploaded_file(self):
+        """Encode an uploaded file so it can be sent after the request."""
+        upload = SimpleUploadedFile('notes.txt', b'Hello', 'text/plain')
+        attachment = FileAttachment(upload)
+        attachment.detach()
+        upload.close()
+        message = EmailMessage('Subject', 'Body', 'from@example.com',
+                               ['to@example.com'], attachments=[attachment])
+        message.send()
+        part = self.get_attachment(mail.outbox[0].message())
+        self.assertEqual(part.get_payload(decode=True), b'Hello')
+
+    def test_streams_file_to_smtp_server(self):
+        """Stream the file to the SMTP server without encoding it all in
+        memory."""
+        server = SMTPServer()
+        server.start()
+        self.addCleanup(server.stop)
+        message = EmailMessage('Subject', 'Body\n.hidden dot\n',
+                               'from@example.com', ['to@example.com'],
+                               attachments=[FileAttachment(self.path)])
+        backend = StreamingSMTPBackend(host='127.0.0.1', port=server.port)
+        self.assertEqual(backend.send_messages([message]), 1)
+        self.assertIsNone(message.attachments[0]._encoded)
+        self.assertIsNone(re.search(br'[^\r]\n', server.messages[0]))
+
+        received = email.message_from_string(
+            server.messages[0].decode('ascii'))
+        body, part = received.get_payload()
+        self.assertEqual(body.get_payload().splitlines(),
+                         ['Body', '.hidden dot'])
+        self.assertEqual(part.get_payload(decode=True), self.content)
+
+
+class TestAttachmentLinks(TestCase):
+
+    """Tests for attachments which are linked to instead of attached."""
+
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        self.storage = FileSystemStorage(location=location)
+        overridden = override_settings(
+            EMAILFORM_ATTACHMENT_STORAGE=self.storage,
+            EMAILFORM_ATTACHMENT_LINK_THRESHOLD=1024,
+            EMAILFORM_ATTACHMENT_LINK_BASE_URL='https://example.com/')
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        self.content = os.urandom(2048)
+        self.form = AttachmentEmailForm({'foo': 'bar'}, attachments=[
+            ('small.txt', 'Small', 'text/plain'),
+            SimpleUploadedFile('Large report.pdf', self.content)])
+        self.assertTrue(self.form.is_valid())
+
+    def get_link(self):
+        [link] = self.form.make_email_attachments()[1]
+        return link
+
+    def test_links_large_attachment(self):
+        """Save attachments over the threshold to storage, and link to
+        them in the email body."""
+        self.form.send_email()
+        message = mail.outbox[0]
+        self.assertEqual([attachment[0] for attachment in message.attachments],
+                         ['small.txt'])
+        self.assertIn('Large report.pdf (2.0\xa0KB): https://example.com/'
+                      'emailform/attachments/', message.body)
+        [directory] = self.storage.listdir('emailform/attachments')[0]
+        [name] = self.storage.listdir(
+            'emailform/attachments/{0}'.format(directory))[1]
+        self.assertEqual(name, 'Large report.pdf')
+
+    def test_renders_links_like_stock_template(self):
+        """Render links without the template engine identically."""
+        context = self.form.get_email_context_data(
+            attachment_links=[self.get_link()])
+        self.assertEqual(
+            self.form.render_email_body(context),
+            get_template('emailform/email.txt').render(context))
+
+    def test_downloads_attachment(self):
+        """Serve the attachment from its link."""
+        response = self.client.get(self.get_link().url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['Content-Disposition'],
+                         "attachment; filename*=UTF-8''Large%20report.pdf")
+
+    def test_rejects_invalid_link(self):
+        """Return 404 Not Found for tampered or expired links."""
+        url = self.get_link().url
+        self.assertEqual(self.client.get(url[:-2] + 'x/').status_code, 404)
+        with self.settings(EMAILFORM_ATTACHMENT_LINK_MAX_AGE=-1):
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_requires_storage(self):
+        """Raise ``ImproperlyConfigured`` rather than saving attachments to
+        the default storage, which is usually public."""
+        with self.settings(EMAILFORM_ATTACHMENT_STORAGE=None):
+            with self.assertRaises(ImproperlyConfigured):
+                self.form.send_email()
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_uses_current_site_domain(self):
+        """Use the current site's domain when no base URL is set."""
+        with self.settings(EMAILFORM_ATTACHMENT_LINK_BASE_URL=None):
+            self.assertEqual(attachments.get_link_base_url(),
+                             'https://example.com')
+
+    def test_requires_base_url(self):
+        """Raise ``ImproperlyConfigured`` rather than making relative links
+        when there is no base URL or sites framework."""
+        with self.settings(EMAILFORM_ATTACHMENT_LINK_BASE_URL=None), \
+                mock.patch('django.apps.apps.is_installed',
+                           return_value=False):
+            with self.assertRaises(ImproperlyConfigured):
+                attachments.get_link_base_url()
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from django.core import mail
+from django.core.mail import EmailMessage
+from django.core.mail.backends.base import BaseEmailBackend
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from test_app.forms import EmailForm
+from thecut.emailform import backends
+from thecut.emailform.tests.smtp import SMTPServer
+import smtplib
+import socket
+import threading
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+class TestPooledSMTPBackend(SimpleTestCase):
+
+    """Tests for :py:class:`thecut.emailform.backends.PooledSMTPBackend`."""
+
+    def setUp(self):
+        self.server = SMTPServer()
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.addCleanup(backends.close_pools)
+
+    def get_backend(self):
+        return backends.PooledSMTPBackend(host='127.0.0.1',
+                                          port=self.server.port)
+
+    def send(self, backend=None):
+        message = EmailMessage('Subject', 'Body', 'from@example.com',
+                               ['to@example.com'])
+        return (backend or self.get_backend()).send_messages([message])
+
+    def test_reuses_connection(self):
+        """Reuse one SMTP connection across backend instances."""
+        for _ in range(3):
+            self.assertEqual(self.send(), 1)
+        self.assertEqual(len(self.server.messages), 3)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_recycles_connection_after_max_messages(self):
+        """Replace a connection after it has sent ``max_messages``."""
+        self.get_backend().get_pool().max_messages = 2
+        for _ in range(3):
+            self.send()
+        self.assertEqual(self.server.connections, 2)
+
+    def test_reaps_idle_connection(self):
+        """Close connections which have been idle too long."""
+        self.get_backend().get_pool().idle_timeout = -1
+        self.send()
+        self.send()
+        self.assertEqual(self.server.connections, 2)
+
+    def test_checks_connection_health(self):
+        """Replace a pooled connection which fails a ``NOOP`` check."""
+        pool = self.get_backend().get_pool()
+        pool.check_interval = -1
+        self.send()
+        with mock.patch.object(backends.PooledConnection, 'is_alive',
+                               return_value=False):
+            self.send()
+        self.assertEqual(self.server.connections, 2)
+        self.send()
+        self.assertEqual(self.server.noops, 1)
+
+    def test_limits_concurrent_connections(self):
+        """Never open more connections than the pool size."""
+        self.get_backend().get_pool().max_size = 2
+        threads = [threading.Thread(target=self.send) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(self.server.messages), 8)
+        self.assertLessEqual(self.server.connections, 2)
+
+    def test_releases_connection_when_send_fails(self):
+        """Return the pool slot of a connection which failed to send."""
+        pool = self.get_backend().get_pool()
+        pool.max_size = 2
+        pool.timeout = 0.5
+        with mock.patch.object(smtplib.SMTP, 'sendmail',
+                               side_effect=smtplib.SMTPServerDisconnected):
+            for _ in range(pool.max_size + 1):
+                with self.assertRaises(smtplib.SMTPServerDisconnected):
+                    self.send()
+        self.assertEqual(self.send(), 1)
+        self.assertEqual(len(self.server.messages), 1)
+
+    def test_form_uses_configured_backend(self):
+        """Send form emails with ``EMAILFORM_EMAIL_BACKEND``."""
+        with override_settings(
+                EMAIL_HOST='127.0.0.1', EMAIL_PORT=self.server.port,
+                EMAILFORM_EMAIL_BACKEND='thecut.emailform.backends.'
+                'PooledSMTPBackend'):
+            form = EmailForm({'foo': 'bar'})
+            form.send_email()
+            form.send_email()
+        self.assertEqual(len(self.server.messages), 2)
+        self.assertEqual(self.server.connections, 1)
+
+
+class FailingBackend(BaseEmailBackend):
+
+    """An email backend which times out, unless ``fail`` is ``False``."""
+
+    calls = 0
+    error = socket.timeout('timed out')
+    fail = True
+
+    def send_messages(self, email_messages):
+        FailingBackend.calls += 1
+        if self.fail:
+            raise self.error
+        mail.outbox.extend(email_messages)
+        return len(email_messages)
+
+
+@override_settings(EMAILFORM_FAILOVER_THRESHOLD=2)
+class TestFailoverBackend(SimpleTestCase):
+
+    """Tests for :py:class:`thecut.emailform.backends.FailoverBackend`."""
+
+    failing = 'thecut.emailform.tests.test_backends.FailingBackend'
+    locmem = 'django.core.mail.backends.locmem.EmailBackend'
+
+    def setUp(self):
+        FailingBackend.calls = 0
+        patcher = mock.patch.multiple(
+            FailingBackend, error=FailingBackend.error, fail=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        backends.reset_breakers()
+        self.addCleanup(backends.reset_breakers)
+
+    def send(self, count=1, paths=None):
+        backend = backends.FailoverBackend(
+            backends=paths or [self.failing, self.locmem])
+        return backend.send_messages([
+            EmailMessage('Subject', 'Body', 'from@example.com',
+                         ['to@example.com']) for _ in range(count)])
+
+    def test_fails_over_to_next_backend(self):
+        """Send with the next backend when the first one fails."""
+        self.assertEqual(self.send(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(FailingBackend.calls, 1)
+
+    def test_skips_backend_with_open_breaker(self):
+        """Stop trying a backend after consecutive failures."""
+        self.assertEqual(self.send(count=5), 5)
+        self.assertEqual(FailingBackend.calls, 2)
+        self.assertEqual(backends.get_breaker((self.failing, ())).state,
+                         backends.CircuitBreaker.OPEN)
+
+    def test_probes_backend_when_half_open(self):
+        """Try a backend again after the reset timeout, closing its breaker
+        if it succeeds."""
+        self.send(count=2)
+        breaker = backends.get_breaker((self.failing, ()))
+        breaker.opened_at -= breaker.reset_timeout
+        self.assertEqual(breaker.state, backends.CircuitBreaker.HALF_OPEN)
+        FailingBackend.fail = False
+        self.send(count=2)
+        self.assertEqual(FailingBackend.calls, 4)
+        self.assertEqual(breaker.state, backends.CircuitBreaker.CLOSED)
+
+    def test_reopens_breaker_when_probe_fails(self):
+        """Open the breaker again straight away if the probe fails."""
+        self.send(count=2)
+        breaker = backends.get_breaker((self.failing, ()))
+        breaker.opened_at -= breaker.reset_timeout
+        self.send(count=2)
+        self.assertEqual(FailingBackend.calls, 3)
+        self.assertEqual(breaker.state, backends.CircuitBreaker.OPEN)
+
+    def test_raises_when_every_backend_fails(self):
+        """Raise the last error, then fail fast once every breaker is
+        open."""
+        for _ in range(2):
+            with self.assertRaises(socket.timeout):
+                self.send(paths=[self.failing])
+        with self.assertRaises(backends.BackendsUnavailable):
+            self.send(paths=[self.failing])
+        self.assertEqual(FailingBackend.calls, 2)
+
+    def test_raises_refused_recipients(self):
+        """Raise recipient refusals without trying other backends."""
+        FailingBackend.error = smtplib.SMTPRecipientsRefused({})
+        with self.assertRaises(smtplib.SMTPRecipientsRefused):
+            self.send()
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_raises_permanent_failures(self):
+        """Raise permanent SMTP failures without trying other backends or
+        counting them against the backend."""
+        FailingBackend.error = smtplib.SMTPDataError(554, 'Rejected')
+        for _ in range(3):
+            with self.assertRaises(smtplib.SMTPDataError):
+                self.send()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(FailingBackend.calls, 3)
+        self.assertEqual(backends.get_breaker((self.failing, ())).state,
+                         backends.CircuitBreaker.CLOSED)
+
+    def test_fails_over_on_temporary_failures(self):
+        """Try the next backend after a temporary SMTP failure."""
+        FailingBackend.error = smtplib.SMTPDataError(451, 'Try again')
+        self.assertEqual(self.send(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_fails_over_on_authentication_failure(self):
+        """Try the next backend, and count the failure, when a backend's
+        credentials are rejected."""
+        FailingBackend.error = smtplib.SMTPAuthenticationError(
+            535, 'Authentication failed')
+        self.assertEqual(self.send(count=3), 3)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(FailingBackend.calls, 2)
+        self.assertEqual(backends.get_breaker((self.failing, ())).state,
+                         backends.CircuitBreaker.OPEN)
+
+    def test_fails_over_on_refused_connection(self):
+        """Try the next backend when a backend refuses service."""
+        FailingBackend.error = smtplib.SMTPConnectError(
+            554, 'No service')
+        self.assertEqual(self.send(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(FailingBackend.calls, 1)
+
+    def test_form_uses_email_backends(self):
+        """Send form emails with the form's ``email_backends``."""
+        form = EmailForm({'foo': 'bar'})
+        form.email_backends = [self.failing, {'BACKEND': self.locmem}]
+        self.assertTrue(form.is_valid())
+        form.send_email()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(FailingBackend.calls, 1)
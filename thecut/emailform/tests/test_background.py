@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from django.test import SimpleTestCase
+from thecut.emailform import background
+from thecut.emailform.background import BackgroundSender, QueueFull
+import threading
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+class BlockingMessage(object):
+
+    subject = 'Blocking'
+
+    def __init__(self, error=None):
+        self.error = error
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+    def send(self):
+        self.started.set()
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return 1
+
+
+class TestBackgroundSender(SimpleTestCase):
+
+    """Tests for :py:class:`thecut.emailform.background.BackgroundSender`."""
+
+    def setUp(self):
+        self.sender = BackgroundSender(max_workers=1, max_queue_size=1)
+        self.addCleanup(self.sender.shutdown, timeout=5)
+
+    def test_calls_success_callback(self):
+        """Call ``on_success`` with the message and the send result."""
+        results = []
+        message = BlockingMessage()
+        message.release.set()
+        job = self.sender.submit(
+            message, on_success=lambda m, r: results.append((m, r)))
+        self.assertTrue(job.wait(5))
+        self.assertEqual(results, [(message, 1)])
+
+    def test_calls_failure_callback(self):
+        """Call ``on_failure`` with the message and the raised exception."""
+        errors = []
+        error = ValueError('Relay unavailable')
+        message = BlockingMessage(error=error)
+        message.release.set()
+        job = self.sender.submit(
+            message, on_failure=lambda m, e: errors.append((m, e)))
+        self.assertTrue(job.wait(5))
+        self.assertEqual(errors, [(message, error)])
+
+    def test_raises_when_queue_is_full(self):
+        """Raise ``QueueFull`` when the queue limit is reached."""
+        running = BlockingMessage()
+        self.sender.submit(running)
+        running.started.wait(5)
+        queued = BlockingMessage()
+        queued.release.set()
+        self.sender.submit(queued)
+        with self.assertRaises(QueueFull):
+            self.sender.submit(BlockingMessage())
+        running.release.set()
+
+    def test_cancels_queued_job(self):
+        """Cancel a job which has not started sending."""
+        running = BlockingMessage()
+        self.sender.submit(running)
+        running.started.wait(5)
+        queued = BlockingMessage()
+        job = self.sender.submit(queued)
+        self.assertTrue(job.cancel())
+        running.release.set()
+        self.assertTrue(job.wait(5))
+        self.assertFalse(queued.started.is_set())
+
+    def test_drains_queue_on_shutdown(self):
+        """Send queued messages before shutting down."""
+        message = BlockingMessage()
+        message.release.set()
+        job = self.sender.submit(message)
+        self.sender.shutdown(timeout=5)
+        self.assertTrue(job.done())
+        self.assertEqual(job.result, 1)
+
+    def test_closes_database_connections(self):
+        """Close old database connections around each job, including its
+        callbacks."""
+        events = []
+        message = BlockingMessage(error=ValueError('Relay unavailable'))
+        message.release.set()
+        with mock.patch.object(background, 'close_old_connections',
+                               side_effect=lambda: events.append('close')):
+            self.sender.submit(
+                message, on_failure=lambda m, e: events.append('callback'))
+            self.sender.shutdown(timeout=5)
+        self.assertEqual(events, ['close', 'callback', 'close'])
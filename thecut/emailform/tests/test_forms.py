@@ -1,10 +1,26 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, unicode_literals
 from django.template import TemplateDoesNotExist
-from test_app.forms import EmailForm
+from test_app.forms import (AutoReplyEmailForm, DetailedEmailForm, EmailForm,
+                            HTMLEmailForm)
+from thecut.emailform import backends, rendering
+from thecut.emailform.forms import LazyValue, send_email_batch
+from thecut.emailform.models import DigestEntry
+from thecut.emailform.tests.test_backends import FailingBackend
 from django.core import mail
+from django.core.mail import get_connection
+from django.template import engines
+from django.template.loader import get_template
+from django.conf import settings
 from django.test import TestCase
 from django.test.utils import override_settings
+import os
+import shutil
+import tempfile
+try:
+    from unittest import mock
+except ImportError:
+    import mock
 
 
 class TestBaseEmailForm(TestCase):
@@ -124,7 +140,367 @@ class TestBaseEmailForm(TestCase):
         self.assertEqual(self.form.get_email_subject('Not default'),
                          '[Overridden] Not default')
 
+    # Identifying submissions
+
+    def test_submission_key_uses_cleaned_data(self):
+        """Identify submissions by their cleaned data."""
+        other = EmailForm({'foo': 'baz'})
+        other.is_valid()
+        self.form.is_valid()
+        self.assertNotEqual(self.form.get_submission_key(),
+                            other.get_submission_key())
+
+    def test_submission_key_uses_token_field(self):
+        """Identify submissions by the idempotency token field."""
+        first = DetailedEmailForm({'name': 'token-1', 'quantity': '1'})
+        second = DetailedEmailForm({'name': 'token-1', 'quantity': '2'})
+        for form in (first, second):
+            form.idempotency_token_field = 'name'
+            form.is_valid()
+        self.assertEqual(first.get_submission_key(),
+                         second.get_submission_key())
+
+    def test_submission_key_without_token(self):
+        """Identify submissions without a token by their cleaned data."""
+        first = DetailedEmailForm({'name': 'Zoë', 'quantity': '1'})
+        second = DetailedEmailForm({'name': 'Zoë', 'quantity': '2'})
+        for form in (first, second):
+            form.idempotency_token_field = 'date'
+            form.is_valid()
+        self.assertNotEqual(first.get_submission_key(),
+                            second.get_submission_key())
+
     def test_overriding_template_name(self):
         with self.assertRaises(TemplateDoesNotExist):
             self.form.render_email_body(dict(), 'custom_template.html')
             # self.assertEqual(mock_get_template.call_count, 1)
+
+
+class TestSendEmailBatch(TestCase):
+
+    """Tests for :py:func:`thecut.emailform.forms.send_email_batch`."""
+
+    def setUp(self):
+        self.forms = [EmailForm({'foo': 'bar'}), EmailForm({'foo': 'baz'})]
+
+    def test_sends_all_emails_over_one_connection(self):
+        """Send every form's email, opening the connection once."""
+        connection = get_connection()
+        with mock.patch.object(connection, 'open',
+                               wraps=connection.open) as mock_open:
+            results = EmailForm.send_many(self.forms, connection=connection)
+        self.assertEqual(mock_open.call_count, 1)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual([result.sent for result in results], [True, True])
+
+    def test_reports_failure_per_message(self):
+        """Report a failed message without affecting the rest."""
+        connection = get_connection()
+        error = IOError('Rejected')
+        send_messages = connection.send_messages
+        outcomes = [error, None]
+
+        def send_or_fail(messages):
+            outcome = outcomes.pop(0)
+            if outcome is not None:
+                raise outcome
+            return send_messages(messages)
+
+        with mock.patch.object(connection, 'send_messages',
+                               side_effect=send_or_fail):
+            results = send_email_batch(self.forms, connection=connection)
+        self.assertEqual([result.error for result in results], [error, None])
+        self.assertEqual([result.sent for result in results], [False, True])
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_sends_with_app_email_backends(self):
+        """Send with ``EMAILFORM_EMAIL_BACKENDS`` when no connection is
+        given."""
+        FailingBackend.calls = 0
+        backends.reset_breakers()
+        self.addCleanup(backends.reset_breakers)
+        with self.settings(EMAILFORM_FAILOVER_THRESHOLD=1,
+                           EMAILFORM_EMAIL_BACKENDS=[
+                'thecut.emailform.tests.test_backends.FailingBackend',
+                'django.core.mail.backends.locmem.EmailBackend']):
+            results = send_email_batch(self.forms)
+        self.assertEqual([result.sent for result in results], [True, True])
+        self.assertEqual(FailingBackend.calls, 1)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_sends_auto_replies(self):
+        """Send automatic replies for the emails which were sent."""
+        forms = [AutoReplyEmailForm({'foo': 'bar', 'email': address})
+                 for address in ['zoe@example.com', 'bo@example.com']]
+        for form in forms:
+            self.assertTrue(form.is_valid())
+        connection = get_connection()
+        send_messages = connection.send_messages
+        calls = []
+
+        def reject_first(messages):
+            calls.append(messages)
+            if len(calls) == 1:
+                raise IOError('Rejected')
+            return send_messages(messages)
+
+        with mock.patch.object(connection, 'send_messages',
+                               side_effect=reject_first):
+            results = send_email_batch(forms, connection=connection)
+        self.assertEqual([result.sent for result in results], [False, True])
+        self.assertEqual([message.to for message in mail.outbox],
+                         [['mail@example.com'], ['bo@example.com']])
+
+
+class TestRenderEmailBody(TestCase):
+
+    """Tests for
+    :py:meth:`thecut.emailform.forms.BaseEmailForm.render_email_body`."""
+
+    def setUp(self):
+        self.form = DetailedEmailForm({
+            'name': 'Zoë <zoe@example.com>', 'date': '2017-01-31',
+            'amount': '12.50', 'quantity': '3'})
+        self.assertTrue(self.form.is_valid())
+        self.context = self.form.get_email_context_data()
+
+    def test_renders_stock_template_without_template_engine(self):
+        """Render the stock template identically without the template
+        engine."""
+        expected = get_template('emailform/email.txt').render(self.context)
+        self.assertTrue(rendering.is_stock_email_template(
+            'emailform/email.txt'))
+        with mock.patch('django.template.loader.get_template') as get:
+            body = self.form.render_email_body(self.context)
+        self.assertFalse(get.called)
+        self.assertEqual(body, expected)
+
+    def test_renders_overridden_stock_template(self):
+        """Render a project's own ``emailform/email.txt`` with the template
+        engine."""
+        template_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, template_dir)
+        os.mkdir(os.path.join(template_dir, 'emailform'))
+        with open(os.path.join(template_dir, 'emailform', 'email.txt'),
+                  'w') as template:
+            template.write('Custom body')
+        templates = [{
+            'BACKEND': 'django.template.backends.django.DjangoTemplates',
+            'DIRS': [template_dir], 'APP_DIRS': True}]
+        with override_settings(TEMPLATES=templates):
+            body = self.form.render_email_body(self.context)
+        self.assertEqual(body, 'Custom body')
+
+
+class TestGetEmailFormFields(TestCase):
+
+    """Tests for
+    :py:meth:`thecut.emailform.forms.BaseEmailForm.get_email_form_fields`."""
+
+    def setUp(self):
+        self.form = DetailedEmailForm({'name': 'Zoë', 'quantity': '3'})
+        self.assertTrue(self.form.is_valid())
+
+    def test_returns_fields_in_order(self):
+        """Return every field, in the form's field order."""
+        form_fields = self.form.get_email_form_fields()
+        self.assertEqual(list(form_fields), list(self.form.fields))
+
+    def test_returns_labels_and_cleaned_data(self):
+        """Return each field's label and cleaned value."""
+        form_fields = self.form.get_email_form_fields()
+        self.assertEqual(form_fields['name'].label, 'Name')
+        self.assertEqual(form_fields['quantity'].label, 'How many?')
+        self.assertEqual(form_fields['quantity'].cleaned_data, 3)
+        self.assertIsNone(form_fields['date'].cleaned_data)
+
+    def test_supports_dictionary_access(self):
+        """Support the dictionary keys used by existing templates."""
+        data = self.form.get_email_form_fields()['name']
+        self.assertEqual(data['label'], 'Name')
+        self.assertEqual(data['cleaned_data'], 'Zoë')
+        self.assertEqual(data['field'].name, 'name')
+        with self.assertRaises(KeyError):
+            data['form']
+
+    def test_uses_labels_changed_on_instance(self):
+        """Use labels changed after the form was created."""
+        self.form.fields['name'].label = 'Your name'
+        form_fields = self.form.get_email_form_fields()
+        self.assertEqual(form_fields['name'].label, 'Your name')
+
+
+class TestRenderEmailHTML(TestCase):
+
+    """Tests for the HTML alternative rendered by
+    :py:meth:`thecut.emailform.forms.BaseEmailForm.render_email_html`."""
+
+    def setUp(self):
+        self.form = HTMLEmailForm({'name': 'Zoë <zoe@example.com>',
+                                   'quantity': '3'})
+        self.assertTrue(self.form.is_valid())
+
+    def test_no_html_alternative_by_default(self):
+        """Send a plain text email when no HTML template is set."""
+        form = EmailForm({'foo': 'bar'})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.construct_email().alternatives, [])
+
+    def test_sends_html_alternative(self):
+        """Attach the rendered HTML template, with inline styles."""
+        self.form.send_email()
+        self.assertEqual(len(mail.outbox), 1)
+        [(html, mimetype)] = mail.outbox[0].alternatives
+        self.assertEqual(mimetype, 'text/html')
+        self.assertNotIn('<style', html)
+        self.assertIn('<th style="', html)
+        self.assertIn('How many?', html)
+        self.assertIn('Zoë &lt;zoe@example.com&gt;', html)
+
+    def test_inlines_css_once_per_template(self):
+        """Inline the template's CSS once, reusing the compiled template."""
+        with mock.patch('thecut.emailform.rendering.inline_css',
+                        side_effect=lambda html: html) as inline_css:
+            with self.settings(TEMPLATES=settings.TEMPLATES):
+                self.form.construct_email()
+                self.form.construct_email()
+        self.assertEqual(inline_css.call_count, 1)
+
+
+class TestAutoReply(TestCase):
+
+    """Tests for the automatic reply sent by
+    :py:meth:`thecut.emailform.forms.BaseEmailForm.send_email`."""
+
+    def setUp(self):
+        self.form = AutoReplyEmailForm({'foo': 'bar',
+                                        'email': 'zoe@example.com'})
+        self.assertTrue(self.form.is_valid())
+
+    def test_sends_auto_reply(self):
+        """Send the automatic reply to the submitted address, after the
+        form's email."""
+        self.form.to_emails = ['mail@example.com']
+        self.form.send_email()
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].to, ['mail@example.com'])
+        reply = mail.outbox[1]
+        self.assertEqual(reply.to, ['zoe@example.com'])
+        self.assertEqual(reply.reply_to, ['mail@example.com'])
+        self.assertTrue(reply.subject.endswith('Thank you for your enquiry'))
+        self.assertIn('Thank you for your enquiry', reply.body)
+        self.assertNotIn('bar', reply.body)
+
+    def test_no_auto_reply_without_address(self):
+        """Send only the form's email when no address was submitted."""
+        form = AutoReplyEmailForm({'foo': 'bar'})
+        self.assertTrue(form.is_valid())
+        form.send_email()
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_sends_auto_reply_for_digest(self):
+        """Send the automatic reply straight away when the form's data is
+        stored for a digest."""
+        self.form.email_delivery = 'digest'
+        self.form.send_email()
+        self.assertEqual(DigestEntry.objects.count(), 1)
+        self.assertEqual([message.to for message in mail.outbox],
+                         [['zoe@example.com']])
+
+    def test_shares_context(self):
+        """Create the context data once for both emails."""
+        with mock.patch.object(
+                self.form, 'get_email_form_fields',
+                wraps=self.form.get_email_form_fields) as get_fields:
+            messages = self.form.construct_emails()
+        self.assertEqual(len(messages), 2)
+        self.assertEqual(get_fields.call_count, 1)
+
+    def test_sends_over_one_connection(self):
+        """Send both emails, opening the connection once."""
+        connection = get_connection()
+        with mock.patch.object(connection, 'open',
+                               wraps=connection.open) as mock_open:
+            self.form.send_email(connection=connection)
+        self.assertEqual(mock_open.call_count, 1)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_auto_reply_failure_is_logged(self):
+        """Log, rather than raise, a failure to send the automatic reply."""
+        connection = get_connection()
+        send_messages = connection.send_messages
+
+        def reject_reply(messages):
+            if messages[0].to == ['zoe@example.com']:
+                raise IOError('Rejected')
+            return send_messages(messages)
+
+        with mock.patch.object(connection, 'send_messages',
+                               side_effect=reject_reply):
+            with mock.patch('thecut.emailform.forms.logger') as logger:
+                self.assertEqual(self.form.send_email(connection=connection),
+                                 1)
+        self.assertTrue(logger.exception.called)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class TestLazyContextData(TestCase):
+
+    """Tests for lazy values in
+    :py:meth:`thecut.emailform.forms.BaseEmailForm.get_email_context_data`."""
+
+    def setUp(self):
+        self.summary = mock.Mock(return_value={'total': 3})
+        self.form = AutoReplyEmailForm({'foo': 'bar',
+                                        'email': 'zoe@example.com'})
+        self.form.email_context_data = {
+            'summary': lambda: self.summary()}
+        self.assertTrue(self.form.is_valid())
+
+    def render(self, source, context):
+        return engines['django'].from_string(source).render(context)
+
+    def test_not_called_when_unused(self):
+        """Don't call functions which the templates don't use."""
+        self.form.send_email()
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertFalse(self.summary.called)
+
+    def test_called_once_per_context(self):
+        """Call each function once, however many templates use it."""
+        context = self.form.get_email_context_data()
+        self.assertEqual(self.render('{{ summary.total }}', context), '3')
+        self.assertEqual(
+            self.render('{% if summary %}{{ summary.total }}{% endif %}',
+                        context), '3')
+        self.assertEqual(self.summary.call_count, 1)
+        self.form.get_email_context_data()
+        self.assertEqual(self.summary.call_count, 1)
+
+    def test_wraps_keyword_arguments(self):
+        """Wrap functions passed as keyword arguments."""
+        context = self.form.get_email_context_data(
+            count=lambda: 5, value=LazyValue(lambda: 'value'))
+        self.assertIsInstance(context['count'], LazyValue)
+        self.assertEqual(self.render('{{ count }} {{ value }}', context),
+                         '5 value')
+
+    def test_leaves_functions_templates_must_not_call(self):
+        """Don't wrap functions marked with ``alters_data`` or
+        ``do_not_call_in_templates``."""
+        calls = []
+
+        def delete():
+            calls.append('delete')
+
+        def function():
+            calls.append('function')
+
+        delete.alters_data = True
+        function.do_not_call_in_templates = True
+        context = self.form.get_email_context_data(delete=delete,
+                                                   function=function)
+        self.assertIs(context['delete'], delete)
+        self.assertIs(context['function'], function)
+        self.render('{{ delete }} {% if function %}{% endif %}', context)
+        self.assertEqual(calls, [])
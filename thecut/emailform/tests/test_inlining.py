@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from django.test import SimpleTestCase
+from thecut.emailform.inlining import inline_css
+
+
+class TestInlineCSS(SimpleTestCase):
+
+    """Tests for :py:func:`thecut.emailform.inlining.inline_css`."""
+
+    def test_inlines_simple_selectors(self):
+        """Move rules for tags, classes and IDs into ``style`` attributes."""
+        html = inline_css(
+            '<style>td { color: red } .value { margin: 0 } '
+            '#name { padding: 0 }</style>'
+            '<td class="value" id="name">Zoë</td>')
+        self.assertEqual(html, '<td class="value" id="name" style="color: '
+                               'red; margin: 0; padding: 0">Zoë</td>')
+
+    def test_applies_rules_by_specificity(self):
+        """Apply more specific rules over less specific rules, regardless of
+        their order."""
+        html = inline_css(
+            '<style>#name { color: green } td.value { color: blue } '
+            'td { color: red }</style><td class="value">a</td>'
+            '<td id="name" class="value">b</td>')
+        self.assertEqual(html, '<td class="value" style="color: blue">a</td>'
+                               '<td id="name" class="value" '
+                               'style="color: green">b</td>')
+
+    def test_keeps_existing_styles(self):
+        """Give existing ``style`` attributes precedence."""
+        html = inline_css('<style>td { color: red; margin: 0 }</style>'
+                          '<td style="color: black">a</td>')
+        self.assertEqual(html,
+                         '<td style="margin: 0; color: black">a</td>')
+
+    def test_keeps_rules_which_cannot_be_inlined(self):
+        """Keep ``@media`` rules and complex selectors in a ``<style>``
+        element."""
+        html = inline_css(
+            '<head><style>td, tr > td { color: red } '
+            '@media (max-width: 600px) { td { display: block } }</style>'
+            '</head><td>a</td>')
+        self.assertIn('tr > td { color: red }', html)
+        self.assertIn('@media (max-width: 600px) { td { display: block } }',
+                      html)
+        self.assertEqual(html.count('<style'), 1)
+        self.assertIn('<td style="color: red">a</td>', html)
+
+    def test_ignores_template_syntax(self):
+        """Leave template variables and tags in place."""
+        html = inline_css('<style>.a { color: red }</style>'
+                          '{% for x in y %}<p class="a">{{ x }}</p>'
+                          '{% endfor %}')
+        self.assertEqual(html, '{% for x in y %}<p class="a" '
+                               'style="color: red">{{ x }}</p>{% endfor %}')
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from django.core import mail
+from django.core.mail import EmailMessage, get_connection
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from django.utils.six import StringIO
+from thecut.emailform import loadtest
+from thecut.emailform.smtpsink import SMTPSink
+import smtplib
+
+
+class TestSMTPSink(SimpleTestCase):
+
+    """Tests for :py:class:`thecut.emailform.smtpsink.SMTPSink`."""
+
+    def send(self, **kwargs):
+        sink = SMTPSink(**kwargs)
+        sink.start()
+        self.addCleanup(sink.stop)
+        connection = get_connection(
+            'django.core.mail.backends.smtp.EmailBackend', host='127.0.0.1',
+            port=sink.port)
+        message = EmailMessage('Subject', 'Body', 'from@example.com',
+                               ['to@example.com'], connection=connection)
+        return sink, message.send
+
+    def test_accepts_email(self):
+        """Accept and count emails."""
+        sink, send = self.send()
+        self.assertEqual(send(), 1)
+        self.assertEqual(sink.stats['messages'], 1)
+
+    def test_injects_failures(self):
+        """Respond with temporary and permanent failures, or disconnect."""
+        for fault, error, code in [
+                ('tempfail', smtplib.SMTPDataError, 451),
+                ('permfail', smtplib.SMTPDataError, 554),
+                ('disconnect', smtplib.SMTPServerDisconnected, None)]:
+            sink, send = self.send(**{'{0}_rate'.format(fault): 1})
+            with self.assertRaises(error) as context:
+                send()
+            if code is not None:
+                self.assertEqual(context.exception.smtp_code, code)
+            self.assertEqual(sink.stats['{0}s'.format(fault)], 1)
+            self.assertEqual(sink.stats['messages'], 0)
+
+
+class TestLoadTest(SimpleTestCase):
+
+    """Tests for :py:mod:`thecut.emailform.loadtest` and the
+    ``emailform_loadtest`` management command."""
+
+    def test_percentile(self):
+        """Return nearest-rank percentiles."""
+        values = list(range(1, 101))
+        self.assertEqual(loadtest.percentile(values, 50), 50)
+        self.assertEqual(loadtest.percentile(values, 99), 99)
+        self.assertEqual(loadtest.percentile([3], 95), 3)
+        self.assertIsNone(loadtest.percentile([], 50))
+
+    def test_counts_errors(self):
+        """Report each submission's latency, and errors by type."""
+        outcomes = iter([None, ValueError(), None, ValueError()])
+
+        def submit():
+            error = next(outcomes)
+            if error is not None:
+                raise error
+
+        report = loadtest.run(submit, 4, concurrency=2)
+        self.assertEqual(report.count, 4)
+        self.assertEqual(dict(report.errors), {'ValueError': 2})
+        self.assertEqual(report.error_rate, 0.5)
+
+    def test_command(self):
+        """Submit the form to a local SMTP sink and report the results."""
+        output = StringIO()
+        call_command('emailform_loadtest', requests=20, concurrency=4,
+                     view=True, permfail_rate=0.5, seed=1, stdout=output)
+        output = output.getvalue()
+        self.assertIn('20 submissions', output)
+        self.assertIn('p99', output)
+        self.assertIn('SMTPDataError', output)
+        self.assertIn('permanent failures', output)
+
+    def test_command_ignores_emailform_delivery_settings(self):
+        """Send to the sink, whatever the email backend and delivery."""
+        output = StringIO()
+        with override_settings(
+                EMAILFORM_EMAIL_BACKEND='django.core.mail.backends.locmem.'
+                'EmailBackend', EMAILFORM_EMAIL_DELIVERY='queue'):
+            call_command('emailform_loadtest', requests=5, stdout=output)
+        self.assertIn('5 accepted', output.getvalue())
+        self.assertEqual(len(mail.outbox), 0)
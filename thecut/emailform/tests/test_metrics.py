@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from django.core import mail
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from test_app.forms import EmailForm
+from thecut.emailform import metrics
+from thecut.emailform.signals import email_phase_timed
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+class TestPhaseTiming(SimpleTestCase):
+
+    """Tests for :py:mod:`thecut.emailform.metrics`."""
+
+    def setUp(self):
+        self.registry = metrics.MetricsRegistry()
+        overridden = override_settings(
+            EMAILFORM_TIMING=True, EMAILFORM_METRICS_REGISTRY=self.registry)
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        self.form = EmailForm({'foo': 'bar'})
+        self.assertTrue(self.form.is_valid())
+
+    def test_records_each_phase(self):
+        """Record a histogram for each phase of sending an email."""
+        self.form.send_email()
+        self.assertEqual(len(mail.outbox), 1)
+        snapshot = self.registry.snapshot()
+        for phase in metrics.PHASES:
+            self.assertEqual(snapshot['emailform.{0}'.format(phase)]['count'],
+                             1)
+
+    def test_sends_signal(self):
+        """Send the ``email_phase_timed`` signal for each phase."""
+        receiver = mock.Mock()
+        email_phase_timed.connect(receiver, sender=EmailForm)
+        self.addCleanup(email_phase_timed.disconnect, receiver,
+                        sender=EmailForm)
+        self.form.send_email()
+        phases = [call[1]['phase'] for call in receiver.call_args_list]
+        self.assertEqual(sorted(phases), sorted(metrics.PHASES))
+        for call in receiver.call_args_list:
+            self.assertIs(call[1]['form'], self.form)
+            self.assertGreaterEqual(call[1]['duration'], 0)
+
+    def test_records_failed_phase(self):
+        """Record the time taken by a phase which raises an exception."""
+        with mock.patch.object(self.form, 'get_email_subject',
+                               side_effect=ValueError):
+            with self.assertRaises(ValueError):
+                self.form.construct_email()
+        self.assertEqual(
+            self.registry.snapshot()['emailform.subject']['count'], 1)
+
+    def test_disabled(self):
+        """Record nothing when timing is disabled."""
+        receiver = mock.Mock()
+        email_phase_timed.connect(receiver)
+        self.addCleanup(email_phase_timed.disconnect, receiver)
+        with self.settings(EMAILFORM_TIMING=False):
+            self.form.send_email()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(self.registry.snapshot(), {})
+        self.assertFalse(receiver.called)
+
+    def test_registry_from_dotted_path(self):
+        """Load the registry from ``EMAILFORM_METRICS_REGISTRY``."""
+        path = 'thecut.emailform.metrics.registry'
+        with self.settings(EMAILFORM_METRICS_REGISTRY=path):
+            self.assertIs(metrics.get_registry(), metrics.registry)
+
+    def test_histogram_buckets(self):
+        """Count observed values in buckets by upper bound."""
+        histogram = metrics.Histogram(buckets=[1, 10])
+        for value in [0.5, 1, 5, 50]:
+            histogram.observe(value)
+        snapshot = histogram.snapshot()
+        self.assertEqual(list(snapshot['buckets'].items()),
+                         [(1, 2), (10, 1), (None, 1)])
+        self.assertEqual(snapshot['count'], 4)
+        self.assertEqual(snapshot['sum'], 56.5)
+        self.assertEqual(snapshot['min'], 0.5)
+        self.assertEqual(snapshot['max'], 50)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from django.core import mail
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.test import SimpleTestCase
+from test_app.forms import DetailedEmailForm
+from thecut.emailform import mime
+from thecut.emailform.mime import FastEmailMessage, SerializedMessage
+from thecut.emailform.tests.smtp import SMTPServer
+import email
+import re
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+def normalise(data):
+    # Remove the parts which differ every time a message is serialized.
+    data = re.sub(br'Date: [^\r\n]*\r?\n', b'', data)
+    data = re.sub(br'Message-ID: [^\r\n]*\r?\n', b'', data)
+    return re.sub(br'=+\d+==', b'BOUNDARY', data)
+
+
+message_from_bytes = getattr(email, 'message_from_bytes',
+                             email.message_from_string)
+
+
+class TestFastEmailMessage(SimpleTestCase):
+
+    """Tests for :py:class:`thecut.emailform.mime.FastEmailMessage`."""
+
+    def make_messages(self, body='Name: Zoë\n', alternatives=None, **kwargs):
+        kwargs.setdefault('headers', {'X-Form': 'enquiry'})
+        return [
+            message_class('Enquiry from Zoë', body,
+                          'Zoë <from@example.com>',
+                          ['to@example.com', 'Bé <be@example.com>'],
+                          cc=['cc@example.com'],
+                          reply_to=['reply@example.com'],
+                          alternatives=alternatives, **kwargs)
+            for message_class in [EmailMultiAlternatives, FastEmailMessage]]
+
+    def assertSerializedEqual(self, expected, message):
+        self.assertIsInstance(message.message(), SerializedMessage)
+        self.assertEqual(
+            normalise(message.message().as_bytes(linesep='\r\n')),
+            normalise(expected.message().as_bytes(linesep='\r\n')))
+
+    def test_serializes_text_email(self):
+        """Serialize a text email the same way as Django."""
+        expected, message = self.make_messages()
+        self.assertSerializedEqual(expected, message)
+
+    def test_serializes_ascii_email(self):
+        """Serialize a 7-bit text email the same way as Django."""
+        expected, message = self.make_messages(body='Name: Zoe\r\nThanks')
+        self.assertSerializedEqual(expected, message)
+
+    def test_serializes_alternatives(self):
+        """Serialize an email with an HTML alternative the same way as
+        Django."""
+        expected, message = self.make_messages(
+            alternatives=[('<p>Zoë</p>\n', 'text/html')])
+        self.assertSerializedEqual(expected, message)
+
+    def test_falls_back_for_attachments(self):
+        """Build emails with attachments with the email package."""
+        expected, message = self.make_messages()
+        message.attach('file.txt', 'Content', 'text/plain')
+        self.assertNotIsInstance(message.message(), SerializedMessage)
+        self.assertTrue(message.message().is_multipart())
+
+    def test_falls_back_for_long_lines(self):
+        """Build emails with lines too long for SMTP with the email
+        package, which encodes them."""
+        expected, message = self.make_messages(body='x' * 1000)
+        self.assertNotIsInstance(message.message(), SerializedMessage)
+
+    def test_falls_back_for_long_headers(self):
+        """Build emails with headers which would be folded with the email
+        package."""
+        expected, message = self.make_messages(
+            headers={'X-Form': 'enquiry ' * 10})
+        self.assertNotIsInstance(message.message(), SerializedMessage)
+
+    def test_caches_constant_headers(self):
+        """Encode the address and custom headers once."""
+        with mock.patch.object(mime, 'forbid_multi_line_headers',
+                               wraps=mime.forbid_multi_line_headers) as encode:
+            for _ in range(3):
+                FastEmailMessage('Subject', 'Body', 'from@example.com',
+                                 ['cache@example.com']).message()
+        names = [call[0][0] for call in encode.call_args_list]
+        self.assertEqual(names.count('Subject'), 3)
+        self.assertEqual(names.count('To'), 1)
+
+    def test_message_headers(self):
+        """Read headers from the serialized message."""
+        expected, message = self.make_messages()
+        serialized = message.message()
+        self.assertEqual(serialized['To'], expected.message()['To'])
+        self.assertEqual(serialized.get('X-Form'), 'enquiry')
+        self.assertIsNone(serialized['Bcc'])
+
+    def test_form_sends_over_smtp(self):
+        """Send form emails built with the fast serializer over SMTP."""
+        server = SMTPServer()
+        server.start()
+        self.addCleanup(server.stop)
+        form = DetailedEmailForm({'name': 'Zoë', 'quantity': '3'})
+        form.fast_mime = True
+        self.assertTrue(form.is_valid())
+        connection = get_connection(
+            'django.core.mail.backends.smtp.EmailBackend', host='127.0.0.1',
+            port=server.port)
+        form.send_email(connection=connection)
+        self.assertEqual(len(server.messages), 1)
+        received = message_from_bytes(server.messages[0])
+        self.assertEqual(received['To'], 'mail@example.com')
+        self.assertIn('How many?: 3',
+                      received.get_payload(decode=True).decode('utf-8'))
+
+    def test_form_uses_setting(self):
+        """Build form emails with the fast serializer when
+        ``EMAILFORM_FAST_MIME`` is set."""
+        form = DetailedEmailForm({'name': 'Zoë'})
+        self.assertTrue(form.is_valid())
+        with self.settings(EMAILFORM_FAST_MIME=True):
+            form.send_email()
+        self.assertIsInstance(mail.outbox[0], FastEmailMessage)
+        self.assertIsInstance(
+            DetailedEmailForm({}).get_email_message_class()(),
+            EmailMultiAlternatives)
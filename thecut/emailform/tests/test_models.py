@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from django.core import mail
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase
+from django.utils import six
+from datetime import timedelta
+from django.utils import timezone
+from test_app.forms import DigestEmailForm, EmailForm
+from thecut.emailform.management.commands import emailform_worker
+from thecut.emailform.models import (DigestEntry, DigestEntryQuerySet,
+                                     QueuedEmail, QueuedEmailQuerySet)
+from thecut.emailform.tests.test_backends import FailingBackend
+import socket
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+class FailingConnection(object):
+
+    def open(self):
+        return False
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        raise IOError('Relay unavailable')
+
+
+class UnreachableConnection(FailingConnection):
+
+    def open(self):
+        raise socket.error('Connection refused')
+
+
+class TestQueuedEmail(TestCase):
+
+    """Tests for the :py:class:`thecut.emailform.models.QueuedEmail` model."""
+
+    def setUp(self):
+        form = EmailForm({'foo': 'bar'})
+        form.email_delivery = 'queue'
+        self.queued_email = form.send_email()
+
+    def test_queues_email_instead_of_sending(self):
+        """Store the email in the outbox when delivery is ``queue``."""
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(QueuedEmail.objects.due().count(), 1)
+        self.assertEqual(self.queued_email.get_message().to,
+                         ['mail@example.com'])
+
+    def test_delivers_queued_email(self):
+        """Send due emails and mark them as sent."""
+        counts = QueuedEmail.objects.deliver()
+        self.assertEqual(counts['sent'], 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.queued_email.refresh_from_db()
+        self.assertEqual(self.queued_email.status, QueuedEmail.SENT)
+        self.assertIsNotNone(self.queued_email.sent_at)
+
+    def test_delivers_with_app_email_backend(self):
+        """Send with ``EMAILFORM_EMAIL_BACKEND`` when no connection is
+        given."""
+        FailingBackend.calls = 0
+        with self.settings(EMAILFORM_EMAIL_BACKEND='thecut.emailform.tests.'
+                           'test_backends.FailingBackend'):
+            counts = QueuedEmail.objects.deliver()
+        self.assertEqual(counts['retried'], 1)
+        self.assertEqual(FailingBackend.calls, 1)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_backs_off_after_failure(self):
+        """Retry a failed email later."""
+        counts = QueuedEmail.objects.deliver(connection=FailingConnection())
+        self.assertEqual(counts['retried'], 1)
+        self.queued_email.refresh_from_db()
+        self.assertEqual(self.queued_email.status, QueuedEmail.QUEUED)
+        self.assertEqual(self.queued_email.attempts, 1)
+        self.assertGreater(self.queued_email.available_at,
+                           self.queued_email.created_at)
+        self.assertFalse(QueuedEmail.objects.due().exists())
+
+    def test_quarantines_after_max_attempts(self):
+        """Quarantine an email once it has failed too many times."""
+        counts = QueuedEmail.objects.deliver(connection=FailingConnection(),
+                                             max_attempts=1)
+        self.assertEqual(counts['quarantined'], 1)
+        self.queued_email.refresh_from_db()
+        self.assertEqual(self.queued_email.status, QueuedEmail.QUARANTINED)
+        self.assertIn('Relay unavailable', self.queued_email.last_error)
+
+    def test_backs_off_when_connection_fails(self):
+        """Retry every leased email when the connection can't be opened."""
+        counts = QueuedEmail.objects.deliver(
+            connection=UnreachableConnection())
+        self.assertEqual(counts['retried'], 1)
+        self.queued_email.refresh_from_db()
+        self.assertEqual(self.queued_email.attempts, 1)
+        self.assertIn('Connection refused', self.queued_email.last_error)
+
+    def test_backs_off_when_backend_fails_to_load(self):
+        """Retry leased emails when the email backend can't be loaded."""
+        with mock.patch('django.core.mail.get_connection',
+                        side_effect=ImportError('No module named relay')):
+            counts = QueuedEmail.objects.deliver()
+        self.assertEqual(counts['retried'], 1)
+        self.queued_email.refresh_from_db()
+        self.assertEqual(self.queued_email.attempts, 1)
+        self.assertIsNone(self.queued_email.leased_until)
+        self.assertIn('No module named relay', self.queued_email.last_error)
+
+    def test_quarantines_unreadable_message(self):
+        """Quarantine an email which can not be loaded."""
+        QueuedEmail.objects.update(message=b'not a pickle')
+        counts = QueuedEmail.objects.deliver()
+        self.assertEqual(counts['quarantined'], 1)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_leases_emails_to_one_worker(self):
+        """Skip emails leased by another worker."""
+        leased = QueuedEmail.objects.lease()
+        self.assertEqual(leased, [self.queued_email])
+        self.assertEqual(QueuedEmail.objects.lease(), [])
+        self.assertEqual(QueuedEmail.objects.deliver()['sent'], 0)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_leases_emails_once_lease_expires(self):
+        """Lease emails again once a worker's lease has expired."""
+        QueuedEmail.objects.lease(lease_timeout=60)
+        later = timezone.now() + timedelta(seconds=61)
+        with mock.patch.object(timezone, 'now', return_value=later):
+            self.assertEqual(QueuedEmail.objects.deliver()['sent'], 1)
+        self.queued_email.refresh_from_db()
+        self.assertIsNone(self.queued_email.leased_until)
+        self.assertEqual(self.queued_email.lease_owner, '')
+
+    def test_skips_emails_leased_concurrently(self):
+        """Only lease emails which no other worker leased in the meantime."""
+        due = QueuedEmailQuerySet.due
+        calls = []
+
+        def lease_elsewhere(queryset, *args, **kwargs):
+            # Another worker leases the email after it has been selected,
+            # before it is updated.
+            calls.append(queryset)
+            if len(calls) == 2:
+                QueuedEmail.objects.update(
+                    lease_owner='other', leased_until=timezone.now() +
+                    timedelta(seconds=60))
+            return due(queryset, *args, **kwargs)
+
+        with mock.patch.object(QueuedEmailQuerySet, 'due', autospec=True,
+                               side_effect=lease_elsewhere):
+            self.assertEqual(QueuedEmail.objects.lease(), [])
+        self.queued_email.refresh_from_db()
+        self.assertEqual(self.queued_email.lease_owner, 'other')
+
+    def test_worker_command_starts_processes(self):
+        """Run several worker processes with ``--processes``."""
+        with mock.patch('multiprocessing.Process') as process:
+            call_command('emailform_worker', processes=3, once=True)
+        self.assertEqual(process.call_count, 3)
+        self.assertEqual(process.return_value.start.call_count, 3)
+        self.assertEqual(process.return_value.join.call_count, 3)
+
+    def test_worker_command_continues_after_error(self):
+        """Log a failed batch and try again after ``--interval``."""
+        counts = {'sent': 0, 'retried': 0, 'quarantined': 0}
+        deliver = mock.patch.object(
+            QueuedEmailQuerySet, 'deliver',
+            side_effect=[DatabaseError('database is locked'), counts])
+        log_exception = mock.patch.object(emailform_worker.logger,
+                                          'exception')
+        # The second sleep, after an empty batch, stops the worker.
+        sleep = mock.patch('time.sleep', side_effect=[None,
+                                                      KeyboardInterrupt])
+        with deliver as deliver, log_exception as log_exception, \
+                sleep as sleep:
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('emailform_worker', interval=3)
+        self.assertEqual(deliver.call_count, 2)
+        self.assertEqual(log_exception.call_count, 1)
+        sleep.assert_called_with(3)
+
+    def test_worker_command_sends_due_emails(self):
+        """Send due emails with the ``emailform_worker`` command."""
+        stdout = six.StringIO()
+        call_command('emailform_worker', once=True, stdout=stdout)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Sent 1', stdout.getvalue())
+
+
+class TestDigestEntry(TestCase):
+
+    """Tests for the :py:class:`thecut.emailform.models.DigestEntry` model."""
+
+    def submit(self, value):
+        form = DigestEmailForm({'foo': value})
+        self.assertTrue(form.is_valid())
+        return form.send_email()
+
+    def test_stores_submission_instead_of_sending(self):
+        """Store the form's data when delivery is ``digest``."""
+        self.submit('first')
+        self.assertEqual(len(mail.outbox), 0)
+        submission = DigestEntry.objects.get().get_submission()
+        self.assertEqual(submission['form_fields']['foo'],
+                         {'label': 'Foo', 'cleaned_data': 'first'})
+
+    def test_sends_digest_after_max_items(self):
+        """Send one digest email once ``digest_max_items`` are stored."""
+        for value in ('first', 'second', 'third'):
+            self.submit(value)
+        self.assertEqual(len(mail.outbox), 1)
+        message = mail.outbox[0]
+        self.assertEqual(
+            message.subject,
+            '[thecut-emailform test suite] Enquiry digest (3 submissions)')
+        for value in ('Foo: first', 'Foo: second', 'Foo: third'):
+            self.assertIn(value, message.body)
+        self.assertFalse(DigestEntry.objects.exists())
+
+    def test_skips_digest_claimed_by_another_worker(self):
+        """Don't send a digest whose entries were claimed concurrently."""
+        self.submit('first')
+        self.submit('second')
+        select_for_update = DigestEntryQuerySet.select_for_update
+
+        def claim_elsewhere(queryset, *args, **kwargs):
+            # Another worker claims an entry after the entries were selected.
+            DigestEntry.objects.order_by('pk').first().delete()
+            return select_for_update(queryset, *args, **kwargs)
+
+        with mock.patch.object(DigestEntryQuerySet, 'select_for_update',
+                               autospec=True, side_effect=claim_elsewhere):
+            self.assertIsNone(DigestEntry.objects.flush(DigestEmailForm,
+                                                        force=True))
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(DigestEntry.objects.count(), 1)
+
+    def test_sends_digest_after_interval(self):
+        """Send a digest once the oldest submission is
+        ``digest_interval`` minutes old."""
+        self.submit('first')
+        self.assertEqual(DigestEntry.objects.flush_due(), 0)
+        DigestEntry.objects.update(
+            created_at=timezone.now() - timedelta(minutes=61))
+        self.assertEqual(DigestEntry.objects.flush_due(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_keeps_submissions_when_digest_fails(self):
+        """Keep submissions for the worker if sending the digest fails."""
+        self.submit('first')
+        self.submit('second')
+        with mock.patch('django.core.mail.EmailMessage.send',
+                        side_effect=IOError), \
+                mock.patch('thecut.emailform.forms.logger') as logger:
+            self.submit('third')
+        self.assertEqual(logger.exception.call_count, 1)
+        self.assertEqual(DigestEntry.objects.count(), 3)
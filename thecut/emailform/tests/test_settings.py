@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from thecut.emailform import settings
+import warnings
+
+
+class TestSettings(SimpleTestCase):
+
+    """Tests for :py:mod:`thecut.emailform.settings`."""
+
+    @override_settings(EMAILFORM_DEFAULT_TO_EMAILS=['to@example.com'],
+                       EMAILFORM_EMAIL_SUBJECT_PREFIX='[Test] ')
+    def test_deprecated_constants(self):
+        """Read the settings which used to be module constants, with a
+        deprecation warning."""
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            self.assertEqual(settings.DEFAULT_TO_EMAILS, ['to@example.com'])
+            self.assertEqual(settings.EMAIL_SUBJECT_PREFIX, '[Test] ')
+            self.assertEqual(settings.DEFAULT_FROM_EMAIL, 'from@example.com')
+        self.assertEqual([warning.category for warning in caught],
+                         [DeprecationWarning] * 3)
+
+    def test_missing_attribute(self):
+        """Raise AttributeError for other names."""
+        with self.assertRaises(AttributeError):
+            settings.OUTBOX_BATCH_SIZE
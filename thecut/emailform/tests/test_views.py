@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from django.core import mail
+from django.core.exceptions import ImproperlyConfigured
+from django.core.mail import EmailMessage
+from django.test import RequestFactory, TestCase
+from test_app.forms import EmailForm
+from thecut.emailform import background, idempotency, ratelimit
+from thecut.emailform.models import QueuedEmail
+from thecut.emailform.tests.test_background import BlockingMessage
+from thecut.emailform.views import EmailFormView
+import threading
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+class TestEmailFormView(TestCase):
+
+    """Tests for the :py:class:`thecut.emailform.views.EmailFormView` view."""
+
+    def setUp(self):
+        self.request = RequestFactory().post('/', {'foo': 'bar'})
+
+    def get_response(self, **kwargs):
+        view = EmailFormView.as_view(form_class=EmailForm, success_url='/ok/',
+                                     **kwargs)
+        return view(self.request)
+
+    def test_sends_email_synchronously_by_default(self):
+        """Send email during the request by default."""
+        response = self.get_response()
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_sends_email_in_background(self):
+        """Send email from a worker thread in ``background`` mode."""
+        sender = background.BackgroundSender(max_workers=1)
+        self.addCleanup(sender.shutdown)
+        with mock.patch.object(background, 'get_sender', return_value=sender):
+            response = self.get_response(send_mode='background')
+        self.assertEqual(response.status_code, 302)
+        sender.shutdown(timeout=5)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_sends_email_synchronously_when_queue_is_full(self):
+        """Fall back to a synchronous send when the queue is full."""
+        sender = mock.Mock()
+        sender.submit.side_effect = background.QueueFull
+        with mock.patch.object(background, 'get_sender',
+                               return_value=sender), \
+                mock.patch('thecut.emailform.views.logger') as logger:
+            self.get_response(send_mode='background')
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(logger.warning.call_count, 1)
+
+    def test_logs_background_failure_with_traceback(self):
+        """Log the exception's traceback when a background email fails."""
+        try:
+            raise ValueError('Failed')
+        except ValueError as error:
+            exception = error
+        message = EmailMessage('Subject', 'Body', 'from@example.com',
+                               ['to@example.com'])
+        with mock.patch('thecut.emailform.views.logger') as logger:
+            EmailFormView().email_failed(message, exception)
+        exc_info = logger.error.call_args[1]['exc_info']
+        self.assertEqual(exc_info[:2], (ValueError, exception))
+
+    def test_rejects_unknown_send_mode(self):
+        """Raise ``ImproperlyConfigured`` for an unknown send mode."""
+        with self.assertRaises(ImproperlyConfigured):
+            self.get_response(send_mode='carrier-pigeon')
+
+
+class TestEmailFormViewRateLimit(TestCase):
+
+    """Tests for rate limiting in
+    :py:class:`thecut.emailform.views.EmailFormView`."""
+
+    def setUp(self):
+        self.limiter = ratelimit.RateLimiter('2/m')
+        patcher = mock.patch.object(ratelimit, 'get_limiter',
+                                    return_value=self.limiter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.view = EmailFormView.as_view(
+            form_class=EmailForm, success_url='/ok/', rate_limit='2/m')
+
+    def post(self, ip='127.0.0.1'):
+        request = RequestFactory().post('/', {'foo': 'bar'},
+                                        REMOTE_ADDR=ip)
+        return self.view(request)
+
+    def test_rejects_submissions_over_limit(self):
+        """Reject submissions over the limit without sending email."""
+        self.assertEqual(self.post().status_code, 302)
+        self.assertEqual(self.post().status_code, 302)
+        response = self.post()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(self.limiter.stats(), {'hits': 1, 'misses': 2})
+
+    def test_limits_each_client_separately(self):
+        """Track each client's submissions separately."""
+        self.post()
+        self.post()
+        self.assertEqual(self.post(ip='10.0.0.1').status_code, 302)
+
+    def test_refills_over_time(self):
+        """Allow submissions again once the bucket has refilled."""
+        with mock.patch.object(ratelimit.time, 'time', return_value=1000):
+            self.post()
+            self.post()
+            self.assertEqual(self.post().status_code, 429)
+        with mock.patch.object(ratelimit.time, 'time', return_value=1030):
+            self.assertEqual(self.post().status_code, 302)
+            self.assertEqual(self.post().status_code, 429)
+
+
+class TestEmailFormViewDeduplicate(TestCase):
+
+    """Tests for duplicate submissions in
+    :py:class:`thecut.emailform.views.EmailFormView`."""
+
+    def setUp(self):
+        self.submissions = idempotency.TTLCache(ttl=60, max_size=10)
+        patcher = mock.patch.object(idempotency, 'get_submissions',
+                                    return_value=self.submissions)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.view = EmailFormView.as_view(
+            form_class=EmailForm, success_url='/ok/', deduplicate=True)
+
+    def post(self, data):
+        return self.view(RequestFactory().post('/', data))
+
+    def test_ignores_duplicate_submission(self):
+        """Send one email for repeated submissions of the same data."""
+        first = self.post({'foo': 'bar'})
+        second = self.post({'foo': ' bar '})
+        self.assertEqual(second.status_code, first.status_code)
+        self.assertEqual(second['Location'], first['Location'])
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_sends_different_submissions(self):
+        """Send an email for each different submission."""
+        self.post({'foo': 'bar'})
+        self.post({'foo': 'baz'})
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_allows_retry_after_failure(self):
+        """Allow a submission to be retried if sending failed."""
+        with mock.patch.object(EmailForm, 'send_email',
+                               side_effect=IOError):
+            with self.assertRaises(IOError):
+                self.post({'foo': 'bar'})
+        self.post({'foo': 'bar'})
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_forgets_submissions_after_ttl(self):
+        """Send the same submission again once it has expired."""
+        with mock.patch.object(idempotency.time, 'time', return_value=1000):
+            self.post({'foo': 'bar'})
+        with mock.patch.object(idempotency.time, 'time', return_value=1061):
+            self.post({'foo': 'bar'})
+        self.assertEqual(len(mail.outbox), 2)
+
+
+class TestEmailFormViewSendTimeout(TestCase):
+
+    """Tests for the send timeout of
+    :py:class:`thecut.emailform.views.EmailFormView`."""
+
+    def setUp(self):
+        self.sender = background.BackgroundSender(max_workers=1)
+        self.addCleanup(self.sender.shutdown, timeout=5)
+        patcher = mock.patch.object(background, 'get_sender',
+                                    return_value=self.sender)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.view = EmailFormView.as_view(
+            form_class=EmailForm, success_url='/ok/', send_timeout=0.1)
+
+    def post(self):
+        return self.view(RequestFactory().post('/', {'foo': 'bar'}))
+
+    def block_sending(self, error=None):
+        """Make emails block until the returned event is set."""
+        release = threading.Event()
+        send = EmailMessage.send
+
+        def blocking_send(message, *args, **kwargs):
+            release.wait(5)
+            if error is not None:
+                raise error
+            return send(message, *args, **kwargs)
+
+        patcher = mock.patch.object(EmailMessage, 'send', autospec=True,
+                                    side_effect=blocking_send)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(release.set)
+        return release
+
+    def test_sends_email_within_timeout(self):
+        """Send the email during the request when it is sent in time."""
+        self.assertEqual(self.post().status_code, 302)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(QueuedEmail.objects.count(), 0)
+
+    def test_defers_email_waiting_to_be_sent(self):
+        """Move an email which hasn't started sending to the outbox."""
+        blocker = BlockingMessage()
+        self.sender.submit(blocker)
+        self.assertEqual(self.post().status_code, 302)
+        blocker.release.set()
+        self.sender.shutdown(timeout=5)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(QueuedEmail.objects.count(), 1)
+
+    def test_defers_email_which_fails_late(self):
+        """Move an email which fails after the timeout to the outbox."""
+        release = self.block_sending(error=IOError('Timed out'))
+        with mock.patch.object(EmailFormView, 'defer_email') as defer_email:
+            self.assertEqual(self.post().status_code, 302)
+            self.assertFalse(defer_email.called)
+            release.set()
+            self.sender.shutdown(timeout=5)
+        self.assertEqual(defer_email.call_count, 1)
+
+    def test_keeps_email_which_is_sent_late(self):
+        """Don't defer an email which is sent after the timeout."""
+        release = self.block_sending()
+        with mock.patch.object(EmailFormView, 'defer_email') as defer_email:
+            self.assertEqual(self.post().status_code, 302)
+            release.set()
+            self.sender.shutdown(timeout=5)
+        self.assertFalse(defer_email.called)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_defers_email_when_queue_is_full(self):
+        """Move the email to the outbox when the sender's queue is full."""
+        with mock.patch.object(self.sender, 'submit',
+                               side_effect=background.QueueFull):
+            self.assertEqual(self.post().status_code, 302)
+        self.assertEqual(QueuedEmail.objects.count(), 1)
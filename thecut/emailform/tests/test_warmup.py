@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from django.apps import apps
+from django.test import SimpleTestCase
+from test_app.forms import EmailForm
+from thecut.emailform import backends, warmup
+from thecut.emailform.tests.smtp import SMTPServer
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+class MissingTemplateEmailForm(EmailForm):
+
+    email_template_name = 'emailform/does-not-exist.txt'
+
+
+class TestWarmUp(SimpleTestCase):
+
+    """Tests for :py:func:`thecut.emailform.warmup.warm_up`."""
+
+    def test_finds_email_form_classes(self):
+        """Find every imported email form class."""
+        classes = warmup.get_email_form_classes()
+        self.assertIn(EmailForm, classes)
+        self.assertIn(MissingTemplateEmailForm, classes)
+
+    def test_compiles_email_templates(self):
+        """Load each email form's template, warning about missing ones."""
+        with mock.patch.object(warmup, 'get_template') as get_template, \
+                mock.patch.object(warmup, 'logger'):
+            get_template.side_effect = lambda name: None
+            warmup.warm_up()
+        loaded = [call[0][0] for call in get_template.call_args_list]
+        self.assertIn('emailform/email.txt', loaded)
+        self.assertIn('emailform/does-not-exist.txt', loaded)
+        self.assertIn('emailform/email.html', loaded)
+
+    def test_reports_timings(self):
+        """Return the time taken by each step."""
+        with mock.patch.object(warmup, 'logger') as logger:
+            timings = warmup.warm_up()
+        self.assertEqual(list(timings),
+                         ['forms', 'templates', 'backend', 'connections'])
+        self.assertEqual(logger.info.call_count, 1)
+
+    def test_opens_pooled_connections(self):
+        """Open pooled SMTP connections ahead of the first email."""
+        server = SMTPServer()
+        server.start()
+        self.addCleanup(server.stop)
+        self.addCleanup(backends.close_pools)
+        with self.settings(
+                EMAIL_HOST='127.0.0.1', EMAIL_PORT=server.port,
+                EMAILFORM_EMAIL_BACKEND='thecut.emailform.backends.'
+                'PooledSMTPBackend'), \
+                mock.patch.object(warmup, 'logger'):
+            warmup.warm_up(connections=2)
+        self.assertEqual(server.connections, 2)
+
+    def test_forked_process_opens_own_connections(self):
+        """Don't use connections inherited from the process which warmed
+        up, as forked processes would share their sockets."""
+        server = SMTPServer()
+        server.start()
+        self.addCleanup(server.stop)
+        self.addCleanup(backends.close_pools)
+        with self.settings(
+                EMAIL_HOST='127.0.0.1', EMAIL_PORT=server.port,
+                EMAILFORM_EMAIL_BACKEND='thecut.emailform.backends.'
+                'PooledSMTPBackend'), \
+                mock.patch.object(warmup, 'logger'):
+            warmup.warm_up(connections=1)
+            inherited = backends.PooledSMTPBackend().get_pool()
+            with mock.patch.object(backends.os, 'getpid',
+                                   return_value=-1):
+                pool = backends.PooledSMTPBackend().get_pool()
+                self.assertIsNot(pool, inherited)
+                self.assertEqual(pool._idle, [])
+        self.assertEqual(len(inherited._idle), 1)
+        inherited.close()
+
+    def test_runs_when_app_is_ready(self):
+        """Warm up from ``AppConfig.ready`` when ``EMAILFORM_WARM_UP`` is
+        set."""
+        app_config = apps.get_app_config('emailform')
+        with self.settings(EMAILFORM_WARM_UP=True), \
+                mock.patch.object(warmup, 'warm_up') as warm_up:
+            app_config.ready()
+        self.assertEqual(warm_up.call_count, 1)
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from . import views
+from django.conf.urls import url
+
+
+app_name = 'emailform'
+
+
+urlpatterns = [
+    url(r'^attachments/(?P<token>[^/]+)/$',
+        views.AttachmentDownloadView.as_view(), name='attachment'),
+]
@@ -1,10 +1,321 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, unicode_literals
+from . import background, idempotency, ratelimit
+from .attachments import (FileAttachment, get_attachment_storage,
+                          load_attachment_token)
+from .settings import app_settings
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from django.http import (FileResponse, Http404, HttpResponse,
+                         HttpResponseRedirect)
+from django.utils.six.moves.urllib.parse import quote
 from django.views import generic
+import logging
+import mimetypes
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class AttachmentDownloadView(generic.View):
+    """Serves an attachment which was saved to storage instead of being
+    attached to an email, from a signed link which expires."""
+
+    def get(self, request, token):
+        try:
+            name, filename = load_attachment_token(token)
+        except signing.BadSignature:
+            raise Http404('Invalid or expired attachment link.')
+        storage = get_attachment_storage()
+        try:
+            file = storage.open(name, 'rb')
+        except (IOError, OSError):
+            raise Http404('Attachment not found.')
+        response = FileResponse(file, content_type=(
+            mimetypes.guess_type(filename)[0] or 'application/octet-stream'))
+        response['Content-Disposition'] = (
+            "attachment; filename*=UTF-8''{0}".format(
+                quote(filename.encode('utf-8'))))
+        return response
 
 
 class EmailFormView(generic.FormView):
 
+    deduplicate = None
+    """Whether to ignore repeated submissions of the same data, such as double
+    clicks or client retries. Duplicates get the usual success response
+    without sending another email. Defaults to the ``EMAILFORM_DEDUPLICATE``
+    setting."""
+
+    rate_limit = None
+    """The number of submissions allowed per client, e.g. ``'5/m'`` (five
+    per minute). Defaults to the ``EMAILFORM_RATE_LIMIT`` setting; ``None``
+    allows unlimited submissions."""
+
+    rate_limit_key = None
+    """How clients are identified for rate limiting: ``'ip'``, ``'session'``,
+    ``'user'``, or a callable which takes the request and returns a string.
+    Defaults to the ``EMAILFORM_RATE_LIMIT_KEY`` setting."""
+
+    send_mode = None
+    """How the email is sent: ``'sync'`` sends it during the request,
+    ``'background'`` hands it to a worker thread. Defaults to the
+    ``EMAILFORM_SEND_MODE`` setting."""
+
+    send_timeout = None
+    """In ``'sync'`` mode, the number of seconds to wait for the email to be
+    sent, e.g. ``0.3``. Emails which haven't been sent in time, or which
+    fail, are stored in the outbox to be sent by the ``emailform_worker``
+    management command. Defaults to the ``EMAILFORM_SEND_TIMEOUT`` setting;
+    ``None`` waits until the email has been sent."""
+
+    def construct_emails(self, form):
+        """Construct a form's emails to be sent after the response has been
+        returned.
+
+        File attachments are read into memory, since uploaded files are
+        deleted at the end of the request.
+
+        :rtype: :py:class:`list`
+
+        """
+
+        messages = form.construct_emails()
+        for message in messages:
+            for attachment in message.attachments:
+                if isinstance(attachment, FileAttachment):
+                    attachment.detach()
+        return messages
+
+    def defer_email(self, message):
+        """Store an email which couldn't be sent within the send timeout in
+        the outbox.
+
+        This may be called from a worker thread, if the email failed after
+        the response was returned.
+
+        """
+
+        from .models import QueuedEmail
+        logger.info('Email %r was not sent within the send timeout, moving '
+                    'it to the outbox.', message.subject)
+        return QueuedEmail.objects.enqueue(message)
+
+    def email_failed(self, message, exception):
+        """Called when sending an email in the background fails.
+
+        This is called from a worker thread, after the response has been
+        returned.
+
+        """
+
+        logger.error('Failed to send email %r: %s', message.subject,
+                     exception, exc_info=(
+                         type(exception), exception,
+                         getattr(exception, '__traceback__', None)))
+
+    def email_sent(self, message, result):
+        """Called when an email has been sent in the background.
+
+        This is called from a worker thread, after the response has been
+        returned.
+
+        """
+
+        pass
+
+    def form_duplicate(self, form):
+        """Returns the response for a duplicate submission.
+
+        :returns: The same redirect as a successful submission.
+        :rtype: :py:class:`~django.http.HttpResponse`
+
+        """
+
+        return HttpResponseRedirect(self.get_success_url())
+
     def form_valid(self, form, *args, **kwargs):
-        form.send_email()
+        if self.get_deduplicate():
+            submissions = idempotency.get_submissions()
+            key = form.get_submission_key()
+            if not submissions.add(key):
+                return self.form_duplicate(form)
+            try:
+                self.send_email(form)
+            except Exception:
+                submissions.discard(key)
+                raise
+        else:
+            self.send_email(form)
         return super(EmailFormView, self).form_valid(form, *args, **kwargs)
+
+    def get_deduplicate(self):
+        """Returns whether repeated submissions should be ignored.
+
+        :rtype: :py:class:`bool`
+
+        """
+
+        if self.deduplicate is None:
+            return app_settings.DEDUPLICATE
+        return self.deduplicate
+
+    def get_rate_limit_key(self):
+        """Returns the string identifying the client for rate limiting.
+
+        Sessions and users fall back to the client's IP address when the
+        request has no session or the user is anonymous.
+
+        :rtype: :py:class:`unicode`
+
+        """
+
+        key = self.rate_limit_key or app_settings.RATE_LIMIT_KEY
+        if key not in ('ip', 'session', 'user') and not callable(key):
+            raise ImproperlyConfigured(
+                'Unknown rate limit key {0!r}.'.format(key))
+
+        request = self.request
+        client = None
+        if callable(key):
+            client = key(request)
+        elif key == 'session':
+            session = getattr(request, 'session', None)
+            if session is not None and session.session_key:
+                client = 'session:{0}'.format(session.session_key)
+        elif key == 'user':
+            user = getattr(request, 'user', None)
+            authenticated = getattr(user, 'is_authenticated', False)
+            if callable(authenticated):
+                authenticated = authenticated()
+            if authenticated:
+                client = 'user:{0}'.format(user.pk)
+        if client is None:
+            client = 'ip:{0}'.format(request.META.get('REMOTE_ADDR'))
+        return '{0}.{1}:{2}'.format(self.__class__.__module__,
+                                    self.__class__.__name__, client)
+
+    def get_rate_limiter(self):
+        """Returns the rate limiter for this view, or ``None`` if submissions
+        are not rate limited.
+
+        :rtype: :py:class:`thecut.emailform.ratelimit.RateLimiter`
+
+        """
+
+        rate = self.rate_limit or app_settings.RATE_LIMIT
+        if rate is None:
+            return None
+        return ratelimit.get_limiter(rate)
+
+    def get_send_timeout(self):
+        """Returns the number of seconds to wait for the email to be sent.
+
+        :returns: Seconds, or ``None`` to wait until it has been sent.
+        :rtype: :py:class:`float`
+
+        """
+
+        if self.send_timeout is None:
+            return app_settings.SEND_TIMEOUT
+        return self.send_timeout
+
+    def get_send_mode(self):
+        """Returns the mode used to send the email.
+
+        :returns: ``'sync'`` or ``'background'``.
+        :rtype: :py:class:`unicode`
+
+        """
+
+        send_mode = self.send_mode or app_settings.SEND_MODE
+        if send_mode not in ('sync', 'background'):
+            raise ImproperlyConfigured(
+                'Unknown email send mode {0!r}.'.format(send_mode))
+        return send_mode
+
+    def post(self, request, *args, **kwargs):
+        limiter = self.get_rate_limiter()
+        if limiter is not None and not limiter.allow(
+                self.get_rate_limit_key()):
+            return self.rate_limited()
+        return super(EmailFormView, self).post(request, *args, **kwargs)
+
+    def rate_limited(self):
+        """Returns the response for a client which has made too many
+        submissions.
+
+        :rtype: :py:class:`~django.http.HttpResponse`
+
+        """
+
+        return HttpResponse('Too many requests.', status=429,
+                            content_type='text/plain')
+
+    def send_email(self, form):
+        """Send the email for a valid form using the configured send mode."""
+
+        if form.get_email_delivery() != 'immediate':
+            return form.send_email()
+        if self.get_send_mode() == 'sync':
+            timeout = self.get_send_timeout()
+            if timeout is None:
+                return form.send_email()
+            return self.send_email_with_timeout(form, timeout)
+
+        messages = self.construct_emails(form)
+        sender = background.get_sender()
+        results = []
+        for message in messages:
+            try:
+                results.append(sender.submit(
+                    message, on_success=self.email_sent,
+                    on_failure=self.email_failed))
+            except background.QueueFull:
+                logger.warning('Background email queue is full, sending '
+                               'email %r synchronously.', message.subject)
+                results.append(message.send())
+        return results[0]
+
+    def send_email_with_timeout(self, form, timeout):
+        """Send the email for a valid form from a worker thread, waiting up
+        to ``timeout`` seconds for it to be sent.
+
+        Emails which fail, or haven't been sent in time, are passed to
+        :py:meth:`~thecut.emailform.views.EmailFormView.defer_email`. An
+        email which is already being sent when the time runs out is only
+        deferred if it then fails.
+
+        :returns: Whether every email was sent in time.
+        :rtype: :py:class:`bool`
+
+        """
+
+        deadline = time.time() + timeout
+        sender = background.get_sender()
+        sent = True
+        for message in self.construct_emails(form):
+            try:
+                job = sender.submit(message)
+            except background.QueueFull:
+                self.defer_email(message)
+                sent = False
+                continue
+            job.wait(max(deadline - time.time(), 0))
+            if job.done() and job.exception is None:
+                continue
+            sent = False
+            if not job.done() and job.cancel():
+                self.defer_email(message)
+            else:
+                job.add_done_callback(self._defer_failed_job)
+        return sent
+
+    def _defer_failed_job(self, job):
+        if job.exception is not None:
+            try:
+                self.defer_email(job.message)
+            except Exception:
+                logger.exception('Failed to move email %r to the outbox.',
+                                 job.message.subject)
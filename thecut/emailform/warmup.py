@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from . import rendering
+from .forms import BaseEmailForm
+from .settings import app_settings
+from collections import OrderedDict
+from django.core.mail import get_connection
+from django.template import TemplateDoesNotExist
+from django.template.loader import get_template
+from django.utils.module_loading import autodiscover_modules
+import logging
+import smtplib
+import socket
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_email_form_classes():
+    """Returns every imported subclass of
+    :py:class:`~thecut.emailform.forms.BaseEmailForm`.
+
+    :rtype: :py:class:`list`
+
+    """
+
+    classes = []
+    pending = [BaseEmailForm]
+    while pending:
+        for subclass in pending.pop().__subclasses__():
+            if subclass not in classes:
+                classes.append(subclass)
+                pending.append(subclass)
+    return classes
+
+
+def get_template_names(form_class):
+    """Returns the names of the templates used by an email form class.
+
+    :rtype: :py:class:`list`
+
+    """
+
+    template_names = [form_class.email_template_name]
+    if form_class.email_html_template_name:
+        template_names.append(form_class.email_html_template_name)
+    return template_names
+
+
+def warm_up(connections=None):
+    """Load everything needed to send email, so the first email sent by each
+    process isn't slowed down.
+
+    Imports each installed app's ``forms`` module, compiles the templates used
+    by each email form (inlining the CSS of HTML templates), imports the email
+    backend, and opens ``connections`` pooled SMTP connections when using
+    :py:class:`~thecut.emailform.backends.PooledSMTPBackend`. Connections
+    are only used by the process which opened them, so open them after a
+    server forks its worker processes.
+
+    :keyword int connections: Number of connections to open. Defaults to the
+        ``EMAILFORM_WARM_UP_CONNECTIONS`` setting.
+    :returns: Seconds taken by each step.
+    :rtype: :py:class:`~collections.OrderedDict`
+
+    """
+
+    if connections is None:
+        connections = app_settings.WARM_UP_CONNECTIONS
+    timings = OrderedDict()
+
+    start = time.time()
+    autodiscover_modules('forms')
+    timings['forms'] = time.time() - start
+
+    start = time.time()
+    template_names = set()
+    html_template_names = set()
+    for form_class in get_email_form_classes():
+        template_names.update(get_template_names(form_class))
+        html_template_names.add(form_class.email_html_template_name)
+    for template_name in sorted(template_names):
+        try:
+            get_template(template_name)
+        except TemplateDoesNotExist:
+            logger.warning('Email template %r does not exist.', template_name)
+            continue
+        if template_name in html_template_names:
+            rendering.get_html_template(template_name)
+    timings['templates'] = time.time() - start
+
+    start = time.time()
+    connection = get_connection(app_settings.EMAIL_BACKEND)
+    timings['backend'] = time.time() - start
+
+    start = time.time()
+    if connections and hasattr(connection, 'get_pool'):
+        try:
+            connection.get_pool().fill(connections)
+        except (smtplib.SMTPException, socket.error) as error:
+            logger.warning('Could not open SMTP connections: %s', error)
+    timings['connections'] = time.time() - start
+
+    logger.info('Email form warm-up took %.1f ms (%s).',
+                sum(timings.values()) * 1000,
+                ', '.join('{0}: {1:.1f} ms'.format(step, seconds * 1000)
+                          for step, seconds in timings.items()))
+    return timings